@@ -1,54 +1,334 @@
-from flask import Flask, send_from_directory, request, jsonify
-
-app = Flask(__name__, static_folder="pages")
-
-# Root route → serve index.html
-@app.route("/")
-def home():
-    return send_from_directory("pages", "index.html")
-
-# Mock Email Endpoint
-@app.route("/api/send-email", methods=["POST"])
-def send_email():
-    data = request.json
-    doctor_email = data.get("doctor_email")
-    patient_data = data.get("patient_data")
-    
-    # Simulate processing delay and logging
-    print(f"------------------------------------------------")
-    print(f"[MOCK EMAIL SERVICE] Sending secure report...")
-    print(f"To: {doctor_email}")
-    print(f"Subject: Cognitive Assessment Report - {patient_data.get('demographics', {}).get('name', 'Patient')}")
-    print(f"Attached: Consent Form, Full Report PDF")
-    print(f"------------------------------------------------")
-    
-    return jsonify({"status": "success", "message": f"Report sent to {doctor_email}"})
-
-# Serve other HTML pages in /pages
-@app.route("/<path:filename>")
-def serve_html(filename):
-    return send_from_directory("pages", filename)
-
-# Serve CSS files
-@app.route("/css/<path:filename>")
-def serve_css(filename):
-    return send_from_directory("css", filename)
-
-# Serve JS files
-@app.route("/js/<path:filename>")
-def serve_js(filename):
-    return send_from_directory("js", filename)
-
-# Serve Images
-@app.route("/images/<path:filename>")
-def serve_images(filename):
-    return send_from_directory("images", filename)
-
-# Serve assets (favicon, etc.)
-@app.route("/assets/<path:filename>")
-def serve_assets(filename):
-    return send_from_directory("assets", filename)
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
-
+import base64
+import os
+
+from flask import Flask, Response, send_file, send_from_directory, request, jsonify, stream_with_context
+
+from assets import AssetCache
+from bodies import MAX_DECODED, BodyError, RequestBodies, read_payload
+from image_variants import ImageVariants
+from metrics import Metrics
+from outbox import from_env as outbox_from_env
+from precache import Precache
+from reports import RISK_RULES, SECTIONS as REPORT_SECTIONS, ReportRenderer
+from risk import DEFAULT_RULES, compile_rules
+from rollups import Rollups
+from store import INSTRUMENTS, AssessmentStore, csv_lines, ndjson_lines
+from strokes import StrokeStore
+from uploads import MAX_CHUNKS, UploadError, UploadStore
+
+# INSTANCE_PATH (absolute) keeps results, uploads and caches outside the code
+app = Flask(__name__, static_folder="pages", instance_path=os.environ.get("INSTANCE_PATH") or None)
+
+# Static files are held in memory (with gzip/brotli variants) instead of
+# being read from disk on every hit. ASSET_WATCH_INTERVAL > 0 polls the
+# folders and reloads on deploys (see create_app); otherwise call assets.reload().
+assets = AssetCache(app.root_path)
+assets.load()
+
+# Resized WebP/JPEG variants of images/, rebuilt at startup only when an
+# original changes (see image_variants.py); serve_images negotiates on them.
+image_variants = ImageVariants(os.path.join(app.root_path, "images"),
+                               os.path.join(app.instance_path, "image-variants"))
+image_variants.build()
+
+# Ask browsers for the width hints image negotiation uses
+@app.after_request
+def accept_client_hints(resp):
+    if resp.mimetype == "text/html":
+        resp.headers["Accept-CH"] = "Sec-CH-Width, Sec-CH-Viewport-Width, Sec-CH-DPR"
+    return resp
+
+# Offline support: a service worker (registered by consent.html) precaches
+# every page and asset listed in the manifest, so instrument transitions never
+# wait on the network and only /api/* calls need it (see precache.py, js/sw.js).
+precache = Precache(assets, image_variants)
+
+@app.route("/precache-manifest.json")
+def precache_manifest():
+    manifest = precache.manifest()
+    resp = jsonify(manifest)
+    resp.set_etag(manifest["version"])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+@app.route("/sw.js")
+def service_worker():
+    body, etag = precache.service_worker()
+    resp = Response(body, mimetype="application/javascript")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+# Root route → serve index.html
+@app.route("/")
+def home():
+    return assets.response("pages", "index.html") or send_from_directory("pages", "index.html")
+
+# POST bodies may be gzip/deflate encoded (inflated as they are read, up to
+# MAX_DECODED_BODY bytes) and the JSON endpoints also take MessagePack or CBOR
+# with binary fields as raw bytes (see bodies.py).
+bodies = RequestBodies(int(os.environ.get("MAX_DECODED_BODY", MAX_DECODED)))
+bodies.init_app(app)
+
+@app.errorhandler(BodyError)
+def body_error(e):
+    return jsonify({"status": "error", "message": str(e)}), e.status
+
+# Assessment results are persisted server-side as each instrument finishes.
+# Writes go through a group-commit thread (see store.py), which also keeps the
+# dashboard rollups current (see rollups.py). Results are tagged with the
+# "site" the client sends, else this server's SITE.
+os.makedirs(app.instance_path, exist_ok=True)
+SITE = os.environ.get("SITE", "")
+results = AssessmentStore(os.environ.get("RESULTS_DB", os.path.join(app.instance_path, "results.sqlite3")),
+                          rollups=Rollups(RISK_RULES))
+
+@app.route("/api/results/<instrument>", methods=["POST"])
+def save_result(instrument):
+    if instrument not in INSTRUMENTS:
+        return jsonify({"status": "error", "message": f"Unknown instrument '{instrument}'."}), 404
+    data = read_payload(request)
+    session_id = data.get("session_id")
+    if not session_id or not isinstance(data.get("result"), dict):
+        return jsonify({"status": "error", "message": "session_id and result are required."}), 400
+    try:
+        result_id = results.add(session_id, instrument, data["result"], site=str(data.get("site") or SITE))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "id": result_id}), 201
+
+@app.route("/api/results/session/<session_id>")
+def session_results(session_id):
+    return jsonify(results.session(session_id))
+
+# Clinic dashboard: counts, score distributions and the LOW/MED/HIGH split for
+# days since..until (YYYY-MM-DD, inclusive), optionally one site; by=day adds
+# daily counts. Served from the rollup tables, never from the raw results.
+@app.route("/api/dashboard")
+def dashboard():
+    try:
+        return jsonify(results.dashboard(since=request.args.get("since"), until=request.args.get("until"),
+                                         site=request.args.get("site"), by_day=request.args.get("by") == "day"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "since and until are YYYY-MM-DD dates."}), 400
+
+# Streams every stored result as NDJSON (default) or CSV, page by page
+@app.route("/api/results/export")
+def export_results():
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"status": "error", "message": "format must be ndjson or csv."}), 400
+    rows = results.iter_rows(
+        instrument=request.args.get("instrument"),
+        since=request.args.get("since", type=float),
+        until=request.args.get("until", type=float),
+    )
+    if fmt == "csv":
+        body, mimetype = csv_lines(rows), "text/csv"
+    else:
+        body, mimetype = ndjson_lines(rows), "application/x-ndjson"
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="results.{fmt}"',
+    })
+
+# Clock drawings arrive as compact CDS1 stroke files (see strokes.py) and are
+# rasterized to PNG only when someone asks for the image.
+drawings = StrokeStore(os.path.join(app.instance_path, "strokes"))
+
+@app.route("/api/cdt/strokes", methods=["POST"])
+def upload_strokes():
+    data = request.get_data(cache=False)
+    try:
+        drawing_id = drawings.save(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({
+        "status": "success",
+        "id": drawing_id,
+        "image": f"/api/cdt/{drawing_id}.png",
+        "bytes": len(data),
+    }), 201
+
+@app.route("/api/cdt/<drawing_id>.png")
+def drawing_png(drawing_id):
+    try:
+        path = drawings.png_path(drawing_id)
+    except (KeyError, FileNotFoundError):
+        return jsonify({"status": "error", "message": "Unknown drawing."}), 404
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 422
+    # The id is the content hash, so the image can never change
+    resp = send_file(path, mimetype="image/png", etag=drawing_id)
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
+# Voice recordings are uploaded in numbered chunks while MediaRecorder runs.
+# Each chunk is streamed to disk as it arrives; after a dropped connection the
+# client asks which chunks made it and resends the rest (see uploads.py).
+audio = UploadStore(os.path.join(app.instance_path, "audio"))
+
+@app.errorhandler(UploadError)
+def upload_error(e):
+    return jsonify({"status": "error", "message": str(e), **e.extra}), e.status
+
+@app.route("/api/audio/uploads", methods=["POST"])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    upload_id = audio.create(data.get("mimetype"), data.get("session_id"))
+    return jsonify({"status": "success", "id": upload_id}), 201, {"Location": f"/api/audio/uploads/{upload_id}"}
+
+@app.route("/api/audio/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+def upload_chunk(upload_id, index):
+    size = audio.put_chunk(upload_id, index, request.stream, request.content_length)
+    return jsonify({"status": "success", "index": index, "bytes": size})
+
+@app.route("/api/audio/uploads/<upload_id>")
+def upload_status(upload_id):
+    return jsonify(audio.status(upload_id))
+
+@app.route("/api/audio/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+    chunks = data.get("chunks")
+    if not isinstance(chunks, int) or isinstance(chunks, bool) or not 1 <= chunks <= MAX_CHUNKS:
+        return jsonify({"status": "error",
+                        "message": f"chunks (the number of chunks sent, 1..{MAX_CHUNKS}) is required."}), 400
+    meta = audio.finalize(upload_id, chunks)
+    return jsonify({"status": "success", "id": upload_id, "bytes": meta["bytes"],
+                    "url": f"/api/audio/{upload_id}"})
+
+@app.route("/api/audio/<upload_id>")
+def audio_file(upload_id):
+    found = audio.recording(upload_id)
+    if found is None:
+        return jsonify({"status": "error", "message": "Unknown recording."}), 404
+    path, mimetype = found
+    return send_file(path, mimetype=mimetype, conditional=True)
+
+# Report PDFs are rendered in a process pool and cached on disk by a hash
+# of the payload, so re-sends and repeat downloads are free.
+reports = ReportRenderer(os.path.join(app.instance_path, "reports"),
+                         workers=int(os.environ.get("REPORT_WORKERS", "2")))
+
+def report_payload(data):
+    payload = {k: data.get(k) for k in REPORT_SECTIONS}
+    # Uploaded drawings are referenced by URL; the renderer wants the pixels
+    cdt = payload.get("cdt_data")
+    if cdt and cdt.get("strokes") and not str(cdt.get("image", "")).startswith("data:"):
+        try:
+            with open(drawings.png_path(cdt["strokes"]), "rb") as f:
+                png = base64.b64encode(f.read()).decode("ascii")
+            payload["cdt_data"] = dict(cdt, image=f"data:image/png;base64,{png}")
+        except (KeyError, FileNotFoundError, ValueError):
+            pass
+    return payload
+
+@app.route("/api/report.pdf", methods=["POST"])
+def report_pdf():
+    data = read_payload(request)
+    pdf = reports.render(report_payload(data))
+    return Response(pdf, mimetype="application/pdf", headers={
+        "Content-Disposition": 'attachment; filename="Cognitive_Assessment_Report.pdf"',
+    })
+
+# Overall risk index, server-side. The rule set is versioned and comes from
+# RISK_RULES (a JSON file, see risk.py), defaulting to the report.html rules.
+# Accepts one report payload, {"patients": [...]}, or {"columns": {...}} with
+# one list per rule for population-sized batches.
+@app.route("/api/risk", methods=["GET", "POST"])
+def risk_index():
+    if request.method == "GET":
+        return jsonify(RISK_RULES or DEFAULT_RULES)
+    data = read_payload(request)
+    try:
+        rules = compile_rules(data.get("rules") or RISK_RULES)
+        if "columns" in data:
+            _, points, levels = rules.score_columns(rules.parse_columns(data["columns"]))
+            return jsonify({"version": rules.version, "points": points.tolist(), "levels": levels.tolist()})
+        if "patients" in data:
+            return jsonify({"version": rules.version, "results": rules.score_many(data["patients"])})
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(rules.score(data))
+
+# Email Endpoint
+# Reports are queued in a durable outbox and delivered by background workers,
+# so the request returns as soon as the job is stored. Without SMTP_HOST the
+# workers use the mock transport and just log the message.
+outbox = outbox_from_env(app.instance_path, render=reports.render)
+
+@app.route("/api/send-email", methods=["POST"])
+def send_email():
+    data = read_payload(request)
+    doctor_email = data.get("doctor_email")
+    if not isinstance(doctor_email, str) or "@" not in doctor_email:
+        return jsonify({"status": "error", "message": "A valid recipient email is required."}), 400
+
+    job_id = outbox.enqueue(doctor_email, report_payload(data))
+    return jsonify({
+        "status": "queued",
+        "job_id": job_id,
+        "message": f"Report queued for delivery to {doctor_email}",
+    }), 202, {"Location": f"/api/send-email/{job_id}"}
+
+@app.route("/api/send-email/<job_id>")
+def send_email_status(job_id):
+    job = outbox.status(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job id."}), 404
+    return jsonify(job)
+
+# Serve other HTML pages in /pages
+@app.route("/<path:filename>")
+def serve_html(filename):
+    return assets.response("pages", filename) or send_from_directory("pages", filename)
+
+# Serve CSS files
+@app.route("/css/<path:filename>")
+def serve_css(filename):
+    return assets.response("css", filename) or send_from_directory("css", filename)
+
+# Serve JS files
+@app.route("/js/<path:filename>")
+def serve_js(filename):
+    return assets.response("js", filename) or send_from_directory("js", filename)
+
+# Serve Images
+@app.route("/images/<path:filename>")
+def serve_images(filename):
+    return (image_variants.response(filename) or assets.response("images", filename)
+            or send_from_directory("images", filename))
+
+# Serve assets (favicon, etc.)
+@app.route("/assets/<path:filename>")
+def serve_assets(filename):
+    return assets.response("assets", filename) or send_from_directory("assets", filename)
+
+# Request counts, latency and response-size histograms per endpoint, summed
+# over all gunicorn workers (see metrics.py). METRICS_SLOW_MS > 0 also samples
+# the stacks of requests slower than that, served as folded stacks.
+@app.route("/metrics")
+def metrics_text():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics/slow")
+def metrics_slow():
+    return Response(metrics.slow_stacks(), mimetype="text/plain")
+
+metrics = Metrics(os.environ.get("METRICS_DIR", os.path.join(app.instance_path, "metrics")),
+                  app.view_functions, slow_ms=float(os.environ.get("METRICS_SLOW_MS", "0")))
+metrics.init_app(app)  # after every route is registered
+
+# WSGI entry point. Background threads (outbox delivery, asset watching) are
+# started here rather than at import, once per serving process:
+#   production:  gunicorn -c gunicorn.conf.py      (runs "app:create_app()")
+#   development: python app.py
+def create_app():
+    outbox.start()
+    if float(os.environ.get("ASSET_WATCH_INTERVAL", "0")) > 0:
+        assets.watch(float(os.environ["ASSET_WATCH_INTERVAL"]))
+    return app
+
+if __name__ == "__main__":
+    create_app().run(host="0.0.0.0", port=5000)
+
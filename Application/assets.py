@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+
+from flask import Response, request
+
+try:
+    import brotli  # optional: br variants are skipped when missing
+except ImportError:
+    brotli = None
+
+STATIC_FOLDERS = ("pages", "css", "js", "images", "assets")
+
+# Only text-like payloads are worth compressing; JPEG/PNG are already packed
+COMPRESSIBLE = ("text/", "application/javascript", "application/json",
+                "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon")
+
+# Long-lived caching is only safe when the URL carries the content hash
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class Asset:
+    __slots__ = ("body", "gzip", "br", "etag", "mimetype", "mtime")
+
+    def __init__(self, body, mimetype, mtime):
+        self.body = body
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.gzip = None
+        self.br = None
+        if mimetype.startswith(COMPRESSIBLE):
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                self.gzip = gz
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                if len(br) < len(body):
+                    self.br = br
+
+
+class AssetCache:
+    """In-memory copy of the static folders with precompressed variants."""
+
+    def __init__(self, root, folders=STATIC_FOLDERS):
+        self.root = root
+        self.folders = folders
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.generation = 0  # bumped on every reload, for things derived from the files
+
+    # ---------- Loading ----------
+    def _scan(self):
+        # (folder, relative path) -> (absolute path, mtime)
+        found = {}
+        for folder in self.folders:
+            base = os.path.join(self.root, folder)
+            for dirpath, _dirs, files in os.walk(base):
+                for name in files:
+                    path = os.path.join(dirpath, name)
+                    rel = os.path.relpath(path, base).replace(os.sep, "/")
+                    found[(folder, rel)] = (path, os.stat(path).st_mtime_ns)
+        return found
+
+    def reload(self):
+        """Re-read changed files; unchanged entries keep their variants."""
+        old = self._assets
+        assets = {}
+        for key, (path, mtime) in self._scan().items():
+            cached = old.get(key)
+            if cached is not None and cached.mtime == mtime:
+                assets[key] = cached
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            assets[key] = Asset(body, mimetype, mtime)
+        # Swap the whole dict so readers never see a half-built cache
+        with self._lock:
+            self._assets = assets
+            self.generation += 1
+        return len(assets)
+
+    load = reload
+
+    def watch(self, interval=2.0):
+        """Poll the folders and reload whenever a file is added, removed or touched."""
+        if self._watcher is not None:
+            return
+
+        def run():
+            seen = {k: m for k, (_p, m) in self._scan().items()}
+            while True:
+                time.sleep(interval)
+                try:
+                    now = {k: m for k, (_p, m) in self._scan().items()}
+                except OSError:
+                    continue
+                if now != seen:
+                    seen = now
+                    self.reload()
+
+        self._watcher = threading.Thread(target=run, name="asset-watch", daemon=True)
+        self._watcher.start()
+
+    # ---------- Lookup ----------
+    def get(self, folder, filename):
+        return self._assets.get((folder, filename))
+
+    def items(self):
+        return list(self._assets.items())
+
+    def fingerprint(self, folder, filename):
+        asset = self.get(folder, filename)
+        return asset.etag if asset else None
+
+    def url(self, prefix, folder, filename):
+        """Content-hashed URL, e.g. /css/styles.css?v=<etag>, cacheable forever."""
+        tag = self.fingerprint(folder, filename)
+        url = f"{prefix}/{filename}"
+        return f"{url}?v={tag}" if tag else url
+
+    # ---------- Serving ----------
+    def response(self, folder, filename):
+        """Build a response for a cached file, or None if it isn't cached."""
+        asset = self.get(folder, filename)
+        if asset is None:
+            return None
+
+        cache_control = IMMUTABLE if request.args.get("v") == asset.etag else REVALIDATE
+
+        # If-None-Match uses weak comparison, so any encoding of the same bytes matches
+        if_none_match = request.headers.get("If-None-Match", "")
+        if if_none_match:
+            tags = {t.strip().removeprefix("W/").strip('"') for t in if_none_match.split(",")}
+            if "*" in tags or {asset.etag, asset.etag + "-br", asset.etag + "-gz"} & tags:
+                resp = Response(status=304)
+                resp.headers["ETag"] = f'"{asset.etag}"'
+                resp.headers["Cache-Control"] = cache_control
+                resp.headers["Vary"] = "Accept-Encoding"
+                return resp
+
+        body, encoding, etag = asset.body, None, asset.etag
+        accept = request.accept_encodings
+        if asset.br is not None and accept.quality("br") > 0:
+            body, encoding, etag = asset.br, "br", asset.etag + "-br"
+        elif asset.gzip is not None and accept.quality("gzip") > 0:
+            body, encoding, etag = asset.gzip, "gzip", asset.etag + "-gz"
+
+        resp = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.headers["ETag"] = f'"{etag}"'
+        resp.headers["Cache-Control"] = cache_control
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp
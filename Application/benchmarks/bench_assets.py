@@ -0,0 +1,52 @@
+# Requests/second for the static routes, disk (send_from_directory) vs in-memory cache.
+# Run from Application/:  python -m benchmarks.bench_assets [seconds-per-url]
+import sys
+import time
+
+from flask import Flask, send_from_directory
+
+from app import app as cached_app
+
+URLS = ["/", "/faq.html", "/voice_cog.html", "/mcft.html",
+        "/css/styles.css", "/js/scripts.js", "/images/bg-1.jpg"]
+HEADERS = {"Accept-Encoding": "gzip, br"}
+
+
+def disk_app():
+    # The original routes, served straight from disk on every hit
+    app = Flask("disk", root_path=cached_app.root_path)
+
+    @app.route("/")
+    def home():
+        return send_from_directory("pages", "index.html")
+
+    for prefix, folder in (("", "pages"), ("/css", "css"), ("/js", "js"),
+                           ("/images", "images"), ("/assets", "assets")):
+        app.add_url_rule(f"{prefix}/<path:filename>", f"serve_{folder}",
+                         lambda filename, folder=folder: send_from_directory(folder, filename))
+    return app
+
+
+def rps(app, url, seconds, headers):
+    client = app.test_client()
+    n, end = 0, time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        resp = client.get(url, headers=headers)
+        resp.close()
+        n += 1
+    return n / seconds
+
+
+def main(seconds=1.0):
+    before = disk_app()
+    print(f"{'url':<20}{'disk rps':>12}{'cached rps':>12}{'304 rps':>12}{'speedup':>9}")
+    for url in URLS:
+        a = rps(before, url, seconds, HEADERS)
+        b = rps(cached_app, url, seconds, HEADERS)
+        etag = cached_app.test_client().get(url, headers=HEADERS).headers["ETag"]
+        c = rps(cached_app, url, seconds, dict(HEADERS, **{"If-None-Match": etag}))
+        print(f"{url:<20}{a:>12.0f}{b:>12.0f}{c:>12.0f}{b / a:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
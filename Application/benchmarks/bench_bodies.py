@@ -0,0 +1,144 @@
+# Report payload encodings: bytes on the wire and server-side parse time for
+# the same /api/send-email body as JSON (the drawing as a base64 data: URL),
+# JSON gzipped or deflated, MessagePack and CBOR (the drawing as raw bytes),
+# plus the end-to-end POST through the app and the upload time on a Fast 3G
+# link (modelled from the byte count, as in bench_offline). Ends with a zip bomb, which must
+# be refused with 413 without inflating it.
+# Run from Application/:  python -m benchmarks.bench_bodies [rounds]
+import base64
+import gzip
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from PIL import Image, ImageDraw
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+os.environ.setdefault("INSTANCE_PATH", tempfile.mkdtemp(prefix="bench_bodies_"))
+
+from bodies import RequestBodies, cbor2, msgpack, read_payload  # noqa: E402
+from app import app  # noqa: E402
+
+UPLOAD = 675_000 / 8  # Fast 3G upload, bytes/s
+
+
+def clock_png(size=600, seed=0):
+    # A hand-drawn looking clock: wobbly circle, numbers as scribbles, two hands
+    rnd = np.random.default_rng(seed)
+    img = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(img)
+    c, r = size / 2, size * 0.42
+    ring = [(c + (r + rnd.normal(0, 3)) * math.cos(a), c + (r + rnd.normal(0, 3)) * math.sin(a))
+            for a in np.linspace(0, 2 * math.pi, 180)]
+    draw.line(ring + ring[:1], fill="black", width=4)
+    for h in range(12):
+        a = h / 12 * 2 * math.pi - math.pi / 2
+        x, y = c + 0.8 * r * math.cos(a), c + 0.8 * r * math.sin(a)
+        draw.line([(x + rnd.normal(0, 8), y + rnd.normal(0, 8)) for _ in range(6)], fill="black", width=3)
+    draw.line([(c, c), (c + 0.5 * r, c - 0.2 * r)], fill="black", width=5)
+    draw.line([(c, c), (c - 0.1 * r, c - 0.75 * r)], fill="black", width=4)
+    buf = io.BytesIO()
+    img.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def report_body(png):
+    """The body report.html sends, with the drawing as raw bytes."""
+    rnd = np.random.default_rng(1)
+    return {
+        "doctor_email": "gp@example.org",
+        "patient_data": {"demographics": {"name": "Bench Patient", "age": 74, "email": "gp@example.org"}},
+        "faq_data": {"totalScore": 11, "answers": {f"q{i}": int(rnd.integers(0, 4)) for i in range(10)}},
+        "voice_data": {"metrics": {"total": 8.5, "words": 112, "pauses": 9},
+                       "transcript": " ".join(["the quick brown fox jumps over the lazy dog"] * 25)},
+        "cdt_data": {"scores": {"total": 13, "contour": 2, "numbers": 5, "hands": 6}, "image": png,
+                     "strokes": "a1b2c3d4e5f60718293a4b5c6d7e8f90"},
+        "mcft_data": {"scores": {"total": 18},
+                      "trials": [{"rt": float(rnd.uniform(300, 2000)), "ok": bool(rnd.random() < 0.8)}
+                                 for _ in range(60)]},
+    }
+
+
+def as_json(body):
+    def default(v):
+        return f"data:image/png;base64,{base64.b64encode(v).decode('ascii')}"
+    return json.dumps(body, default=default).encode()
+
+
+def encodings(body):
+    """label -> (wire bytes, headers)"""
+    js = as_json(body)
+    out = {
+        "json": (js, {"Content-Type": "application/json"}),
+        "json+gzip": (gzip.compress(js, 6), {"Content-Type": "application/json", "Content-Encoding": "gzip"}),
+        "json+deflate": (zlib.compress(js, 6), {"Content-Type": "application/json", "Content-Encoding": "deflate"}),
+    }
+    if msgpack is not None:
+        mp = msgpack.packb(body)
+        out["msgpack"] = (mp, {"Content-Type": "application/msgpack"})
+        out["msgpack+gzip"] = (gzip.compress(mp, 6), {"Content-Type": "application/msgpack",
+                                                       "Content-Encoding": "gzip"})
+    if cbor2 is not None:
+        out["cbor"] = (cbor2.dumps(body), {"Content-Type": "application/cbor"})
+    return out
+
+
+def timed(fn, rounds):
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main(rounds=200):
+    png = clock_png()
+    body = report_body(png)
+    expected = json.loads(as_json(body))
+    client = app.test_client()
+    parsed = []
+
+    def inner(environ, start_response):
+        parsed.append(read_payload(Request(environ)))
+        return []
+
+    parser = RequestBodies().wsgi(inner)
+    print(f"report body with a {len(png):,} byte clock drawing, median of {rounds} rounds")
+    print(f"{'encoding':<14}{'wire bytes':>11}{'vs json':>9}{'parse ms':>10}{'POST ms':>9}{'3G up ms':>10}")
+    base = None
+    for label, (wire, headers) in encodings(body).items():
+        # Server-side parse alone: the bodies middleware and read_payload, no Flask
+        def parse_once():
+            environ = EnvironBuilder(method="POST", data=wire, headers=headers).get_environ()
+            parser(environ, lambda *a: None)
+
+        parse_once()
+        assert parsed[-1] == expected, label
+        parse_ms = timed(parse_once, rounds)
+        post_ms = timed(lambda: client.post("/api/risk", data=wire, headers=headers).close(), rounds)
+        base = base or len(wire)
+        print(f"{label:<14}{len(wire):>11,}{len(wire) / base:>8.0%}{parse_ms:>10.3f}{post_ms:>9.3f}{len(wire) / UPLOAD * 1000:>10.0f}")
+
+    # 1 GiB of zeros is about 1 MB gzipped; it must be refused, not inflated
+    co = zlib.compressobj(9, zlib.DEFLATED, 31)
+    block = bytes(1 << 20)
+    bomb = b"".join(co.compress(block) for _ in range(1024)) + co.flush()
+    t0 = time.perf_counter()
+    resp = client.post("/api/risk", data=bomb, headers={"Content-Type": "application/json",
+                                                         "Content-Encoding": "gzip"})
+    ms = (time.perf_counter() - t0) * 1000
+    print(f"zip bomb      {len(bomb):>11,} bytes -> {resp.status_code} in {ms:.0f} ms")
+    assert resp.status_code == 413, resp.status_code
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
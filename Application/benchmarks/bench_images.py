@@ -0,0 +1,44 @@
+# Image bytes per device before and after negotiation: every picture the pages
+# use, fetched the way a phone, our tablets and a desktop would (Accept plus a
+# width hint) against the originals, with the transfer time on a slow link.
+# Run from Application/:  python -m benchmarks.bench_images [mbit/s]
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("INSTANCE_PATH", tempfile.mkdtemp(prefix="bench_images_"))
+
+from app import app  # noqa: E402
+
+# name -> CSS width it is drawn at (None: full viewport)
+IMAGES = {"header-bg.jpg": None, "bg-1.jpg": None, "mcft_apple.png": 200, "mcft_bicycle.png": 200,
+          "mcft_telephone.png": 200, "mcft_house_tree.png": 300}
+DEVICES = {  # viewport CSS px, DPR, WebP
+    "phone": (390, 3.0, True),
+    "tablet": (820, 2.0, True),
+    "old tablet": (768, 2.0, False),
+    "desktop": (1920, 1.0, True),
+}
+
+
+def main(mbit=10.0):
+    client = app.test_client()
+    original = sum(os.path.getsize(os.path.join(app.root_path, "images", n)) for n in IMAGES)
+    print(f"{'device':<12}{'bytes':>12}{'vs original':>13}{'@' + format(mbit, 'g') + ' Mbit/s':>14}{'serve':>10}")
+    print(f"{'original':<12}{original:>12,}{'':>13}{original * 8 / mbit / 1e3:>11.0f} ms")
+    for device, (viewport, dpr, webp) in DEVICES.items():
+        headers = {"Accept": "image/avif,image/webp,*/*" if webp else "image/png,image/*;q=0.8,*/*;q=0.5",
+                   "Sec-CH-Viewport-Width": str(viewport), "Sec-CH-DPR": str(dpr)}
+        total, t0 = 0, time.perf_counter()
+        for name, css_width in IMAGES.items():
+            url = f"/images/{name}" if css_width is None else f"/images/{name}?w={round(css_width * dpr)}"
+            resp = client.get(url, headers=headers)
+            total += len(resp.data)
+            resp.close()
+        serve = (time.perf_counter() - t0) / len(IMAGES) * 1000
+        print(f"{device:<12}{total:>12,}{total / original:>12.0%}{total * 8 / mbit / 1e3:>11.0f} ms{serve:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0)
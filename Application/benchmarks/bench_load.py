@@ -0,0 +1,281 @@
+# Load test: virtual patients replay whole assessment sessions (index, consent,
+# each instrument page with its static assets and API calls, then the report,
+# risk index and send-email) and every request's latency is recorded by route.
+# Prints throughput and p50/p95/p99 per route; exits non-zero on errors or when
+# a route's p95 is over --p95-budget, so it can gate a deploy.
+#
+# Without --url it starts the app itself in a scratch INSTANCE_PATH, under
+# gunicorn with gunicorn.conf.py (or the Flask dev server with --server dev).
+# Run from Application/:
+#   python -m benchmarks.bench_load [--users 32] [--duration 30] [--url http://host:port]
+#                                   [--think 0] [--p95-budget ms] [--json report.json]
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urljoin, urlsplit
+
+from strokes import encode
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTRUMENT_PAGES = ("faq.html", "voice_cog.html", "cdt.html", "mcft.html")
+_LOCAL_REF = re.compile(r'(?:href|src)="((?![a-z]+:|#|//)[^"]+\.(?:css|js|png|jpe?g|ico|svg|webp))"')
+
+
+# ---------- Client ----------
+class Client:
+    """One keep-alive connection, like a browser tab; records every request."""
+
+    def __init__(self, base, samples):
+        parts = urlsplit(base)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.samples = samples
+        self.conn = None
+        self.cached = set()  # static assets this "browser" already has
+
+    def request(self, route, method, path, body=None, headers=None, expect=(200,)):
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        headers.setdefault("Accept-Encoding", "gzip, br")
+        t0 = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            data = resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            data, status = b"", 0
+        self.samples.append((route, time.perf_counter() - t0, status in expect))
+        return status, data
+
+    def json(self, route, method, path, body=None, headers=None, expect=(200, 201, 202)):
+        status, data = self.request(route, method, path, body, headers, expect=expect)
+        try:
+            return json.loads(data) if status in expect else None
+        except ValueError:
+            return None
+
+    def page(self, name, assets):
+        self.request(f"GET /{name}", "GET", "/" if name == "index.html" else f"/{name}")
+        for url in assets.get(name, ()):
+            if url not in self.cached:
+                self.cached.add(url)
+                self.request(f"GET /{url.split('/')[1]}/*", "GET", url)
+
+
+def page_assets(base):
+    """Local CSS/JS/images each page references, resolved the way a browser would."""
+    probe = Client(base, [])
+    assets = {}
+    for name in ("index.html", "consent.html", *INSTRUMENT_PAGES, "report.html"):
+        status, html = probe.request(name, "GET", f"/{name}", headers={"Accept-Encoding": "identity"})
+        if status != 200:
+            raise RuntimeError(f"GET /{name} returned {status}")
+        refs = _LOCAL_REF.findall(html.decode("utf-8", "replace"))
+        assets[name] = list(dict.fromkeys(urlsplit(urljoin(f"{base}/{name}", r)).path for r in refs))
+    return assets
+
+
+# ---------- One assessment session ----------
+def drawing(rnd):
+    # A wobbly clock face and two hands, about as many points as a real one
+    r = rnd.uniform(120, 170)
+    face = [(200 + round((r + rnd.uniform(-3, 3)) * math.cos(a / 60 * math.tau)),
+             200 + round((r + rnd.uniform(-3, 3)) * math.sin(a / 60 * math.tau))) for a in range(61)]
+    hands = [[(200, 200), (200 + round(r * 0.5 * math.cos(a)), 200 + round(r * 0.5 * math.sin(a)))]
+             for a in (rnd.uniform(0, math.tau), rnd.uniform(0, math.tau))]
+    return encode({"width": 400, "height": 400,
+                   "strokes": [{"tool": "pen", "color": "#000000", "width": 3, "points": pts}
+                               for pts in (face, *hands)]})
+
+
+def session(c, assets, rnd, think):
+    sid = str(uuid.uuid4())
+    pause = (lambda: time.sleep(rnd.uniform(0.5, 1.5) * think)) if think else (lambda: None)
+
+    def save(instrument, result):
+        c.json("POST /api/results/<instrument>", "POST", f"/api/results/{instrument}",
+               {"session_id": sid, "result": result})
+
+    c.page("index.html", assets)
+    pause()
+    c.page("consent.html", assets)
+    patient = {"demographics": {"name": f"Load {sid[:8]}", "age": rnd.randint(55, 90)}}
+    save("patient", patient)
+    pause()
+
+    c.page("faq.html", assets)
+    faq = {"totalScore": rnd.randint(0, 30), "answers": [rnd.choice("abcd") for _ in range(10)]}
+    save("faq", faq)
+    pause()
+
+    c.page("voice_cog.html", assets)
+    voice = {"metrics": {"total": f"{rnd.uniform(0, 45):.1f}"}}
+    up = c.json("POST /api/audio/uploads", "POST", "/api/audio/uploads",
+                {"mimetype": "audio/webm", "session_id": sid})
+    if up:
+        chunks = rnd.randint(3, 8)  # 3 s each, ~24 KB at Opus voice bitrates
+        for i in range(chunks):
+            c.request("PUT /api/audio/uploads/<id>/chunks/<n>", "PUT",
+                      f"/api/audio/uploads/{up['id']}/chunks/{i}", body=rnd.randbytes(24_000),
+                      headers={"Content-Type": "application/octet-stream"})
+        done = c.json("POST /api/audio/uploads/<id>/finalize", "POST",
+                      f"/api/audio/uploads/{up['id']}/finalize", {"chunks": chunks})
+        voice["audio"] = done and {"upload_id": done["id"], "url": done["url"], "bytes": done["bytes"]}
+    save("voice", voice)
+    pause()
+
+    c.page("cdt.html", assets)
+    cdt = {"scores": {"total": rnd.randint(0, 30)}}
+    saved = c.json("POST /api/cdt/strokes", "POST", "/api/cdt/strokes", drawing(rnd),
+                   headers={"Content-Type": "application/octet-stream"})
+    if saved:
+        cdt.update(strokes=saved["id"], image=saved["image"])
+    save("cdt", cdt)
+    pause()
+
+    c.page("mcft.html", assets)
+    mcft = {"scores": {"total": rnd.randint(0, 40)}}
+    save("mcft", mcft)
+    pause()
+
+    c.page("report.html", assets)
+    if saved:
+        c.request("GET /api/cdt/<id>.png", "GET", saved["image"])
+    report = {"patient_data": patient, "faq_data": faq, "voice_data": voice, "cdt_data": cdt, "mcft_data": mcft}
+    c.json("POST /api/risk", "POST", "/api/risk", report)
+    c.json("POST /api/send-email", "POST", "/api/send-email", dict(report, doctor_email="gp@example.org"))
+
+
+# ---------- Running ----------
+def virtual_user(base, assets, samples, sessions, seed, think, stop):
+    rnd = random.Random(seed)
+    c = Client(base, samples)
+    while not stop.is_set():
+        session(c, assets, rnd, think)
+        sessions.append(1)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind):
+    port = free_port()
+    instance = tempfile.mkdtemp(prefix="bench_load_")
+    env = dict(os.environ, INSTANCE_PATH=instance)
+    if kind == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "app:create_app()", "run", "--port", str(port)]
+    proc = subprocess.Popen(cmd, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return base, proc, instance
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def summarize(samples, elapsed):
+    by_route = {}
+    for route, latency, ok in samples:
+        by_route.setdefault(route, ([], [0]))
+        by_route[route][0].append(latency)
+        by_route[route][1][0] += not ok
+    rows = []
+    for route, (lat, errors) in sorted(by_route.items()):
+        lat.sort()
+        rows.append({"route": route, "requests": len(lat), "errors": errors[0], "rps": len(lat) / elapsed,
+                     **{k: percentile(lat, p) * 1000 for k, p in (("p50", .5), ("p95", .95), ("p99", .99))},
+                     "max": lat[-1] * 1000})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay assessment sessions and report latency per route.")
+    parser.add_argument("--url", help="server to test (default: start one)")
+    parser.add_argument("--server", choices=("gunicorn", "dev"), default="gunicorn")
+    parser.add_argument("--users", type=int, default=32, help="concurrent virtual patients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--think", type=float, default=0, help="mean pause between pages, seconds")
+    parser.add_argument("--p95-budget", type=float, help="fail if any route's p95 exceeds this many ms")
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args(argv)
+
+    proc = instance = None
+    base = args.url
+    if base is None:
+        base, proc, instance = start_server(args.server)
+    try:
+        assets = page_assets(base)
+        session(Client(base, []), assets, random.Random(-1), 0)  # warm caches and pools
+        samples, sessions, stop = [], [], threading.Event()
+        users = [threading.Thread(target=virtual_user, args=(base, assets, samples, sessions, n, args.think, stop))
+                 for n in range(args.users)]
+        t0 = time.perf_counter()
+        for u in users:
+            u.start()
+        time.sleep(args.duration)
+        stop.set()
+        for u in users:
+            u.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(30)
+            shutil.rmtree(instance, ignore_errors=True)
+
+    rows = summarize(samples, elapsed)
+    print(f"{base}  {args.users} users  {elapsed:.1f}s  {len(sessions)} sessions ({len(sessions) / elapsed:.1f}/s)"
+          f"  {len(samples)} requests ({len(samples) / elapsed:.0f}/s)")
+    print(f"{'route':<44}{'n':>7}{'err':>5}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for r in rows:
+        print(f"{r['route']:<44}{r['requests']:>7}{r['errors']:>5}{r['rps']:>8.1f}"
+              f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['max']:>9.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": base, "users": args.users, "seconds": elapsed,
+                       "sessions": len(sessions), "routes": rows}, f, indent=2)
+
+    failed = [r["route"] for r in rows if r["errors"]]
+    if args.p95_budget is not None:
+        failed += [r["route"] for r in rows if r["p95"] > args.p95_budget]
+    if failed:
+        print(f"FAILED: {', '.join(dict.fromkeys(failed))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# Cost of the request metrics: one observe() call, and a cached static file
+# served through the Flask test client with and without the middleware (and
+# with slow-request profiling on).
+# Run from Application/:  python -m benchmarks.bench_metrics [requests]
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("INSTANCE_PATH", tempfile.mkdtemp(prefix="bench_metrics_"))
+
+from app import app  # noqa: E402
+from metrics import Metrics  # noqa: E402
+
+URL = "/css/styles.css"
+
+
+def per_request(wsgi_app, n):
+    app.wsgi_app = wsgi_app
+    client = app.test_client()
+    for _ in range(200):
+        client.get(URL).close()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        client.get(URL).close()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main(n=20000):
+    m = Metrics(tempfile.mkdtemp(), app.view_functions)
+    m.observe("serve_css", 200, 0.001, 1000)
+    t0 = time.perf_counter()
+    for _ in range(n * 10):
+        m.observe("serve_css", 200, 0.001, 1000)
+    print(f"{'observe()':<33}{(time.perf_counter() - t0) / (n * 10) * 1e6:8.1f} us")
+
+    instrumented = app.wsgi_app
+    bare = instrumented.__wrapped__
+    profiled = Metrics(tempfile.mkdtemp(), app.view_functions, slow_ms=1000).wsgi(bare)
+    base = per_request(bare, n)
+    print(f"GET {URL} {'bare':<17}{base:8.1f} us")
+    for label, wsgi_app in (("metrics", instrumented), ("metrics+profiler", profiled)):
+        us = per_request(wsgi_app, n)
+        print(f"GET {URL} {label:<17}{us:8.1f} us  (+{us - base:.1f} us)")
+    app.wsgi_app = instrumented
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,180 @@
+# Page-transition latency with the network throttled or cut: a browser walks
+# the assessment (consent -> faq -> voice_cog -> cdt -> mcft -> report) with
+# and without the service worker (precache.py, js/sw.js) and reports the
+# navigation time of each transition, from navigationStart to loadEventEnd.
+#
+#   network       worker blocked, HTTP cache warm (a return visit today)
+#   worker        worker installed from consent.html, same throttling
+#   worker/cut    worker installed, browser offline
+#   network/cut   worker blocked, browser offline (the outreach failure case)
+#
+# Needs Playwright with Chromium (pip install playwright && playwright install
+# chromium). Without it, or with --model, it instead counts the round trips
+# and bytes each transition needs from the server and models the time on the
+# chosen link; nothing is measured in that mode.
+# Run from Application/:
+#   python -m benchmarks.bench_offline [--profile fast3g|slow3g|lan] [--rounds 3] [--url http://host:port]
+#                                      [--model] [--json report.json]
+import argparse
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from playwright.sync_api import Error as PlaywrightError, sync_playwright
+except ImportError:
+    sync_playwright = PlaywrightError = None
+
+from benchmarks.bench_load import _LOCAL_REF, percentile, start_server
+
+FLOW = ("consent.html", "faq.html", "voice_cog.html", "cdt.html", "mcft.html", "report.html")
+# Chrome DevTools presets: round-trip ms, download and upload bytes/s
+PROFILES = {
+    "lan": (2, 12_500_000, 12_500_000),
+    "fast3g": (562.5, 1_440_000 / 8, 675_000 / 8),
+    "slow3g": (2000, 400_000 / 8, 400_000 / 8),
+}
+_EXTERNAL = re.compile(r'<(?:script|link)\b[^>]*?\b(?:src|href)="(https://[^"]+)"')
+
+
+# ---------- Browser ----------
+def throttle(context, page, profile):
+    latency, down, up = PROFILES[profile]
+    cdp = context.new_cdp_session(page)
+    cdp.send("Network.enable")
+    cdp.send("Network.emulateNetworkConditions",
+             {"offline": False, "latency": latency, "downloadThroughput": down, "uploadThroughput": up})
+
+
+def walk(page, base, rounds):
+    """Navigation ms for every page of the flow, None where the page failed to load."""
+    times = []
+    for _ in range(rounds):
+        for name in FLOW:
+            try:
+                page.goto(f"{base}/{name}", wait_until="load", timeout=60_000)
+                times.append(page.evaluate(
+                    "(() => { const n = performance.getEntriesByType('navigation')[0];"
+                    " return n.loadEventEnd - n.startTime; })()"))
+            except PlaywrightError:
+                times.append(None)
+    return times
+
+
+def scenario(browser, base, profile, rounds, worker, offline):
+    context = browser.new_context(service_workers="allow" if worker else "block")
+    page = context.new_page()
+    page.goto(f"{base}/consent.html", wait_until="load")
+    if worker:
+        page.evaluate("navigator.serviceWorker.ready")
+        page.wait_for_function("navigator.serviceWorker.controller !== null", timeout=60_000)
+    else:
+        walk(page, base, 1)  # warm the HTTP cache, as a returning tablet would have it
+    if offline:
+        context.set_offline(True)
+    else:
+        throttle(context, page, profile)
+    times = walk(page, base, rounds)
+    context.close()
+    return times
+
+
+def measure(base, profile, rounds):
+    runs = {}
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch()
+        for label, worker, offline in (("network", False, False), ("worker", True, False),
+                                       ("worker/cut", True, True), ("network/cut", False, True)):
+            runs[label] = scenario(browser, base, profile, rounds, worker, offline)
+        browser.close()
+    return runs
+
+
+# ---------- Model (no browser) ----------
+def model(profile):
+    """Round trips and bytes per transition, and the time they would take on the link."""
+    os.environ.setdefault("INSTANCE_PATH", tempfile.mkdtemp(prefix="bench_offline_"))
+    from app import app, precache  # noqa: E402 (imported late: INSTANCE_PATH first)
+
+    latency, down, _ = PROFILES[profile]
+    client = app.test_client()
+    manifest = {e["url"]: e for e in precache.manifest()["entries"]}
+    runs = {"network": [], "worker": [], "worker/cut": [], "network/cut": []}
+    print(f"{'page':<16}{'requests':>9}{'bytes':>10}{'precached':>11}")
+    for name in FLOW:
+        html = client.get(f"/{name}").get_data(as_text=True)
+        local = {posixpath.normpath(posixpath.join("/", ref.split("?")[0])) for ref in _LOCAL_REF.findall(html)}
+        urls = [f"/{name}", *sorted(local), *sorted(set(_EXTERNAL.findall(html)))]
+        size = sum(manifest.get(u, {}).get("bytes") or 0 for u in urls)
+        cached = sum(u in manifest for u in urls)
+        print(f"{name:<16}{len(urls):>9}{size:>10,}{cached:>8}/{len(urls)}")
+        # Without the worker: the page itself, then one parallel wave of
+        # revalidations (everything is no-cache or CDN-cached)
+        runs["network"].append(2 * latency + manifest[f"/{name}"]["bytes"] / down * 1000)
+        runs["network/cut"].append(None)
+        # With it, every request is a cache hit; a few ms of parse and paint aren't modelled
+        runs["worker"].append(0.0 if cached == len(urls) else 2 * latency)
+        runs["worker/cut"].append(0.0 if cached == len(urls) else None)
+    return runs
+
+
+def report(runs):
+    rows = []
+    for label, times in runs.items():
+        ok = sorted(t for t in times if t is not None)
+        rows.append({"scenario": label, "transitions": len(times), "failed": len(times) - len(ok),
+                     **({k: percentile(ok, p) for k, p in (("p50", .5), ("p95", .95))} | {"max": ok[-1]}
+                        if ok else {"p50": None, "p95": None, "max": None})})
+    fmt = lambda v: f"{v:>9.0f}" if v is not None else f"{'-':>9}"
+    print(f"{'scenario':<14}{'pages':>7}{'failed':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for r in rows:
+        print(f"{r['scenario']:<14}{r['transitions']:>7}{r['failed']:>8}{fmt(r['p50'])}{fmt(r['p95'])}{fmt(r['max'])}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assessment page-transition latency, throttled or offline.")
+    parser.add_argument("--url", help="server to test (default: start one)")
+    parser.add_argument("--server", choices=("gunicorn", "dev"), default="gunicorn")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast3g")
+    parser.add_argument("--rounds", type=int, default=3, help="times to walk the flow per scenario")
+    parser.add_argument("--model", action="store_true", help="don't drive a browser; model the transitions")
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args(argv)
+
+    if args.model or sync_playwright is None:
+        if not args.model:
+            print("playwright is not installed; modelling instead of measuring (see --model)")
+        runs = model(args.profile)
+        mode = "modelled"
+    else:
+        proc = instance = None
+        base = args.url
+        if base is None:
+            base, proc, instance = start_server(args.server)
+        try:
+            start = time.perf_counter()
+            runs = measure(base.rstrip("/"), args.profile, args.rounds)
+            print(f"measured in {time.perf_counter() - start:.0f}s against {base}")
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+                shutil.rmtree(instance, ignore_errors=True)
+        mode = "measured"
+    print(f"{mode}, {args.profile} profile (cut = offline)")
+    rows = report(runs)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"mode": mode, "profile": args.profile, "scenarios": rows}, f, indent=1)
+    # With the worker installed, no page may fail when the network is cut
+    return 1 if next(r for r in rows if r["scenario"] == "worker/cut")["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
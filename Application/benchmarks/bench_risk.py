@@ -0,0 +1,93 @@
+# Risk index throughput: the old per-patient heuristic vs risk.RuleSet, on
+# report payloads and on columns, plus re-stratifying after a threshold change
+# (and checking that cached report PDFs don't survive it).
+# Run from Application/:  python -m benchmarks.bench_risk [patients]
+import copy
+import sys
+import time
+
+import numpy as np
+
+from reports import cache_key
+from risk import DEFAULT_RULES, compile_rules
+
+
+def heuristic(payload):
+    # reports.risk_level as it was, a transcription of report.html
+    faq, voice = payload.get("faq_data"), payload.get("voice_data")
+    cdt, mcft = payload.get("cdt_data"), payload.get("mcft_data")
+    points = 0
+    if faq and float(faq.get("totalScore", 0)) > 9:
+        points += 2
+    if voice and float(voice.get("metrics", {}).get("total", 0)) < 10:
+        points += 1
+    if cdt and float(cdt.get("scores", {}).get("total", 0)) < 15:
+        points += 2
+    if mcft and float(mcft.get("scores", {}).get("total", 0)) < 20:
+        points += 1
+    return "LOW" if points == 0 else "MED" if points <= 2 else "HIGH"
+
+
+def population(n, seed=0):
+    rnd = np.random.default_rng(seed)
+    cols = {
+        "faq.totalScore": rnd.integers(0, 31, n).astype(float),
+        "voice.metrics.total": rnd.uniform(0, 45, n).round(1),
+        "cdt.scores.total": rnd.integers(0, 31, n).astype(float),
+        "mcft.scores.total": rnd.integers(0, 41, n).astype(float),
+    }
+    for col in cols.values():  # some patients skipped an instrument
+        col[rnd.random(n) < 0.1] = np.nan
+    payloads = []
+    for i in range(n):
+        p = {}
+        if not np.isnan(v := cols["faq.totalScore"][i]):
+            p["faq_data"] = {"totalScore": int(v)}
+        if not np.isnan(v := cols["voice.metrics.total"][i]):
+            p["voice_data"] = {"metrics": {"total": f"{v:.1f}"}}
+        for inst in ("cdt", "mcft"):
+            if not np.isnan(v := cols[f"{inst}.scores.total"][i]):
+                p[f"{inst}_data"] = {"scores": {"total": int(v)}}
+        payloads.append(p)
+    return payloads, cols
+
+
+def rate(n, seconds):
+    return f"{n / seconds:>14,.0f} patients/s  ({seconds * 1000:8.1f} ms)"
+
+
+def main(n=200_000):
+    payloads, cols = population(n)
+    rules = compile_rules()
+    print(f"{n:,} patients")
+
+    t0 = time.perf_counter()
+    expected = [heuristic(p) for p in payloads]
+    print(f"per-patient heuristic  {rate(n, time.perf_counter() - t0)}")
+
+    t0 = time.perf_counter()
+    results = rules.score_many(payloads)
+    print(f"score_many (payloads)  {rate(n, time.perf_counter() - t0)}")
+    assert [r["level"] for r in results] == expected
+
+    t0 = time.perf_counter()
+    _, _, levels = rules.score_columns(cols)
+    print(f"score_columns          {rate(n, time.perf_counter() - t0)}")
+    assert levels.tolist() == expected
+
+    # A threshold change: compile once, then re-stratify everyone
+    spec = copy.deepcopy(DEFAULT_RULES)
+    spec["version"] = "report-html-2"
+    spec["rules"][0]["threshold"] = 12
+    t0 = time.perf_counter()
+    _, _, relevels = compile_rules(spec).score_columns(cols)
+    moved = int(np.count_nonzero(relevels != levels))
+    print(f"re-stratify (new rule) {rate(n, time.perf_counter() - t0)}  {moved:,} changed level")
+    # Cached report PDFs print the level, so they must not outlive the rules
+    assert cache_key(payloads[0], spec) != cache_key(payloads[0], DEFAULT_RULES)
+    spec["version"] = DEFAULT_RULES["version"]  # same version, edited threshold
+    assert cache_key(payloads[0], spec) != cache_key(payloads[0], DEFAULT_RULES)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,152 @@
+# Dashboard rollups: a results table covering three years at three sites,
+# then dashboard queries from the rollups vs the same numbers computed by a
+# full scan, the rebuild time, and what maintaining the rollups costs the
+# group-commit writer. Also checks that incremental updates and a rebuild
+# produce identical tables, and that the export's site column agrees with
+# the per-site dashboard.
+# Run from Application/:  python -m benchmarks.bench_rollups [sessions]
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks.bench_risk import population
+from risk import compile_rules
+from rollups import BUCKET_WIDTH, Rollups
+from store import EXPORT_COLUMNS, AssessmentStore, connect, csv_lines, ndjson_lines
+
+SITES = ("north", "south", "east")
+YEARS = 3
+TABLES = ("rollup_scores", "rollup_hist", "rollup_risk", "session_risk")
+
+
+def results_rows(n, start, seed=0):
+    """(session_id, instrument, site, recorded_at, received_at, data) for n sessions."""
+    payloads, _ = population(n, seed)
+    rnd = np.random.default_rng(seed)
+    stamps = np.sort(rnd.uniform(start, start + YEARS * 365 * 86400, n))
+    rows = []
+    for i, (payload, t) in enumerate(zip(payloads, stamps.tolist())):
+        sid, site = f"s{seed}-{i}", SITES[i % len(SITES)]
+        rows.append((sid, "patient", site, None, t, json.dumps({"age": 70})))
+        for j, (key, data) in enumerate(payload.items()):
+            rows.append((sid, key[:-5], site, None, t + 60 * (j + 1), json.dumps(data)))
+    return rows
+
+
+def full_scan(path, since, until):
+    # What the dashboard would cost without rollups: every result, every time
+    db = connect(path)
+    rules = compile_rules()
+    counts, sessions = Counter(), {}
+    day = "date(received_at, 'unixepoch', 'localtime')"
+    for session_id, instrument, d, data in db.execute(
+            f"SELECT session_id, instrument, {day}, data FROM results ORDER BY id"):
+        first = sessions.setdefault(session_id, [d, {}])
+        first[1][f"{instrument}_data"] = json.loads(data)
+        if since <= d <= until:
+            counts[instrument] += 1
+    db.close()
+    payloads = [p for d, p in sessions.values()
+                if since <= d <= until and set(p) - {"patient_data"}]
+    levels = Counter(r["level"] for r in rules.score_many(payloads))
+    return counts, levels
+
+
+def snapshot(path):
+    db = connect(path)
+    try:
+        # Sums are floats added in a different order; compare them rounded
+        return {t: sorted((tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                           for row in db.execute(f"SELECT * FROM {t}")), key=repr) for t in TABLES}
+    finally:
+        db.close()
+
+
+def timed(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def write_rate(path, rollups, n=2000, clients=16):
+    store = AssessmentStore(path, rollups=rollups)
+    rows = results_rows(n // 5, time.time(), seed=7)[:n]
+    per = (len(rows) + clients - 1) // clients
+
+    def client(chunk):
+        for sid, inst, site, _, _, data in chunk:
+            store.add(sid, inst, json.loads(data), site=site)
+
+    threads = [threading.Thread(target=client, args=(rows[i * per:(i + 1) * per],)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(rows) / (time.perf_counter() - t0)
+
+
+def main(n=50_000):
+    tmp = tempfile.mkdtemp(prefix="bench_rollups_")
+    path = os.path.join(tmp, "results.sqlite3")
+    AssessmentStore(path)
+    start = time.time() - YEARS * 365 * 86400
+    rows = results_rows(n, start)
+    db = connect(path)
+    db.execute("BEGIN")
+    db.executemany("INSERT INTO results (session_id, instrument, site, recorded_at, received_at, data)"
+                   " VALUES (?, ?, ?, ?, ?, ?)", rows)
+    db.execute("COMMIT")
+    db.close()
+    print(f"{n:,} sessions, {len(rows):,} results over {YEARS} years at {len(SITES)} sites")
+
+    rollups = Rollups()
+    t0 = time.perf_counter()
+    rollups.rebuild(path)
+    rebuild = time.perf_counter() - t0
+    print(f"rebuild                  {rebuild:8.2f} s   ({len(rows) / rebuild:,.0f} results/s)")
+
+    store = AssessmentStore(path, rollups=rollups)
+    today = time.strftime("%Y-%m-%d")
+    month = time.strftime("%Y-%m-%d", time.localtime(time.time() - 30 * 86400))
+    for label, since, until in (("all time", None, None), ("last 30 days", month, today)):
+        fast, out = timed(lambda: store.dashboard(since=since, until=until))
+        slow, (counts, levels) = timed(lambda: full_scan(path, since or "0000", until or "9999"), repeat=1)
+        assert {i: e["count"] for i, e in out["instruments"].items()} == dict(counts), label
+        assert {k: v for k, v in out["risk"].items() if v} == dict(levels), label
+        print(f"dashboard {label:<14} {fast * 1000:8.2f} ms rollups   {slow * 1000:9.0f} ms full scan")
+    by_day, _ = timed(lambda: store.dashboard(site="north", by_day=True))
+    print(f"dashboard one site by day {by_day * 1000:7.2f} ms")
+
+    # Incremental maintenance: the writer's throughput with and without rollups
+    plain = write_rate(os.path.join(tmp, "plain.sqlite3"), None)
+    inc_path = os.path.join(tmp, "inc.sqlite3")
+    with_rollups = write_rate(inc_path, Rollups())
+    print(f"store.add, 16 clients    {plain:8.0f} results/s plain   {with_rollups:6.0f}/s with rollups")
+    before = snapshot(inc_path)
+    Rollups().rebuild(inc_path)
+    assert snapshot(inc_path) == before, "incremental rollups differ from a rebuild"
+    print(f"incremental == rebuild   ok  (histogram bucket width {BUCKET_WIDTH})")
+
+    # The export carries the site, so raw rows reconcile with the per-site dashboard
+    exported = Counter(json.loads(line)["site"] for chunk in ndjson_lines(store.iter_rows(instrument="faq"))
+                       for line in chunk.splitlines())
+    csv_sites = Counter(row[EXPORT_COLUMNS.index("site")] for row in csv.reader(
+        "".join(csv_lines(store.iter_rows(instrument="faq"))).splitlines()[1:]))
+    dashboard = {site: store.dashboard(site=site)["instruments"]["faq"]["count"] for site in SITES}
+    assert exported == csv_sites == Counter(dashboard), (exported, dashboard)
+    print(f"export sites == dashboard ok  ({', '.join(f'{s} {n:,}' for s, n in sorted(dashboard.items()))} faq)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,74 @@
+# Load test: /api/send-email latency as the mail server gets slower.
+# The inline column sends over SMTP inside the request (the old behaviour);
+# the outbox column only enqueues. Needs aiosmtpd (pip install aiosmtpd).
+# Run from Application/:  python -m benchmarks.bench_send_email [requests]
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiosmtpd.controller import Controller
+from flask import Flask, request
+
+os.environ.setdefault("OUTBOX_DB", os.path.join(tempfile.mkdtemp(), "outbox.sqlite3"))
+
+import app as server  # noqa: E402
+import outbox  # noqa: E402
+
+PORT = 8025
+BODY = {"doctor_email": "gp@example.org", "patient_data": {"demographics": {"name": "Load Test"}}}
+
+
+class SlowHandler:
+    delay = 0.0
+    received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        SlowHandler.received += 1
+        return "250 OK"
+
+
+def timed_post(client):
+    t0 = time.perf_counter()
+    resp = client.post("/api/send-email", json=BODY)
+    resp.close()
+    return (time.perf_counter() - t0) * 1000
+
+
+def run(client, n, concurrency=8):
+    with ThreadPoolExecutor(concurrency) as pool:
+        lat = sorted(pool.map(lambda _: timed_post(client), range(n)))
+    return statistics.median(lat), lat[int(len(lat) * 0.95) - 1]
+
+
+def main(n=200):
+    controller = Controller(SlowHandler(), hostname="127.0.0.1", port=PORT)
+    controller.start()
+    pool = outbox.SMTPPool("127.0.0.1", PORT, size=8)
+    server.outbox.transport = pool
+
+    inline = outbox.report_message("bench@localhost")
+    inline_app = Flask("inline")
+
+    @inline_app.post("/api/send-email")
+    def send_inline():
+        data = request.json
+        pool.send(inline(data["doctor_email"], data))
+        return {"status": "success"}
+
+    print(f"{'smtp delay':>10} {'inline p50':>11} {'inline p95':>11} {'outbox p50':>11} {'outbox p95':>11}  (ms)")
+    for delay in (0.0, 0.05, 0.2, 1.0):
+        SlowHandler.delay = delay
+        a50, a95 = run(inline_app.test_client(), max(n // 10, 16) if delay >= 1 else n)
+        b50, b95 = run(server.create_app().test_client(), n)
+        print(f"{delay * 1000:>8.0f}ms {a50:>11.1f} {a95:>11.1f} {b50:>11.1f} {b95:>11.1f}")
+
+    controller.stop()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,157 @@
+# Request bodies: compressed uploads and binary encodings for report payloads.
+#
+# Content-Encoding gzip or deflate is undone by WSGI middleware as the view
+# reads the body, so every endpoint accepts it and nothing holds the
+# compressed and inflated copies at once. The inflated size is capped (a
+# 1 MB gzip of zeros inflates to 1 GB): past max_decoded the read fails with
+# 413 before the memory is spent.
+#
+# read_payload() parses the body as JSON, or as MessagePack / CBOR when the
+# Content-Type says so (same schema; msgpack and cbor2 are optional imports).
+# Binary fields can then travel as raw bytes instead of base64 text; they are
+# turned back into the data: URLs the rest of the app stores and renders.
+import base64
+import io
+import json
+import zlib
+
+from werkzeug.wsgi import LimitedStream
+
+try:
+    import msgpack  # optional: application/msgpack bodies
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2  # optional: application/cbor bodies
+except ImportError:
+    cbor2 = None
+
+BLOCK = 64 * 1024
+MAX_DECODED = 32 * 1024 * 1024
+BINARY_TYPES = {"application/msgpack": "msgpack", "application/x-msgpack": "msgpack",
+                "application/vnd.msgpack": "msgpack", "application/cbor": "cbor"}
+_SIGNATURES = ((b"\x89PNG\r\n\x1a\n", "image/png"), (b"\xff\xd8\xff", "image/jpeg"),
+               (b"RIFF", "image/webp"), (b"\x1aE\xdf\xa3", "audio/webm"))
+
+
+class BodyError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- Content-Encoding ----------
+class _Inflating(io.RawIOBase):
+    """The decoded body of a gzip or deflate stream, read incrementally."""
+
+    def __init__(self, raw, encoding, limit):
+        self.raw = raw
+        self.limit = limit
+        self.total = 0
+        # deflate should be zlib-wrapped (RFC 9110), but some clients send it raw
+        self._d = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding != "deflate" else zlib.MAX_WBITS)
+        self._encoding = encoding
+        self._first = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while not self._d.eof:
+            data = self._d.unconsumed_tail or self.raw.read(BLOCK)
+            if not data:
+                raise BodyError(f"truncated {self._encoding} body")
+            if self._first and self._encoding == "deflate" and not _zlib_header(data):
+                self._d = zlib.decompressobj(-zlib.MAX_WBITS)
+            self._first = False
+            try:
+                out = self._d.decompress(data, len(buf))
+            except zlib.error as e:
+                raise BodyError(f"invalid {self._encoding} body: {e}") from None
+            if out:
+                self.total += len(out)
+                if self.total > self.limit:
+                    raise BodyError(f"request body inflates past {self.limit} bytes", 413)
+                buf[:len(out)] = out
+                return len(out)
+        return 0
+
+
+def _zlib_header(data):
+    return len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0
+
+
+class RequestBodies:
+    def __init__(self, max_decoded=MAX_DECODED):
+        self.max_decoded = max_decoded
+
+    def init_app(self, app):
+        app.wsgi_app = self.wsgi(app.wsgi_app)
+
+    def wsgi(self, wsgi_app):
+        def middleware(environ, start_response):
+            encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+            if encoding in ("", "identity"):
+                return wsgi_app(environ, start_response)
+            if encoding not in ("gzip", "x-gzip", "deflate"):
+                body = json.dumps({"status": "error",
+                                   "message": f"Content-Encoding {encoding!r} is not supported."}).encode()
+                start_response("415 Unsupported Media Type", [("Content-Type", "application/json"),
+                                                              ("Content-Length", str(len(body)))])
+                return [body]
+            raw = environ["wsgi.input"]
+            if environ.get("CONTENT_LENGTH"):
+                raw = LimitedStream(raw, int(environ["CONTENT_LENGTH"]))
+            elif not environ.get("wsgi.input_terminated"):
+                return wsgi_app(environ, start_response)  # no body
+            environ = dict(environ)
+            environ["wsgi.input"] = io.BufferedReader(_Inflating(raw, encoding.removeprefix("x-"), self.max_decoded),
+                                                      BLOCK)
+            environ["wsgi.input_terminated"] = True  # length unknown: read to the end
+            environ["bodies.content_length"] = environ.pop("CONTENT_LENGTH", None)
+            del environ["HTTP_CONTENT_ENCODING"]
+            return wsgi_app(environ, start_response)
+
+        middleware.__wrapped__ = wsgi_app
+        return middleware
+
+
+# ---------- Payload formats ----------
+def read_payload(request):
+    """The body as a dict, from JSON, MessagePack or CBOR ({} if it isn't one)."""
+    kind = BINARY_TYPES.get(request.mimetype)
+    if kind is None:
+        data = request.get_json(silent=True)
+        return data if isinstance(data, dict) else {}
+    return parse(request.get_data(cache=False), kind)
+
+
+def parse(data, kind):
+    if kind == "msgpack":
+        if msgpack is None:
+            raise BodyError("MessagePack bodies need the msgpack package.", 415)
+        try:
+            obj = msgpack.unpackb(data, raw=False, strict_map_key=True)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise BodyError(f"invalid MessagePack body: {e or type(e).__name__}") from None
+    else:
+        if cbor2 is None:
+            raise BodyError("CBOR bodies need the cbor2 package.", 415)
+        try:
+            obj = cbor2.loads(data)
+        except (ValueError, cbor2.CBORDecodeError) as e:
+            raise BodyError(f"invalid CBOR body: {e or type(e).__name__}") from None
+    return data_urls(obj) if isinstance(obj, dict) else {}
+
+
+def data_urls(obj):
+    """Raw bytes anywhere in a decoded payload become base64 data: URLs."""
+    if isinstance(obj, dict):
+        return {k: data_urls(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [data_urls(v) for v in obj]
+    if isinstance(obj, (bytes, bytearray)):
+        mimetype = next((m for sig, m in _SIGNATURES if obj.startswith(sig)), "application/octet-stream")
+        return f"data:{mimetype};base64,{base64.b64encode(obj).decode('ascii')}"
+    return obj
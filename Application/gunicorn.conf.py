@@ -0,0 +1,37 @@
+# Production server settings. Run from Application/:
+#   gunicorn -c gunicorn.conf.py
+# Every setting can be overridden on the command line or with the
+# environment variables below (GUNICORN_CMD_ARGS works too).
+import multiprocessing
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# Requests mostly wait rather than compute: on the result store's group
+# commit, the report render pool, disk writes for audio chunks. Threaded
+# workers keep a few such waits per process without tying up a whole worker,
+# and each worker already runs its own store writer, outbox threads and
+# REPORT_WORKERS render processes, so the worker count stays modest.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+# Each worker imports the app and calls create_app() itself; preloading would
+# start the outbox threads in the master and share its SQLite handles.
+preload_app = False
+
+# A cold PDF render can take a few seconds; recycle workers now and then to
+# bound slow leaks.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+max_requests = 5000
+max_requests_jitter = 500
+
+# Heartbeat files on tmpfs, so a slow disk can't get workers killed
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")  # "-" for stdout
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
@@ -0,0 +1,210 @@
+# Responsive variants of the pictures in images/: WebP plus an optimized JPEG
+# (PNG for images with transparency) at a few widths, with content-hashed
+# file names, written under the instance folder with a manifest mapping each
+# original to its variants.
+#
+# build() runs at startup and only re-encodes images whose bytes changed. Run
+# it as part of a deploy to keep the first start fast:
+#   python image_variants.py [--force]
+#
+# Serving an original name (/images/bg-1.jpg) negotiates: WebP when Accept
+# allows it, at the smallest width covering what the client needs (?w=, as
+# srcset uses, or the Sec-CH-Width / Width / Sec-CH-Viewport-Width x DPR client
+# hints), else the full width. Hashed variant names are cacheable forever.
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import request, send_file
+from PIL import Image
+
+from assets import IMMUTABLE, REVALIDATE
+
+try:
+    import fcntl  # optional: serializes builds between gunicorn workers
+except ImportError:
+    fcntl = None
+
+WIDTHS = (480, 960, 1440, 1920)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+SOURCE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+EXTENSIONS = {"image/webp": "webp", "image/jpeg": "jpg", "image/png": "png"}
+# Part of every image's key, so changing an encoder setting rebuilds everything
+SETTINGS = f"widths={WIDTHS};webp={WEBP_QUALITY};jpeg={JPEG_QUALITY};v1"
+HINT_HEADERS = "Accept, Sec-CH-Width, Width, Sec-CH-Viewport-Width, Sec-CH-DPR, DPR"
+
+
+class ImageVariants:
+    def __init__(self, source, out):
+        self.source = source
+        self.out = out
+        self._images = {}  # original name -> manifest entry
+        self._files = {}   # variant file name -> mimetype
+        self._lock = threading.Lock()
+
+    # ---------- Building ----------
+    def load(self):
+        try:
+            with open(os.path.join(self.out, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        images = manifest.get("images", {})
+        with self._lock:
+            self._images = images
+            self._files = {v["file"]: v["type"] for entry in images.values() for v in entry["variants"]}
+        return manifest
+
+    def build(self, force=False):
+        """Encode new or changed images and rewrite the manifest; returns (built, reused)."""
+        os.makedirs(self.out, exist_ok=True)
+        with open(os.path.join(self.out, ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # other workers wait, then reuse everything
+            old = self.load().get("images", {})
+            images, built = {}, 0
+            for name in sorted(os.listdir(self.source)):
+                if os.path.splitext(name)[1].lower() not in SOURCE_TYPES:
+                    continue
+                with open(os.path.join(self.source, name), "rb") as f:
+                    data = f.read()
+                key = hashlib.sha256(data + SETTINGS.encode()).hexdigest()[:16]
+                entry = old.get(name)
+                if not force and entry and entry["key"] == key and all(
+                        os.path.exists(os.path.join(self.out, v["file"])) for v in entry["variants"]):
+                    images[name] = entry
+                    continue
+                images[name] = self._encode(name, data, key)
+                built += 1
+            if built or images.keys() != old.keys():
+                _atomic_write(os.path.join(self.out, "manifest.json"),
+                              json.dumps({"settings": SETTINGS, "images": images}, indent=1).encode())
+                keep = {v["file"] for entry in images.values() for v in entry["variants"]}
+                for name in os.listdir(self.out):
+                    if name.rsplit(".", 1)[-1] in EXTENSIONS.values() and name not in keep:
+                        os.remove(os.path.join(self.out, name))
+        self.load()
+        return built, len(images) - built
+
+    def _encode(self, name, data, key):
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if alpha else "RGB")
+        fallback = "image/png" if alpha else "image/jpeg"
+        stem = os.path.splitext(name)[0]
+        variants = []
+        for width in [w for w in WIDTHS if w < img.width] + [img.width]:
+            scaled = img if width == img.width else img.resize(
+                (width, max(1, round(img.height * width / img.width))), Image.LANCZOS, reducing_gap=3.0)
+            for mimetype in ("image/webp", fallback):
+                body = _encode(scaled, mimetype)
+                if width == img.width and mimetype == fallback and len(body) >= len(data):
+                    # Re-encoding can't beat the original at full size; ship its bytes
+                    body, mimetype = data, SOURCE_TYPES[os.path.splitext(name)[1].lower()]
+                file = f"{stem}-{width}.{hashlib.sha256(body).hexdigest()[:12]}.{EXTENSIONS[mimetype]}"
+                path = os.path.join(self.out, file)
+                if not os.path.exists(path):
+                    _atomic_write(path, body)
+                variants.append({"file": file, "width": width, "type": mimetype, "bytes": len(body)})
+        return {"key": key, "width": img.width, "height": img.height, "variants": variants}
+
+    # ---------- Negotiation ----------
+    def choose(self, name, webp, width=None):
+        """Best variant for a client: WebP if accepted, smallest at least `width` px wide."""
+        entry = self._images.get(name)
+        if entry is None:
+            return None
+        variants = entry["variants"]
+        if not webp:
+            variants = [v for v in variants if v["type"] != "image/webp"]
+        # Narrowest first; at the same width, the smaller file
+        variants = sorted(variants, key=lambda v: (v["width"], v["bytes"]))
+        want = min(width or entry["width"], entry["width"])
+        return next(v for v in variants if v["width"] >= want)
+
+    def response(self, filename):
+        """Response for an original or variant name, or None if it isn't one of ours."""
+        mimetype = self._files.get(filename)
+        if mimetype is not None:
+            resp = send_file(os.path.join(self.out, filename), mimetype=mimetype, etag=filename, conditional=True)
+            resp.headers["Cache-Control"] = IMMUTABLE
+            return resp
+        if filename not in self._images:
+            return None
+        # Only an explicit image/webp counts; browsers without WebP still send */*
+        webp = "image/webp" in request.headers.get("Accept", "") and \
+            request.accept_mimetypes.quality("image/webp") > 0
+        variant = self.choose(filename, webp, _wanted_width())
+        resp = send_file(os.path.join(self.out, variant["file"]), mimetype=variant["type"],
+                         etag=variant["file"], conditional=True)
+        resp.headers["Cache-Control"] = REVALIDATE
+        resp.headers["Vary"] = HINT_HEADERS
+        resp.headers["Content-Location"] = variant["file"]
+        return resp
+
+
+def _wanted_width():
+    # Physical pixels the client will draw the image at, if it told us
+    try:
+        if request.args.get("w"):
+            return int(request.args["w"])
+        hint = request.headers.get("Sec-CH-Width") or request.headers.get("Width")
+        if hint:
+            return int(float(hint))
+        viewport = request.headers.get("Sec-CH-Viewport-Width")
+        if viewport:
+            dpr = float(request.headers.get("Sec-CH-DPR") or request.headers.get("DPR") or 1)
+            return int(float(viewport) * dpr)
+    except ValueError:
+        pass
+    return None
+
+
+def _encode(img, mimetype):
+    buf = io.BytesIO()
+    if mimetype == "image/webp":
+        img.save(buf, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif mimetype == "image/jpeg":
+        img.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        img.save(buf, "PNG", optimize=True)
+    return buf.getvalue()
+
+
+def _atomic_write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Build responsive variants of images/.")
+    parser.add_argument("--source", default=os.path.join(here, "images"))
+    parser.add_argument("--out", default=os.path.join(os.environ.get("INSTANCE_PATH") or os.path.join(here, "instance"),
+                                                      "image-variants"))
+    parser.add_argument("--force", action="store_true", help="re-encode everything")
+    args = parser.parse_args(argv)
+
+    variants = ImageVariants(args.source, args.out)
+    start = time.perf_counter()
+    built, reused = variants.build(force=args.force)
+    print(f"{built} image(s) encoded, {reused} unchanged in {time.perf_counter() - start:.1f}s -> {args.out}")
+    for name, entry in sorted(variants.load()["images"].items()):
+        original = os.path.getsize(os.path.join(args.source, name))
+        sizes = ", ".join(f"{v['width']} {v['type'].split('/')[1]} {v['bytes'] // 1024}K" for v in entry["variants"])
+        print(f"  {name} ({original // 1024}K): {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+// Chunked, resumable upload of a MediaRecorder stream (see uploads.py).
+// Chunks are sent in order as the recorder emits them. A failed send is
+// retried with backoff; after a dropped connection the server is asked which
+// chunks it already has, so only the missing ones are sent again.
+class ChunkedAudioUpload {
+    constructor(mimetype) {
+        this.mimetype = mimetype;
+        this.id = null;
+        this.chunks = [];        // Blobs, kept until the upload is finalized
+        this.sent = new Set();
+        this.sending = null;
+        // Failures here are retried by the next push or by finish(), which reports them
+        window.addEventListener('online', () => this._pump().catch(() => {}));
+    }
+
+    push(blob) {
+        this.chunks.push(blob);
+        this._pump().catch(() => {});
+    }
+
+    // Send whatever is left, then join the chunks server-side. Resolves with
+    // { id, url } or rejects once timeoutMs has passed (at once if nothing
+    // was recorded: the server has no empty recordings to finalize).
+    async finish(timeoutMs = 30000) {
+        if (this.chunks.length === 0) throw new Error('no audio was recorded');
+        const deadline = Date.now() + timeoutMs;
+        while (Date.now() < deadline) {
+            try {
+                await this._pump();
+                if (this.sent.size < this.chunks.length) continue;
+                const res = await fetch(`/api/audio/uploads/${this.id}/finalize`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ chunks: this.chunks.length }),
+                });
+                if (res.ok) return await res.json();
+                if (res.status === 409) await this._resync();
+                else throw new Error('finalize failed: ' + res.status);
+            } catch (err) {
+                console.warn('Audio upload retrying:', err);
+                await new Promise((r) => setTimeout(r, 1000));
+            }
+        }
+        throw new Error('audio upload timed out');
+    }
+
+    _pump() {
+        if (!this.sending) {
+            this.sending = this._drain().finally(() => { this.sending = null; });
+        }
+        return this.sending;
+    }
+
+    async _drain() {
+        let delay = 500;
+        for (let attempt = 0; attempt < 6; attempt++) {
+            try {
+                if (!this.id) await this._create();
+                for (let i = 0; i < this.chunks.length; i++) {
+                    if (!this.sent.has(i)) await this._send(i);
+                }
+                return;
+            } catch (err) {
+                await new Promise((r) => setTimeout(r, delay));
+                delay = Math.min(delay * 2, 8000);
+                if (this.id) await this._resync().catch(() => {});
+            }
+        }
+        throw new Error('audio upload is not reaching the server');
+    }
+
+    async _create() {
+        const res = await fetch('/api/audio/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ mimetype: this.mimetype, session_id: assessmentSessionId() }),
+        });
+        if (!res.ok) throw new Error('could not start upload: ' + res.status);
+        this.id = (await res.json()).id;
+    }
+
+    async _send(index) {
+        const res = await fetch(`/api/audio/uploads/${this.id}/chunks/${index}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/octet-stream' },
+            body: this.chunks[index],
+        });
+        if (!res.ok) throw new Error(`chunk ${index} failed: ${res.status}`);
+        this.sent.add(index);
+    }
+
+    async _resync() {
+        const res = await fetch(`/api/audio/uploads/${this.id}`);
+        if (res.ok) this.sent = new Set((await res.json()).received);
+    }
+}
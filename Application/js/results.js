@@ -0,0 +1,21 @@
+// Persist each instrument's result server-side as well as in sessionStorage,
+// so results survive the tab closing. One id per assessment run.
+function assessmentSessionId() {
+    let id = sessionStorage.getItem('session_id');
+    if (!id) {
+        id = (crypto.randomUUID ? crypto.randomUUID() : Date.now().toString(36) + Math.random().toString(36).slice(2));
+        sessionStorage.setItem('session_id', id);
+    }
+    return id;
+}
+
+function persistResult(instrument, result) {
+    const body = JSON.stringify({ session_id: assessmentSessionId(), result: result });
+    // keepalive lets the request finish after we navigate away, but caps bodies at 64 KB
+    return fetch('/api/results/' + instrument, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: body,
+        keepalive: body.length < 60000,
+    }).catch((error) => console.error('Could not save result:', error));
+}
@@ -0,0 +1,108 @@
+// Offline-first service worker. app.py serves it at /sw.js with the precache
+// manifest prepended as self.PRECACHE = {version, entries: [{url, hash}]}
+// (see precache.py), so a new manifest is a new worker.
+//
+// install:  download only entries whose hash differs from the cached copy,
+//           into a staging cache (the live cache keeps serving meanwhile)
+// activate: move them into the live cache, drop entries no longer listed
+// fetch:    /api/* always goes to the network; everything else comes from the
+//           cache first, so moving between instruments needs no round trip
+const CACHE = 'precache';
+const STAGING = 'precache-staging';
+const RUNTIME = 'runtime';  // files CDN stylesheets pull in (icon fonts)
+const MANIFEST_KEY = '/__precache-manifest';
+const NETWORK_ONLY = ['/api/', '/metrics', '/sw.js', '/precache-manifest.json'];
+
+function cacheKey(url) {
+    // Same-origin entries are keyed by path: ?w= (srcset) and ?v= share one copy
+    if (url.origin !== self.location.origin) return url.href;
+    return url.pathname === '/' ? '/index.html' : url.pathname;
+}
+
+async function cachedHashes(cache) {
+    const res = await cache.match(MANIFEST_KEY);
+    if (!res) return {};
+    const { entries } = await res.json();
+    return Object.fromEntries(entries.map((e) => [e.url, e.hash]));
+}
+
+async function download(entry) {
+    if (!entry.url.startsWith('/')) {
+        try {
+            return await fetch(entry.url, { mode: 'cors', credentials: 'omit' });
+        } catch (err) {
+            return fetch(entry.url, { mode: 'no-cors' });  // CDN without CORS: opaque, still usable
+        }
+    }
+    // Negotiated images: ask for WebP like an <img> would
+    const headers = entry.url.startsWith('/images/') ? { Accept: 'image/webp,image/*,*/*;q=0.8' } : {};
+    return fetch(new Request(entry.url, { headers, cache: 'no-cache' }));
+}
+
+self.addEventListener('install', (event) => {
+    event.waitUntil((async () => {
+        await caches.delete(STAGING);  // leftovers of an interrupted install
+        const live = await caches.open(CACHE);
+        const staging = await caches.open(STAGING);
+        const have = await cachedHashes(live);
+        const changed = [];
+        for (const entry of self.PRECACHE.entries) {
+            if (have[entry.url] !== entry.hash || !(await live.match(entry.url, { ignoreVary: true }))) {
+                changed.push(entry);
+            }
+        }
+        await Promise.all(changed.map(async (entry) => {
+            let res;
+            try {
+                res = await download(entry);
+            } catch (err) {
+                res = null;
+            }
+            if (res && (res.ok || res.type === 'opaque')) {
+                await staging.put(entry.url, res);
+            } else if (entry.url.startsWith('/')) {
+                // Our own files must all be there; an unreachable CDN is retried next update
+                throw new Error(`precache failed: ${entry.url}`);
+            }
+        }));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        const live = await caches.open(CACHE);
+        const staging = await caches.open(STAGING);
+        for (const req of await staging.keys()) {
+            await live.put(req, await staging.match(req));
+        }
+        await caches.delete(STAGING);
+        const keep = new Set(self.PRECACHE.entries.map((e) => new URL(e.url, self.location.origin).href));
+        keep.add(new URL(MANIFEST_KEY, self.location.origin).href);
+        for (const req of await live.keys()) {
+            if (!keep.has(req.url)) await live.delete(req);
+        }
+        await live.put(MANIFEST_KEY, new Response(JSON.stringify(self.PRECACHE),
+                                                  { headers: { 'Content-Type': 'application/json' } }));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', (event) => {
+    const req = event.request;
+    if (req.method !== 'GET') return;
+    const url = new URL(req.url);
+    if (url.origin === self.location.origin && NETWORK_ONLY.some((p) => url.pathname.startsWith(p))) return;
+    event.respondWith(cacheFirst(req, url));
+});
+
+async function cacheFirst(req, url) {
+    const hit = await caches.match(cacheKey(url), { ignoreVary: true });
+    if (hit) return hit;
+    const res = await fetch(req);
+    if (url.origin !== self.location.origin && (res.ok || res.type === 'opaque')) {
+        const runtime = await caches.open(RUNTIME);
+        await runtime.put(req, res.clone());
+    }
+    return res;
+}
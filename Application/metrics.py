@@ -0,0 +1,295 @@
+# Per-route request metrics, shared across gunicorn workers.
+#
+# Each process counts into its own memory-mapped file under the metrics
+# directory, one float64 slot per counter, so recording a request is a few
+# in-place adds under an uncontended per-process lock. /metrics sums every
+# process's file into Prometheus text. Files of workers that have exited are
+# folded into one "retired" file, so totals don't drop when gunicorn recycles
+# workers.
+#
+# Per endpoint: requests by status class, a latency histogram and a response
+# size histogram. For streamed responses (no Content-Length) latency runs until
+# the last byte is handed to the server; otherwise until the view returns, and
+# the body is passed through untouched (gunicorn can still sendfile it).
+#
+# With slow_ms > 0 a sampler thread also records the stacks of requests that
+# have been running longer than that, as folded stacks (the flamegraph.pl /
+# speedscope input format), served at /metrics/slow.
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+try:
+    import fcntl  # optional: without it (Windows) dead workers' files are never folded
+except ImportError:
+    fcntl = None
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+UNMATCHED = "unmatched"  # 404s and anything else without an endpoint
+ENDPOINT_KEY = "metrics.endpoint"
+
+# Slot offsets within one endpoint's block
+_LAT_SUM = len(STATUS_CLASSES)
+_LAT = _LAT_SUM + 1
+_SIZE_SUM = _LAT + len(LATENCY_BUCKETS) + 1
+_SIZE = _SIZE_SUM + 1
+WIDTH = _SIZE + len(SIZE_BUCKETS) + 1
+
+_FILE = re.compile(r"^([0-9a-f]{12})-(\d+|retired)\.(bin|folded)$")
+
+
+class Metrics:
+    def __init__(self, directory, endpoints, slow_ms=0, sample_interval=0.01, max_stacks=5000):
+        self.directory = directory
+        self.endpoints = sorted(e for e in endpoints if e != UNMATCHED) + [UNMATCHED]
+        self._index = {e: i for i, e in enumerate(self.endpoints)}
+        # Processes with a different route table write different files
+        self.layout = hashlib.sha1(json.dumps([self.endpoints, WIDTH]).encode()).hexdigest()[:12]
+        self.slow = slow_ms / 1000
+        self.sample_interval = sample_interval
+        self.max_stacks = max_stacks
+        os.makedirs(directory, exist_ok=True)
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._inflight = {}  # thread id -> (start, environ), only while profiling
+        self._stacks = Counter()
+        self._dumped = 0
+
+    # ---------- Recording ----------
+    def _ensure_process(self):
+        # One counter file per process; mmaps and threads don't survive a fork
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # A file already named after this PID belongs to a dead worker
+            # whose PID the OS reused: retire its counters before starting over
+            self._retire(reused=self._pid)
+            path = self._path(self._pid, "bin")
+            with open(path, "wb") as f:
+                f.truncate(len(self.endpoints) * WIDTH * 8)
+            with open(path, "r+b") as f:
+                self._slots = memoryview(mmap.mmap(f.fileno(), 0)).cast("d")
+            self._stacks = Counter()
+            if self.slow > 0:
+                threading.Thread(target=self._sample, name="metrics-profiler", daemon=True).start()
+
+    def observe(self, endpoint, status, seconds, size):
+        if self._pid != os.getpid():
+            self._ensure_process()
+        base = self._index.get(endpoint, len(self.endpoints) - 1) * WIDTH
+        slots = self._slots
+        with self._lock:
+            slots[base + min(max(status // 100 - 2, 0), 3)] += 1
+            slots[base + _LAT_SUM] += seconds
+            slots[base + _LAT + bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            slots[base + _SIZE_SUM] += size
+            slots[base + _SIZE + bisect.bisect_left(SIZE_BUCKETS, size)] += 1
+
+    # ---------- Flask / WSGI ----------
+    def init_app(self, app):
+        @app.before_request
+        def _tag_endpoint():
+            from flask import request
+            request.environ[ENDPOINT_KEY] = request.endpoint
+
+        app.wsgi_app = self.wsgi(app.wsgi_app)
+
+    def wsgi(self, wsgi_app):
+        profiling = self.slow > 0
+
+        def middleware(environ, start_response):
+            t0 = time.perf_counter()
+            if profiling:
+                if self._pid != os.getpid():
+                    self._ensure_process()
+                tid = threading.get_ident()
+                self._inflight[tid] = (t0, environ)
+            seen = {"status": 500, "length": None}
+
+            def start(status, headers, exc_info=None):
+                seen["status"] = int(status[:3])
+                for name, value in headers:
+                    if name.lower() == "content-length":
+                        seen["length"] = int(value)
+                return start_response(status, headers, exc_info)
+
+            def done(size):
+                if profiling:
+                    self._inflight.pop(tid, None)
+                self.observe(environ.get(ENDPOINT_KEY) or UNMATCHED, seen["status"],
+                             time.perf_counter() - t0, size)
+
+            try:
+                body = wsgi_app(environ, start)
+            except BaseException:
+                done(0)
+                raise
+            if seen["length"] is not None:
+                done(seen["length"])
+                return body
+            return _CountedBody(body, done)
+
+        middleware.__wrapped__ = wsgi_app
+        return middleware
+
+    # ---------- Slow-request stacks ----------
+    def _sample(self):
+        while True:
+            time.sleep(self.sample_interval)
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for tid, (t0, environ) in list(self._inflight.items()):
+                frame = frames.get(tid)
+                if frame is None or now - t0 < self.slow:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join([environ.get(ENDPOINT_KEY) or UNMATCHED, *reversed(stack)])
+                if key in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[key] += 1
+            del frames
+            if self._stacks and now - self._dumped > 5:
+                self._dumped = now
+                self._dump_stacks()
+
+    def _dump_stacks(self):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in list(self._stacks.items()))
+        os.replace(tmp, self._path(self._pid, "folded"))
+
+    def slow_stacks(self):
+        """Folded stacks of slow requests ("endpoint;frame;...;frame count" lines), all processes."""
+        if self.slow > 0 and self._pid == os.getpid():
+            self._dump_stacks()
+        total = Counter()
+        for name in os.listdir(self.directory):
+            m = _FILE.match(name)
+            if m and m.group(1) == self.layout and m.group(3) == "folded":
+                try:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                        for line in f:
+                            stack, _, n = line.rstrip("\n").rpartition(" ")
+                            total[stack] += int(n)
+                except (OSError, ValueError):
+                    continue
+        return "".join(f"{stack} {n}\n" for stack, n in total.most_common())
+
+    # ---------- Aggregation ----------
+    def _path(self, pid, ext):
+        return os.path.join(self.directory, f"{self.layout}-{pid}.{ext}")
+
+    def _locked(self, mode):
+        f = open(os.path.join(self.directory, f"{self.layout}.lock"), "a")
+        if fcntl is not None:
+            fcntl.flock(f, mode)
+        return f
+
+    def _retire(self, reused=None):
+        # Fold exited workers' counters into the retired file (under an
+        # exclusive lock, so no reader sees them twice or not at all).
+        # reused: a live PID whose existing files are from a previous process
+        if fcntl is None:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            retired = self._path("retired", "bin")
+            for name in os.listdir(self.directory):
+                m = _FILE.match(name)
+                if not m or m.group(1) == self.layout and not m.group(2).isdigit():
+                    continue
+                if m.group(2).isdigit() and int(m.group(2)) != reused and _alive(int(m.group(2))):
+                    continue
+                path = os.path.join(self.directory, name)  # dead, or from an older route table
+                if m.group(1) == self.layout and m.group(3) == "bin":
+                    total = np.fromfile(path) + _read(retired, len(self.endpoints) * WIDTH)
+                    fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                    with os.fdopen(fd, "wb") as f:
+                        total.tofile(f)
+                    os.replace(tmp, retired)
+                os.remove(path)
+
+    def totals(self):
+        """Counters summed over every live and retired process, one row per endpoint."""
+        total = np.zeros(len(self.endpoints) * WIDTH)
+        with self._locked(fcntl.LOCK_SH if fcntl else None):
+            for name in os.listdir(self.directory):
+                m = _FILE.match(name)
+                if m and m.group(1) == self.layout and m.group(3) == "bin":
+                    total += _read(os.path.join(self.directory, name), total.size)
+        return total.reshape(len(self.endpoints), WIDTH)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        rows = [(e, r) for e, r in zip(self.endpoints, self.totals()) if r[:_LAT_SUM].any()]
+        out = ["# HELP http_requests_total Requests by endpoint and status class.",
+               "# TYPE http_requests_total counter"]
+        for e, r in rows:
+            out += [f'http_requests_total{{endpoint="{e}",status="{s}"}} {r[i]:.0f}'
+                    for i, s in enumerate(STATUS_CLASSES) if r[i]]
+        for metric, help_, buckets, sum_at, first in (
+                ("http_request_duration_seconds", "Time to respond.", LATENCY_BUCKETS, _LAT_SUM, _LAT),
+                ("http_response_size_bytes", "Response body size.", SIZE_BUCKETS, _SIZE_SUM, _SIZE)):
+            out += [f"# HELP {metric} {help_}", f"# TYPE {metric} histogram"]
+            for e, r in rows:
+                counts = np.cumsum(r[first:first + len(buckets) + 1])
+                out += [f'{metric}_bucket{{endpoint="{e}",le="{b:g}"}} {c:.0f}' for b, c in zip(buckets, counts)]
+                out += [f'{metric}_bucket{{endpoint="{e}",le="+Inf"}} {counts[-1]:.0f}',
+                        f'{metric}_sum{{endpoint="{e}"}} {r[sum_at]:.6g}',
+                        f'{metric}_count{{endpoint="{e}"}} {counts[-1]:.0f}']
+        return "\n".join(out) + "\n"
+
+
+class _CountedBody:
+    """Streamed body that counts bytes and reports when the server closes it."""
+
+    def __init__(self, body, done):
+        self.body = body
+        self.done = done
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.done(self.size)
+
+
+def _read(path, size):
+    try:
+        data = np.fromfile(path)
+    except (FileNotFoundError, ValueError):
+        return np.zeros(size)
+    return data if data.size == size else np.zeros(size)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,329 @@
+import json
+import multiprocessing
+import os
+import queue
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id           TEXT PRIMARY KEY,
+    recipient    TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    status       TEXT NOT NULL,          -- queued | sending | sent | failed
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    lease_until  REAL,
+    last_error   TEXT,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+
+class PermanentError(Exception):
+    """Delivery failed in a way retrying will not fix (bad address, 5xx)."""
+
+
+# ---------- Transports ----------
+class MockTransport:
+    """Logs the message instead of sending it (the original demo behaviour)."""
+
+    def send(self, msg):
+        print("------------------------------------------------")
+        print("[MOCK EMAIL SERVICE] Sending secure report...")
+        print(f"To: {msg['To']}")
+        print(f"Subject: {msg['Subject']}")
+        attached = [p.get_filename() for p in msg.iter_attachments()]
+        print(f"Attached: {', '.join(attached) or 'none'}")
+        print("------------------------------------------------")
+
+    def close(self):
+        pass
+
+
+class SMTPPool:
+    """Keeps logged-in SMTP connections around so each job skips connect/EHLO/AUTH."""
+
+    def __init__(self, host, port=25, username=None, password=None,
+                 starttls=False, size=4, timeout=30, max_idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password or "")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        else:
+            # Servers drop idle sessions; probe before reusing an old one
+            if time.monotonic() - last_used > self.max_idle and not _alive(conn):
+                _quit(conn)
+                conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            _quit(conn)
+            raise
+        try:
+            self._idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            _quit(conn)
+
+    def send(self, msg):
+        try:
+            with self.connection() as conn:
+                conn.send_message(msg)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentError(str(e.recipients)) from e
+        except smtplib.SMTPResponseException as e:
+            if 500 <= e.smtp_code < 600:
+                raise PermanentError(f"{e.smtp_code} {e.smtp_error!r}") from e
+            raise
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _quit(conn)
+
+
+def _alive(conn):
+    try:
+        return conn.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _quit(conn):
+    try:
+        conn.quit()
+    except Exception:
+        conn.close()
+
+
+# ---------- Outbox ----------
+class Outbox:
+    """SQLite-backed mail queue drained by a pool of background threads.
+
+    Jobs survive restarts: a job left in 'sending' by a dead process becomes
+    claimable again once its lease runs out.
+    """
+
+    def __init__(self, path, transport, build_message, workers=2,
+                 max_attempts=6, backoff=5.0, max_backoff=600.0, lease=120.0):
+        self.path = path
+        self.transport = transport
+        self.build_message = build_message
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections aren't shareable
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def _db(self):
+        return _Tx(self._conn())
+
+    # ---------- Producer side ----------
+    def enqueue(self, recipient, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO outbox (id, recipient, payload, status, next_attempt, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, recipient, json.dumps(payload), now, now, now),
+            )
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, recipient, status, attempts, last_error, created_at, updated_at"
+            " FROM outbox WHERE id = ?", (job_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    # ---------- Workers ----------
+    def start(self):
+        # Threads don't survive fork, so (re)start them in whichever process we are in.
+        # Spawned pool children (e.g. report rendering) re-import the main script
+        # and must not start draining the queue themselves.
+        if self._pid == os.getpid() or multiprocessing.parent_process() is not None:
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._pid = None
+        self.transport.close()
+
+    def _claim(self):
+        now = time.time()
+        with self._db() as db:
+            row = db.execute(
+                "SELECT id, recipient, payload, attempts FROM outbox"
+                " WHERE (status = 'queued' AND next_attempt <= ?)"
+                "    OR (status = 'sending' AND lease_until < ?)"
+                " ORDER BY next_attempt LIMIT 1", (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1,"
+                " lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + self.lease, now, row["id"]),
+            )
+        return row
+
+    def _finish(self, job_id, status, error=None, next_attempt=None):
+        now = time.time()
+        with self._db() as db:
+            db.execute(
+                "UPDATE outbox SET status = ?, last_error = ?, next_attempt = COALESCE(?, next_attempt),"
+                " lease_until = NULL, updated_at = ? WHERE id = ?",
+                (status, error, next_attempt, now, job_id),
+            )
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError:
+                job = None  # database busy; try again shortly
+            if job is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            self.process(job)
+
+    def process(self, job):
+        attempts = job["attempts"] + 1
+        try:
+            msg = self.build_message(job["recipient"], json.loads(job["payload"]))
+            self.transport.send(msg)
+        except PermanentError as e:
+            self._finish(job["id"], "failed", str(e))
+        except Exception as e:
+            if attempts >= self.max_attempts:
+                self._finish(job["id"], "failed", repr(e))
+            else:
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                delay *= random.uniform(0.8, 1.2)
+                self._finish(job["id"], "queued", repr(e), time.time() + delay)
+        else:
+            self._finish(job["id"], "sent")
+
+
+class _Tx:
+    # BEGIN IMMEDIATE so a claim's SELECT and UPDATE can't interleave across processes
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, *_):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# ---------- Messages ----------
+def report_message(sender, render=None):
+    """Message builder for /api/send-email jobs; render(payload) -> PDF bytes."""
+
+    def build(recipient, payload):
+        patient = payload.get("patient_data") or {}
+        name = patient.get("demographics", {}).get("name", "Patient")
+        msg = EmailMessage()
+        msg["From"] = sender
+        msg["To"] = recipient
+        msg["Subject"] = f"Cognitive Assessment Report - {name}"
+        msg.set_content(
+            f"A cognitive screening report for {name} is attached.\n\n"
+            "This message was sent by the Booth Cognitive Screening Tool."
+        )
+        if render is not None:
+            msg.add_attachment(render(payload), maintype="application", subtype="pdf",
+                               filename="Cognitive_Assessment_Report.pdf")
+        return msg
+
+    return build
+
+
+def from_env(instance_path, render=None):
+    """Outbox configured from SMTP_* / OUTBOX_* environment variables.
+
+    Without SMTP_HOST the mock transport is used, so the demo still runs
+    without a mail server.
+    """
+    env = os.environ
+    if env.get("SMTP_HOST"):
+        transport = SMTPPool(
+            env["SMTP_HOST"], int(env.get("SMTP_PORT", "25")),
+            username=env.get("SMTP_USER"), password=env.get("SMTP_PASSWORD"),
+            starttls=env.get("SMTP_STARTTLS", "0") == "1",
+            size=int(env.get("OUTBOX_WORKERS", "2")),
+        )
+    else:
+        transport = MockTransport()
+    os.makedirs(instance_path, exist_ok=True)
+    return Outbox(
+        env.get("OUTBOX_DB", os.path.join(instance_path, "outbox.sqlite3")),
+        transport,
+        report_message(env.get("MAIL_FROM", "reports@localhost"), render),
+        workers=int(env.get("OUTBOX_WORKERS", "2")),
+        max_attempts=int(env.get("OUTBOX_MAX_ATTEMPTS", "6")),
+    )
@@ -0,0 +1,63 @@
+# Offline precache manifest and service worker.
+#
+# The manifest lists every URL an assessment needs: each page (index, consent,
+# the instruments, report), the CSS/JS, the images and the CDN bundles the
+# pages link to. Each URL is paired with a content hash: the asset's ETag, the
+# negotiated image variant's file name, or the URL itself for version-pinned
+# CDN files. /sw.js is js/sw.js with the manifest inlined, so any content
+# change makes the browser see a new worker, which then downloads only the
+# entries whose hash changed. The worker is registered from consent.html;
+# after that only /api/* needs the network.
+import hashlib
+import json
+import re
+
+# URL prefix each static folder is served under (see the routes in app.py)
+ROUTES = {"pages": "", "css": "/css", "js": "/js", "images": "/images", "assets": "/assets"}
+WORKER = ("js", "sw.js")
+# Scripts and stylesheets the pages pull from other origins
+EXTERNAL = re.compile(rb'<(?:script|link)\b[^>]*?\b(?:src|href)="(https://[^"]+)"')
+
+
+class Precache:
+    def __init__(self, assets, image_variants=None):
+        self.assets = assets
+        self.image_variants = image_variants
+        self._built = (None, None)  # (asset generation, manifest)
+
+    def manifest(self):
+        generation, manifest = self._built
+        if generation != self.assets.generation or manifest is None:
+            manifest = self._build()
+            self._built = (self.assets.generation, manifest)
+        return manifest
+
+    def _build(self):
+        entries, external = {}, set()
+        for (folder, name), asset in self.assets.items():
+            if (folder, name) == WORKER:
+                continue
+            if folder == "pages":
+                if "/" in name and name.split("/", 1)[0] in ROUTES:
+                    continue  # shadowed by that folder's own route
+                if name.endswith(".html"):
+                    external.update(EXTERNAL.findall(asset.body))
+            url = f"{ROUTES[folder]}/{name}"
+            entry = {"url": url, "hash": asset.etag, "bytes": len(asset.body)}
+            if folder == "images" and self.image_variants is not None:
+                variant = self.image_variants.choose(name, webp=True)
+                if variant is not None:  # what a WebP-capable browser is sent
+                    entry.update(hash=variant["file"], bytes=variant["bytes"])
+            entries[url] = entry
+        for url in sorted(u.decode() for u in external):
+            entries[url] = {"url": url, "hash": hashlib.sha256(url.encode()).hexdigest()[:32]}
+        listed = sorted(entries.values(), key=lambda e: e["url"])
+        version = hashlib.sha256(json.dumps(listed, sort_keys=True).encode()).hexdigest()[:16]
+        return {"version": version, "entries": listed}
+
+    def service_worker(self):
+        """(javascript, etag) for /sw.js: the worker script with the manifest inlined."""
+        worker = self.assets.get(*WORKER)
+        manifest = self.manifest()
+        body = b"self.PRECACHE = " + json.dumps(manifest, separators=(",", ":")).encode() + b";\n" + worker.body
+        return body, f"{manifest['version']}-{worker.etag[:16]}"
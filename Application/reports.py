@@ -0,0 +1,327 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+from risk import compile_rules, load_rules
+
+BRAND = (13, 110, 253)   # bootstrap primary blue, same as the web report
+MUTED = (108, 117, 125)
+PAGE_W, PAGE_H = 1240, 1754  # A4 at 150 dpi
+MARGIN = 80
+SECTIONS = ("patient_data", "faq_data", "voice_data", "cdt_data", "mcft_data")
+# Read here rather than passed in, so spawned render workers pick it up too
+RISK_RULES = load_rules(os.environ["RISK_RULES"]) if os.environ.get("RISK_RULES") else None
+
+
+# ---------- Cache keys ----------
+def canonical(payload):
+    """Stable byte form of a report payload: only known sections, sorted keys."""
+    data = {k: payload.get(k) for k in SECTIONS}
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def cache_key(payload, rules=None):
+    """Hash of everything the PDF shows: the payload and the risk rule set
+    behind "Overall risk index" (rules defaults to RISK_RULES), so a rules
+    change renders afresh instead of serving cached PDFs with the old level."""
+    spec = RISK_RULES if rules is None else rules
+    h = hashlib.sha256(canonical(payload))
+    h.update(f"\0{compile_rules(spec).version}\0".encode())
+    h.update(json.dumps(spec, sort_keys=True).encode())  # thresholds edited without a version bump
+    return h.hexdigest()
+
+
+# ---------- Rendering (runs in worker processes) ----------
+@lru_cache(maxsize=None)
+def _font(size, bold=False):
+    names = ("DejaVuSans-Bold.ttf", "Arial Bold.ttf") if bold else ("DejaVuSans.ttf", "Arial.ttf")
+    for name in names:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+def _data_url_image(url):
+    if not url or not url.startswith("data:image"):
+        return None
+    try:
+        raw = base64.b64decode(url.split(",", 1)[1])
+        return Image.open(io.BytesIO(raw)).convert("RGB")
+    except Exception:
+        return None
+
+
+def risk_level(payload):
+    # Same rules as the summary card in report.html (see risk.py)
+    return compile_rules(RISK_RULES).score(payload)["level"]
+
+
+class _Page:
+    def __init__(self):
+        self.img = Image.new("RGB", (PAGE_W, PAGE_H), "white")
+        self.draw = ImageDraw.Draw(self.img)
+        self.y = MARGIN
+
+    def heading(self, text):
+        self.y += 24
+        self.draw.text((MARGIN, self.y), text, fill=BRAND, font=_font(34, bold=True))
+        self.y += 46
+        self.draw.line((MARGIN, self.y, PAGE_W - MARGIN, self.y), fill=BRAND, width=3)
+        self.y += 16
+
+    def row(self, label, value):
+        font = _font(24)
+        self.draw.text((MARGIN, self.y), label, fill=MUTED, font=font)
+        self.draw.text((MARGIN + 420, self.y), str(value), fill="black", font=font)
+        self.y += 36
+
+    def text(self, text, size=24, fill="black"):
+        font = _font(size)
+        width = PAGE_W - 2 * MARGIN
+        line = ""
+        for word in str(text).split():
+            trial = f"{line} {word}".strip()
+            if self.draw.textlength(trial, font=font) > width and line:
+                self.draw.text((MARGIN, self.y), line, fill=fill, font=font)
+                self.y += size + 10
+                line = word
+            else:
+                line = trial
+        if line:
+            self.draw.text((MARGIN, self.y), line, fill=fill, font=font)
+            self.y += size + 10
+
+
+def render_pdf(payload):
+    """Render a report payload to PDF bytes. Pure function of the payload."""
+    patient = payload.get("patient_data") or {}
+    demo = patient.get("demographics") or {}
+    faq, voice = payload.get("faq_data"), payload.get("voice_data")
+    cdt, mcft = payload.get("cdt_data"), payload.get("mcft_data")
+    pages = [_Page()]
+    page = pages[0]
+
+    # Header band
+    page.draw.rectangle((0, 0, PAGE_W, 200), fill=BRAND)
+    page.draw.text((MARGIN, 60), "Comprehensive Cognitive Assessment Report",
+                   fill="white", font=_font(44, bold=True))
+    page.draw.text((MARGIN, 130), f"Overall risk index: {risk_level(payload)}",
+                   fill="white", font=_font(28))
+    page.y = 220
+
+    page.heading("Patient & Consent")
+    page.row("Name", demo.get("name") or "—")
+    for key, label in (("dob", "Date of birth"), ("sex", "Sex"),
+                       ("phone", "Phone"), ("email", "Email"), ("language", "Language")):
+        if demo.get(key):
+            page.row(label, demo[key])
+    if patient.get("timestamp"):
+        page.row("Consent recorded", patient["timestamp"])
+
+    page.heading("Functional Activities (FAQ)")
+    if faq:
+        page.row("Total score", f"{faq.get('totalScore')} / {faq.get('maxScore')}")
+        for name, d in ((faq.get("analysis") or {}).get("domainScores") or {}).items():
+            page.row(f"  {name.capitalize()}", f"{d.get('score')}/{d.get('max')}")
+        for pattern in (faq.get("analysis") or {}).get("patterns") or []:
+            page.text(pattern, size=22, fill=MUTED)
+    else:
+        page.text("No data found.", fill=MUTED)
+
+    page.heading("Voice & Cognitive (VECE)")
+    if voice:
+        m = voice.get("metrics") or {}
+        page.row("Clarity / Fluency / Prosody",
+                 f"{m.get('clarity')} / {m.get('fluency')} / {m.get('prosody')}")
+        page.row("Total", m.get("total"))
+        if voice.get("narrative"):
+            page.text(voice["narrative"], size=22, fill=MUTED)
+    else:
+        page.text("No data found.", fill=MUTED)
+
+    page.heading("MCFT Module")
+    if mcft:
+        s = mcft.get("scores") or {}
+        page.row("Orientation", f"{s.get('orientation')}/4")
+        page.row("Sequence memory", f"{s.get('sequence')}/4")
+        page.row("Object naming", f"{s.get('naming')}/3")
+        page.row("Visuospatial copy", f"{s.get('copying')}/10")
+        page.row("Total", s.get("total"))
+    else:
+        page.text("No data found.", fill=MUTED)
+
+    # The clock drawing gets its own page so it can be shown large
+    page = _Page()
+    pages.append(page)
+    page.heading("Clock Drawing Test (CDT)")
+    if cdt:
+        s = cdt.get("scores") or {}
+        page.row("Contour / Numbers / Hands",
+                 f"{s.get('contour')} / {s.get('numbers')} / {s.get('hands')}")
+        page.row("Total", s.get("total"))
+        if cdt.get("analysis"):
+            page.text(cdt["analysis"], size=22, fill=MUTED)
+        drawing = _data_url_image(cdt.get("image"))
+        if drawing is not None:
+            drawing.thumbnail((PAGE_W - 2 * MARGIN, PAGE_H - page.y - MARGIN))
+            page.y += 20
+            page.img.paste(drawing, (MARGIN, page.y))
+            page.draw.rectangle((MARGIN, page.y, MARGIN + drawing.width, page.y + drawing.height),
+                                outline=MUTED, width=2)
+    else:
+        page.text("No data found.", fill=MUTED)
+
+    buf = io.BytesIO()
+    first, rest = pages[0].img, [p.img for p in pages[1:]]
+    first.save(buf, "PDF", resolution=150, save_all=True, append_images=rest,
+               title="Cognitive Assessment Report")
+    return buf.getvalue()
+
+
+def _render_to(payload, path):
+    data = render_pdf(payload)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)  # atomic, so readers never see a partial PDF
+    return path
+
+
+# ---------- Renderer (pool + disk cache) ----------
+class ReportRenderer:
+    """Renders PDFs in a process pool, cached on disk by content hash."""
+
+    def __init__(self, cache_dir, workers=None):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        os.makedirs(cache_dir, exist_ok=True)
+        self._pool = None
+        self._pid = None
+        # Re-entrant: a future that is already done runs its callback inline
+        self._lock = threading.RLock()
+        self._inflight = {}
+
+    def _executor(self):
+        # Spawned (not forked) workers: forking a threaded server is unsafe
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._pid = os.getpid()
+        return self._pool
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def submit(self, payload):
+        """Future resolving to the cached PDF path; identical in-flight payloads share one render."""
+        key = cache_key(payload)
+        path = self.path_for(key)
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            if os.path.exists(path):
+                fut = _done(path)
+            else:
+                try:
+                    fut = self._executor().submit(_render_to, payload, path)
+                except BrokenProcessPool:
+                    # A worker died (OOM, killed); start a fresh pool once
+                    self._pool = None
+                    fut = self._executor().submit(_render_to, payload, path)
+                self._inflight[key] = fut
+                fut.add_done_callback(lambda _f, key=key: self._forget(key))
+            return fut
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def render(self, payload):
+        with open(self.submit(payload).result(), "rb") as f:
+            return f.read()
+
+    def render_many(self, payloads):
+        futures = [self.submit(p) for p in payloads]
+        return [f.result() for f in futures]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def _done(value):
+    fut = Future()
+    fut.set_result(value)
+    return fut
+
+
+# ---------- Batch CLI ----------
+def _iter_payloads(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(n for n in os.listdir(path) if n.endswith((".json", ".jsonl")))
+            yield from _iter_payloads([os.path.join(path, n) for n in names])
+        elif path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            with open(path, encoding="utf-8") as f:
+                yield json.load(f)
+
+
+def _output_name(payload, key):
+    patient = payload.get("patient_data") or {}
+    name = (patient.get("demographics") or {}).get("name") or "patient"
+    stamp = str(patient.get("timestamp") or "")[:10] or "undated"
+    return f"{stamp}_{re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')}_{key[:8]}.pdf"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render assessment report PDFs in bulk.")
+    parser.add_argument("inputs", nargs="+", help="JSON / JSONL files or directories of them")
+    parser.add_argument("--out", required=True, help="directory to write the PDFs to")
+    parser.add_argument("--date", help="only render assessments from this day (YYYY-MM-DD)")
+    parser.add_argument("--cache", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        "instance", "reports"))
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    payloads = [p for p in _iter_payloads(args.inputs)
+                if not args.date
+                or str((p.get("patient_data") or {}).get("timestamp") or "").startswith(args.date)]
+    os.makedirs(args.out, exist_ok=True)
+    renderer = ReportRenderer(args.cache, args.workers)
+    start = time.perf_counter()
+    try:
+        for payload, path in zip(payloads, renderer.render_many(payloads)):
+            shutil.copyfile(path, os.path.join(args.out, _output_name(payload, cache_key(payload))))
+    finally:
+        renderer.close()
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {len(payloads)} report(s) into {args.out} in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
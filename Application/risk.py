@@ -0,0 +1,175 @@
+# Overall risk index across instruments (the summary card in report.html).
+#
+# A rule set is plain JSON so thresholds can change without a deploy:
+#   {"version": "...",
+#    "rules":  [{"instrument": "faq", "field": "totalScore", "op": ">", "threshold": 9, "points": 2}, ...],
+#    "levels": [[0, "LOW"], [2, "MED"], [null, "HIGH"]]}   # highest points for each level
+# Rule sets are compiled once (cached by their content) into threshold/points
+# arrays, and a whole population is scored as columns: one float array per
+# rule, NaN where the instrument is missing, so a missing result never adds
+# points, as in the browser.
+#
+# Re-stratify stored results:  python risk.py instance/results.sqlite3 [--rules rules.json] [--out risk.csv]
+import argparse
+import csv
+import json
+import operator
+import sqlite3
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_RULES = {
+    "version": "report-html-1",
+    "rules": [
+        {"instrument": "faq", "field": "totalScore", "op": ">", "threshold": 9, "points": 2},
+        {"instrument": "voice", "field": "metrics.total", "op": "<", "threshold": 10, "points": 1},
+        {"instrument": "cdt", "field": "scores.total", "op": "<", "threshold": 15, "points": 2},
+        {"instrument": "mcft", "field": "scores.total", "op": "<", "threshold": 20, "points": 1},
+    ],
+    "levels": [[0, "LOW"], [2, "MED"], [None, "HIGH"]],
+}
+
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+class RuleSet:
+    def __init__(self, spec):
+        try:
+            self.version = str(spec["version"])
+            rules = spec["rules"]
+            self.instruments = [r["instrument"] for r in rules]
+            self.fields = [r["field"] for r in rules]
+            self.ops = [OPS[r["op"]] for r in rules]
+            self.thresholds = np.array([float(r["threshold"]) for r in rules])
+            self.points = np.array([int(r["points"]) for r in rules], dtype=np.int32)
+            levels = spec["levels"]
+            self.labels = np.array([label for _, label in levels])
+            self.bounds = np.array([b for b, _ in levels[:-1]], dtype=np.int32)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"invalid risk rule set: {e!r}") from None
+        if not rules or levels[-1][0] is not None or np.any(np.diff(self.bounds) <= 0):
+            raise ValueError("invalid risk rule set: need rules and ascending levels ending in null")
+        self.names = [f"{i}.{f}" for i, f in zip(self.instruments, self.fields)]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("invalid risk rule set: one rule per instrument field")
+
+    def score_columns(self, columns):
+        """Points and level per row from {rule name: float array (NaN = missing)}."""
+        hits = np.column_stack([op(np.asarray(columns[name], dtype=np.float64), t)
+                                for name, op, t in zip(self.names, self.ops, self.thresholds)])
+        points = hits.astype(np.int32) @ self.points
+        return hits, points, self.labels[np.searchsorted(self.bounds, points)]
+
+    def parse_columns(self, columns):
+        """Rule columns from JSON lists (null or non-numbers count as missing)."""
+        missing = [n for n in self.names if n not in columns]
+        if missing:
+            raise ValueError(f"missing columns: {', '.join(missing)}")
+        return {n: np.array([_number(v) for v in columns[n]]) for n in self.names}
+
+    def columns(self, payloads):
+        """Rule columns from report-style payloads ({"faq_data": {...}, ...})."""
+        cols = {}
+        for name, inst, field in zip(self.names, self.instruments, self.fields):
+            key, parts = f"{inst}_data", field.split(".")
+            cols[name] = np.array([_number(_dig(p.get(key), parts)) for p in payloads], dtype=np.float64)
+        return cols
+
+    def score_many(self, payloads):
+        hits, points, levels = self.score_columns(self.columns(payloads))
+        # Rows share a handful of hit patterns; build each flag list once
+        masks = hits.astype(np.int64) @ (1 << np.arange(len(self.names), dtype=np.int64))
+        flags = {m: [n for b, n in enumerate(self.names) if m >> b & 1] for m in np.unique(masks).tolist()}
+        return [{"version": self.version, "points": p, "level": l, "flags": list(flags[m])}
+                for m, p, l in zip(masks.tolist(), points.tolist(), levels.tolist())]
+
+    def score(self, payload):
+        return self.score_many([payload])[0]
+
+
+@lru_cache(maxsize=32)
+def _compile(canonical):
+    return RuleSet(json.loads(canonical))
+
+
+def compile_rules(spec=None):
+    """Compiled RuleSet for a spec dict (default: the report.html heuristic), cached by content."""
+    return _compile(json.dumps(spec or DEFAULT_RULES, sort_keys=True))
+
+
+def load_rules(path):
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    compile_rules(spec)  # validate now rather than on the first request
+    return spec
+
+
+def _dig(data, parts):
+    for part in parts:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def _number(value):
+    # JS comparisons coerce "12.3" (voice totals are toFixed strings) to numbers
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# ---------- Population re-stratification ----------
+def store_columns(db_path, rules):
+    """Latest value of each rule's field per session, straight from the results table."""
+    db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    sessions, values = {}, []
+    for inst, field in zip(rules.instruments, rules.fields):
+        latest = {}
+        for session_id, value in db.execute(
+                "SELECT session_id, json_extract(data, ?) FROM results WHERE instrument = ? ORDER BY id",
+                (f"$.{field}", inst)):
+            latest[session_id] = value
+            sessions.setdefault(session_id, len(sessions))
+        values.append(latest)
+    db.close()
+    cols = {}
+    for name, latest in zip(rules.names, values):
+        col = np.full(len(sessions), np.nan)
+        if latest:
+            idx = np.fromiter((sessions[s] for s in latest), dtype=np.int64, count=len(latest))
+            col[idx] = [_number(v) for v in latest.values()]
+        cols[name] = col
+    return list(sessions), cols
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Risk index for every stored assessment session.")
+    parser.add_argument("db", help="results database (RESULTS_DB)")
+    parser.add_argument("--rules", help="rule set JSON (default: the report.html heuristic)")
+    parser.add_argument("--out", default="risk.csv")
+    args = parser.parse_args(argv)
+
+    rules = compile_rules(load_rules(args.rules) if args.rules else None)
+    start = time.perf_counter()
+    sessions, cols = store_columns(args.db, rules)
+    _, points, levels = rules.score_columns(cols)
+    elapsed = time.perf_counter() - start
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["session_id", "points", "level", "rules_version"])
+        w.writerows(zip(sessions, points.tolist(), levels.tolist(), [rules.version] * len(sessions)))
+    counts = dict(zip(*np.unique(levels, return_counts=True))) if len(levels) else {}
+    summary = ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+    print(f"{len(sessions)} sessions scored with rules {rules.version} in {elapsed:.2f}s ({summary}) -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
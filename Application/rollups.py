@@ -0,0 +1,342 @@
+# Dashboard rollups: results pre-aggregated per day, site and instrument.
+#
+# rollup_scores  count, and sum/sum of squares/min/max of the instrument's
+#                score (SCORE_FIELDS), per (grain, day, site, instrument)
+# rollup_hist    score histogram, one row per (grain, day, site, instrument, bucket)
+# rollup_risk    sessions per (grain, day, site, risk level), like report.html's card;
+#                a session belongs to the day and site of its first result and
+#                is counted once it has a scored instrument
+# session_risk   each session's current level, so a new result moves it
+#
+# The store's writer calls apply() with every committed batch, in the same
+# transaction (see store.py), so dashboards never drift from the results and
+# never scan them. Every total is kept per day and per month (grain "month",
+# day = the 1st), so a query over years reads whole months and only the days
+# of the partial months at either end. Days are local dates of received_at. Changing SCORE_FIELDS or BUCKET_WIDTH (bump ROLLUP_VERSION) or the
+# risk rules rebuilds on the next start.
+#
+# Regenerate from the raw results (safe while the app runs):
+#   python rollups.py instance/results.sqlite3 [--rules rules.json]
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+
+from risk import compile_rules, load_rules, _dig, _number
+from store import connect
+
+log = logging.getLogger(__name__)
+
+ROLLUP_VERSION = "1"
+SCORE_FIELDS = {"faq": "totalScore", "voice": "metrics.total", "cdt": "scores.total", "mcft": "scores.total"}
+BUCKET_WIDTH = 1  # histogram buckets: floor(score / width)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_scores (
+    grain TEXT NOT NULL, day TEXT NOT NULL, site TEXT NOT NULL, instrument TEXT NOT NULL,
+    n INTEGER NOT NULL, scored INTEGER NOT NULL,
+    total REAL NOT NULL, sumsq REAL NOT NULL, lo REAL, hi REAL,
+    PRIMARY KEY (grain, day, site, instrument)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_hist (
+    grain TEXT NOT NULL, day TEXT NOT NULL, site TEXT NOT NULL, instrument TEXT NOT NULL,
+    bucket INTEGER NOT NULL, n INTEGER NOT NULL,
+    PRIMARY KEY (grain, day, site, instrument, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_risk (
+    grain TEXT NOT NULL, day TEXT NOT NULL, site TEXT NOT NULL, level TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (grain, day, site, level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_risk (
+    session_id TEXT PRIMARY KEY, day TEXT NOT NULL, site TEXT NOT NULL, level TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+UPSERT_SCORES = """
+INSERT INTO rollup_scores (grain, day, site, instrument, n, scored, total, sumsq, lo, hi)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (grain, day, site, instrument) DO UPDATE SET
+    n = n + excluded.n, scored = scored + excluded.scored,
+    total = total + excluded.total, sumsq = sumsq + excluded.sumsq,
+    lo = CASE WHEN lo IS NULL OR excluded.lo < lo THEN excluded.lo ELSE lo END,
+    hi = CASE WHEN hi IS NULL OR excluded.hi > hi THEN excluded.hi ELSE hi END
+"""
+UPSERT_HIST = """
+INSERT INTO rollup_hist (grain, day, site, instrument, bucket, n) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (grain, day, site, instrument, bucket) DO UPDATE SET n = n + excluded.n
+"""
+UPSERT_RISK = """
+INSERT INTO rollup_risk (grain, day, site, level, n) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (grain, day, site, level) DO UPDATE SET n = n + excluded.n
+"""
+
+
+def day_of(received_at):
+    return time.strftime("%Y-%m-%d", time.localtime(received_at))
+
+
+def grains(day):
+    # The rows one result on `day` adds to
+    return ("day", day), ("month", day[:8] + "01")
+
+
+class _Totals:
+    """Rollup deltas for a set of results, before they are written."""
+
+    def __init__(self):
+        self.scores = defaultdict(lambda: [0, 0, 0.0, 0.0, None, None])
+        self.hist = defaultdict(int)
+
+    def add(self, day, site, instrument, data):
+        field = SCORE_FIELDS.get(instrument)
+        value = _number(_dig(data, field.split("."))) if field else math.nan
+        for key in grains(day):
+            s = self.scores[(*key, site, instrument)]
+            s[0] += 1
+            if math.isnan(value):
+                continue
+            s[1] += 1
+            s[2] += value
+            s[3] += value * value
+            s[4] = value if s[4] is None else min(s[4], value)
+            s[5] = value if s[5] is None else max(s[5], value)
+            self.hist[(*key, site, instrument, math.floor(value / BUCKET_WIDTH))] += 1
+
+    def results(self):
+        return sum(s[0] for key, s in self.scores.items() if key[0] == "day")
+
+    def score_rows(self):
+        return [(*key, *s) for key, s in self.scores.items()]
+
+    def hist_rows(self):
+        return [(*key, n) for key, n in self.hist.items()]
+
+
+class Rollups:
+    def __init__(self, rules=None):
+        self.rules = compile_rules(rules)
+        self.version = f"{ROLLUP_VERSION}:{self.rules.version}"
+
+    # ---------- Risk ----------
+    def _values(self, instrument, data):
+        # The rule inputs one result provides, by rule name
+        return {name: _number(_dig(data, field.split(".")))
+                for name, inst, field in zip(self.rules.names, self.rules.instruments, self.rules.fields)
+                if inst == instrument}
+
+    def _levels(self, sessions):
+        """Level per session from {session: {rule name: value}}, vectorized."""
+        if not sessions:
+            return {}
+        cols = {name: np.array([v.get(name, np.nan) for v in sessions.values()], dtype=np.float64)
+                for name in self.rules.names}
+        _, _, levels = self.rules.score_columns(cols)
+        return dict(zip(sessions, levels.tolist()))
+
+    # ---------- Incremental ----------
+    def apply(self, db, entries):
+        """Fold newly inserted results into the rollups, inside the caller's transaction.
+
+        entries: (session_id, instrument, site, received_at, data dict). A
+        failure here must not lose results, so it is contained in a savepoint
+        and the rollups are marked stale for a rebuild instead.
+        """
+        db.execute("SAVEPOINT rollups")
+        try:
+            self._apply(db, entries)
+            db.execute("RELEASE rollups")
+        except Exception:
+            log.exception("rollup update failed; rollups will be rebuilt on the next start")
+            db.execute("ROLLBACK TO rollups")
+            db.execute("RELEASE rollups")
+            db.execute("INSERT OR REPLACE INTO rollup_meta VALUES ('version', 'stale')")
+
+    def _apply(self, db, entries):
+        totals = _Totals()
+        touched = {}
+        for session_id, instrument, site, received_at, data in entries:
+            day = day_of(received_at)
+            totals.add(day, site, instrument, data)
+            touched.setdefault(session_id, (day, site))
+        db.executemany(UPSERT_SCORES, totals.score_rows())
+        db.executemany(UPSERT_HIST, totals.hist_rows())
+
+        # Re-score each touched session from its latest results (a handful of rows)
+        current, values, scored = {}, {}, set()
+        for session_id, (day, site) in touched.items():
+            row = db.execute("SELECT day, site, level FROM session_risk WHERE session_id = ?",
+                             (session_id,)).fetchone()
+            current[session_id] = row or (day, site, None)
+            values[session_id] = {}
+            for instrument, data in db.execute(
+                    "SELECT instrument, data FROM results WHERE session_id = ? ORDER BY id", (session_id,)):
+                values[session_id].update(self._values(instrument, json.loads(data)))
+                if instrument in SCORE_FIELDS:
+                    scored.add(session_id)
+        levels = self._levels(values)
+        deltas = defaultdict(int)
+        for session_id, (day, site, old) in current.items():
+            new = levels[session_id] if session_id in scored else None
+            if new != old:
+                for key in grains(day):
+                    if old is not None:
+                        deltas[(*key, site, old)] -= 1
+                    if new is not None:
+                        deltas[(*key, site, new)] += 1
+            db.execute("INSERT OR REPLACE INTO session_risk VALUES (?, ?, ?, ?)", (session_id, day, site, new))
+        db.executemany(UPSERT_RISK, [(*key, n) for key, n in deltas.items() if n])
+
+    # ---------- Rebuild ----------
+    def ensure(self, path):
+        """Create the tables, and rebuild if they were built with other settings."""
+        db = connect(path)
+        try:
+            db.executescript(SCHEMA)
+            row = db.execute("SELECT value FROM rollup_meta WHERE key = 'version'").fetchone()
+        finally:
+            db.close()
+        if row is None or row[0] != self.version:
+            self.rebuild(path, only_if_stale=True)
+
+    def rebuild(self, path, only_if_stale=False, page_size=5000):
+        """Regenerate every rollup from the results table; returns the rows read.
+
+        Reads a snapshot without blocking writers, then takes the write lock
+        only to catch up on rows that arrived meanwhile and swap the tables.
+        """
+        db = connect(path)
+        try:
+            db.executescript(SCHEMA)
+            totals, sessions, values, scored = _Totals(), {}, {}, set()
+            last = self._scan(db, 0, totals, sessions, values, scored, page_size)
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT value FROM rollup_meta WHERE key = 'version'").fetchone()
+                if only_if_stale and row is not None and row[0] == self.version:
+                    db.execute("ROLLBACK")  # another worker rebuilt them while we read
+                    return 0
+                self._scan(db, last or 0, totals, sessions, values, scored, page_size)
+                levels = self._levels({s: values[s] for s in scored})
+                risk = defaultdict(int)
+                for session_id in scored:
+                    day, site = sessions[session_id]
+                    for key in grains(day):
+                        risk[(*key, site, levels[session_id])] += 1
+                for table in ("rollup_scores", "rollup_hist", "rollup_risk", "session_risk"):
+                    db.execute(f"DELETE FROM {table}")
+                db.executemany("INSERT INTO rollup_scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", totals.score_rows())
+                db.executemany("INSERT INTO rollup_hist VALUES (?, ?, ?, ?, ?, ?)", totals.hist_rows())
+                db.executemany("INSERT INTO rollup_risk VALUES (?, ?, ?, ?, ?)", [(*k, n) for k, n in risk.items()])
+                db.executemany("INSERT INTO session_risk VALUES (?, ?, ?, ?)",
+                               [(s, day, site, levels.get(s)) for s, (day, site) in sessions.items()])
+                db.execute("INSERT OR REPLACE INTO rollup_meta VALUES ('version', ?)", (self.version,))
+                db.execute("COMMIT")
+            except BaseException:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                raise
+            return totals.results()
+        finally:
+            db.close()
+
+    def _scan(self, db, after, totals, sessions, values, scored, page_size):
+        # Fold results with id > after, in id order (latest result wins); returns the last id
+        last = None
+        while True:
+            rows = db.execute("SELECT id, session_id, instrument, site, received_at, data FROM results"
+                              " WHERE id > ? ORDER BY id LIMIT ?", (after, page_size)).fetchall()
+            if not rows:
+                return last
+            for _id, session_id, instrument, site, received_at, data in rows:
+                day = day_of(received_at)
+                data = json.loads(data)
+                totals.add(day, site, instrument, data)
+                sessions.setdefault(session_id, (day, site))
+                values.setdefault(session_id, {}).update(self._values(instrument, data))
+                if instrument in SCORE_FIELDS:
+                    scored.add(session_id)
+            after = last = rows[-1][0]
+
+    # ---------- Queries ----------
+    def query(self, db, since=None, until=None, site=None, by_day=False):
+        """Dashboard numbers for days since..until (inclusive ISO dates), optionally one site."""
+        ranges = periods(date.fromisoformat(since) if since else date(1970, 1, 1),
+                         date.fromisoformat(until) if until else date.max)
+        where = "(" + " OR ".join("(grain = ? AND day BETWEEN ? AND ?)" for _ in ranges) + ")"
+        args = [v for r in ranges for v in r]
+        if site:
+            where += " AND site = ?"
+            args.append(site)
+        instruments = {}
+        for instrument, n, k, total, sumsq, lo, hi in db.execute(
+                f"SELECT instrument, SUM(n), SUM(scored), SUM(total), SUM(sumsq), MIN(lo), MAX(hi)"
+                f" FROM rollup_scores WHERE {where} GROUP BY instrument", args):
+            entry = instruments[instrument] = {"count": n}
+            if instrument in SCORE_FIELDS:
+                mean = total / k if k else None
+                entry.update(field=SCORE_FIELDS[instrument], scored=k, mean=mean, min=lo, max=hi,
+                             stdev=math.sqrt(max(sumsq / k - mean * mean, 0.0)) if k else None,
+                             histogram=[])
+        for instrument, bucket, n in db.execute(
+                f"SELECT instrument, bucket, SUM(n) FROM rollup_hist WHERE {where}"
+                f" GROUP BY instrument, bucket ORDER BY instrument, bucket", args):
+            instruments[instrument]["histogram"].append([bucket * BUCKET_WIDTH, n])
+        risk = dict.fromkeys(self.rules.labels.tolist(), 0)
+        risk.update(db.execute(f"SELECT level, SUM(n) FROM rollup_risk WHERE {where} GROUP BY level", args).fetchall())
+        out = {"since": since, "until": until, "site": site, "rules_version": self.rules.version,
+               "bucket_width": BUCKET_WIDTH, "instruments": instruments, "risk": risk}
+        if by_day:
+            daily = [since or "0000-00-00", until or "9999-12-31"] + ([site] if site else [])
+            out["days"] = [{"day": d, "instrument": i, "count": n} for d, i, n in db.execute(
+                f"SELECT day, instrument, SUM(n) FROM rollup_scores WHERE grain = 'day' AND day BETWEEN ? AND ?"
+                f"{' AND site = ?' if site else ''} GROUP BY day, instrument ORDER BY day, instrument", daily)]
+        return out
+
+
+def periods(since, until):
+    """(grain, first, last) ranges covering since..until: whole months, plus the days either side."""
+    until = min(until, date(9999, 11, 30))  # "forever", with a next month to compute
+    first = since if since.day == 1 else _next_month(since)
+    after = _next_month(until)
+    last = after if until == after - timedelta(days=1) else until.replace(day=1)  # end of whole months
+    if first >= last:
+        return [("day", since.isoformat(), until.isoformat())]
+    ranges = [("month", first.isoformat(), (last - timedelta(days=1)).replace(day=1).isoformat())]
+    if since < first:
+        ranges.append(("day", since.isoformat(), (first - timedelta(days=1)).isoformat()))
+    if last <= until:
+        ranges.append(("day", last.isoformat(), until.isoformat()))
+    return ranges
+
+
+def _next_month(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the dashboard rollups from the stored results.")
+    parser.add_argument("db", help="results database (RESULTS_DB)")
+    parser.add_argument("--rules", default=os.environ.get("RISK_RULES"),
+                        help="risk rule set JSON (default: $RISK_RULES, else the report.html heuristic)")
+    args = parser.parse_args(argv)
+
+    rollups = Rollups(load_rules(args.rules) if args.rules else None)
+    start = time.perf_counter()
+    rows = rollups.rebuild(args.db)
+    elapsed = time.perf_counter() - start
+    print(f"{rows} results rolled up in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f}/s), "
+          f"rollups {rollups.version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import csv
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+INSTRUMENTS = ("patient", "faq", "voice", "cdt", "mcft")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id          INTEGER PRIMARY KEY,
+    session_id  TEXT NOT NULL,
+    instrument  TEXT NOT NULL,
+    site        TEXT NOT NULL DEFAULT '',
+    recorded_at TEXT,            -- client timestamp from the result itself
+    received_at REAL NOT NULL,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_session ON results (session_id);
+CREATE INDEX IF NOT EXISTS results_instrument ON results (instrument, id);
+"""
+
+EXPORT_COLUMNS = ("id", "session_id", "instrument", "site", "recorded_at", "received_at", "data")
+
+
+def connect(path):
+    db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # FULL: every commit is fsynced. Group commit is what keeps that affordable.
+    db.execute("PRAGMA synchronous=FULL")
+    return db
+
+
+class _Pending:
+    __slots__ = ("row", "data", "done", "id", "error")
+
+    def __init__(self, row, data):
+        self.row = row
+        self.data = data
+        self.done = threading.Event()
+        self.id = None
+        self.error = None
+
+
+class AssessmentStore:
+    """Instrument results in SQLite, written through a group-commit thread.
+
+    Requests hand rows to the writer and wait; the writer commits everything
+    that queued up during the previous fsync in a single transaction, so N
+    concurrent kiosks cost one fsync instead of N. With rollups (see
+    rollups.py) each batch also updates the dashboard tables in that
+    transaction.
+    """
+
+    def __init__(self, path, max_batch=512, rollups=None):
+        self.path = path
+        self.max_batch = max_batch
+        self.rollups = rollups
+        db = connect(path)
+        db.executescript(SCHEMA)
+        if "site" not in {row[1] for row in db.execute("PRAGMA table_info(results)")}:
+            db.execute("ALTER TABLE results ADD COLUMN site TEXT NOT NULL DEFAULT ''")
+        db.close()
+        if rollups is not None:
+            rollups.ensure(path)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # ---------- Writes ----------
+    def _ensure_writer(self):
+        # One writer per process; threads don't survive a gunicorn fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._writer = threading.Thread(target=self._run, name="store-writer", daemon=True)
+                self._writer.start()
+
+    def add(self, session_id, instrument, data, site="", wait=True, timeout=30):
+        """Queue one result; by default block until it is durably committed and return its id."""
+        if instrument not in INSTRUMENTS:
+            raise ValueError(f"unknown instrument {instrument!r}")
+        recorded_at = data.get("timestamp") if isinstance(data, dict) else None
+        # Checked here, not by sqlite: a bad row would fail the whole shared batch
+        if not isinstance(session_id, str) or not session_id:
+            raise ValueError("session_id must be a non-empty string")
+        if not isinstance(site, str):
+            raise ValueError("site must be a string")
+        if recorded_at is not None and not isinstance(recorded_at, str):
+            raise ValueError("timestamp must be a string")
+        row = (session_id, instrument, site or "", recorded_at, time.time(),
+               json.dumps(data, separators=(",", ":")))
+        pending = _Pending(row, data)
+        self._ensure_writer()
+        self._queue.put(pending)
+        if not wait:
+            return None
+        if not pending.done.wait(timeout):
+            raise TimeoutError("result store write timed out")
+        if pending.error is not None:
+            raise pending.error
+        return pending.id
+
+    def _run(self):
+        db = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit(db, batch)
+            except sqlite3.Error as e:
+                if len(batch) == 1:
+                    batch[0].id, batch[0].error = None, e
+                else:
+                    # Retry row by row so only the offending result fails
+                    for p in batch:
+                        try:
+                            self._commit(db, [p])
+                        except sqlite3.Error as err:
+                            p.id, p.error = None, err
+            for p in batch:
+                p.done.set()
+
+    def _commit(self, db, batch):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for p in batch:
+                p.id = db.execute(
+                    "INSERT INTO results (session_id, instrument, site, recorded_at, received_at, data)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", p.row
+                ).lastrowid
+            if self.rollups is not None:
+                self.rollups.apply(db, [(*p.row[:3], p.row[4], p.data) for p in batch])
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+
+    # ---------- Reads ----------
+    def session(self, session_id):
+        db = connect(self.path)
+        try:
+            rows = db.execute(
+                "SELECT instrument, data FROM results WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            ).fetchall()
+        finally:
+            db.close()
+        # Latest result per instrument wins, like sessionStorage
+        return {instrument: json.loads(data) for instrument, data in rows}
+
+    def dashboard(self, **filters):
+        """Rollup totals for the dashboard (see Rollups.query)."""
+        db = connect(self.path)
+        try:
+            return self.rollups.query(db, **filters)
+        finally:
+            db.close()
+
+    def iter_rows(self, instrument=None, since=None, until=None, page_size=1000):
+        """Yield rows in id order, one keyset-paginated page at a time."""
+        where, args = ["id > ?"], [0]
+        if instrument:
+            where.append("instrument = ?")
+            args.append(instrument)
+        if since is not None:
+            where.append("received_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("received_at < ?")
+            args.append(until)
+        sql = (f"SELECT {', '.join(EXPORT_COLUMNS)} FROM results"
+               f" WHERE {' AND '.join(where)} ORDER BY id LIMIT {int(page_size)}")
+        db = connect(self.path)
+        try:
+            while True:
+                rows = db.execute(sql, args).fetchall()
+                if not rows:
+                    return
+                yield from rows
+                args[0] = rows[-1][0]
+        finally:
+            db.close()
+
+
+# ---------- Export formats ----------
+def ndjson_lines(rows):
+    # data is already JSON text, so splice it in rather than re-parsing it
+    chunk = []
+    size = 0
+    for row in rows:
+        head = json.dumps(dict(zip(EXPORT_COLUMNS[:-1], row[:-1])), separators=(",", ":"))
+        line = f'{head[:-1]},"data":{row[-1]}}}\n'
+        chunk.append(line)
+        size += len(line)
+        if size > 65536:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    yield "".join(chunk)
+
+
+def csv_lines(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        # Flush every ~64 KB so memory stays flat however many rows there are
+        if buf.tell() > 65536:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
@@ -0,0 +1,212 @@
+# Compact binary format for clock drawings ("CDS1"), plus on-demand rasterizing.
+#
+#   "CDS1" varint(width) varint(height) varint(stroke_count)
+#   per stroke: u8 tool (0 pen, 1 eraser, 2 clear)
+#     pen/eraser: u8 r, u8 g, u8 b, varint(line width), varint(point count),
+#                 then zigzag-varint deltas (dx, dy) from the previous point
+#                 (the first point is relative to 0, 0)
+#
+# Points are whole CSS pixels and already simplified by the client, so a
+# typical clock is a few KB instead of a few hundred KB of base64 PNG.
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+MAGIC = b"CDS1"
+TOOLS = ("pen", "eraser", "clear")
+MAX_SIDE = 4096
+MAX_STROKES = 10000
+MAX_POINTS = 500000
+MAX_WIDTH = 64  # pen widths on the canvas go up to 40 px
+
+# Same composition as ClockDrawingApp.submit() on the desktop
+BRAND = "#0d6efd"
+HEADER_HEIGHT = 80
+TITLE = "Clock Drawing Test – Draw 10 minutes after 11"
+WATERMARK = "Draw a clock showing 10 minutes after 11"
+
+
+# ---------- Codec ----------
+def _read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("truncated stroke data")
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 35:
+            raise ValueError("varint too long")
+
+
+def _write_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def decode(data):
+    """Parse CDS1 bytes into {"width", "height", "strokes": [...]}; ValueError if malformed."""
+    buf = memoryview(data)
+    if bytes(buf[:4]) != MAGIC:
+        raise ValueError("not a CDS1 stroke file")
+    width, pos = _read_varint(buf, 4)
+    height, pos = _read_varint(buf, pos)
+    count, pos = _read_varint(buf, pos)
+    if not (0 < width <= MAX_SIDE and 0 < height <= MAX_SIDE) or count > MAX_STROKES:
+        raise ValueError("drawing too large")
+    strokes, total = [], 0
+    for _ in range(count):
+        if pos >= len(buf) or buf[pos] >= len(TOOLS):
+            raise ValueError("bad stroke header")
+        tool = TOOLS[buf[pos]]
+        pos += 1
+        if tool == "clear":
+            strokes.append({"tool": tool})
+            continue
+        if pos + 3 > len(buf):
+            raise ValueError("truncated stroke data")
+        color = "#%02x%02x%02x" % (buf[pos], buf[pos + 1], buf[pos + 2])
+        width_px, pos = _read_varint(buf, pos + 3)
+        if not 0 < width_px <= MAX_WIDTH:
+            raise ValueError("bad line width")
+        n, pos = _read_varint(buf, pos)
+        total += n
+        if total > MAX_POINTS:
+            raise ValueError("drawing too large")
+        x = y = 0
+        points = []
+        for _ in range(n):
+            dx, pos = _read_varint(buf, pos)
+            dy, pos = _read_varint(buf, pos)
+            x += _unzigzag(dx)
+            y += _unzigzag(dy)
+            points.append((x, y))
+        strokes.append({"tool": tool, "color": color, "width": width_px, "points": points})
+    if pos != len(buf):
+        raise ValueError("trailing bytes after stroke data")
+    return {"width": width, "height": height, "strokes": strokes}
+
+
+def encode(drawing):
+    out = bytearray(MAGIC)
+    _write_varint(out, drawing["width"])
+    _write_varint(out, drawing["height"])
+    _write_varint(out, len(drawing["strokes"]))
+    for s in drawing["strokes"]:
+        out.append(TOOLS.index(s["tool"]))
+        if s["tool"] == "clear":
+            continue
+        out += bytes.fromhex(s["color"].lstrip("#"))
+        _write_varint(out, s["width"])
+        _write_varint(out, len(s["points"]))
+        px = py = 0
+        for x, y in s["points"]:
+            _write_varint(out, _zigzag(x - px))
+            _write_varint(out, _zigzag(y - py))
+            px, py = x, y
+    return bytes(out)
+
+
+# ---------- Rasterizing ----------
+def _font(size):
+    for name in ("SegoeUI.ttf", "Segoe UI.ttf", "Arial.ttf", "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return ImageFont.load_default()
+
+
+def rasterize(drawing, header=True):
+    """Replay strokes with PIL; with header, compose the title band like submit()."""
+    w, h = drawing["width"], drawing["height"]
+    img = Image.new("RGB", (w, h), "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((16, 14), WATERMARK, fill=(13, 110, 253), font=_font(20))
+    for s in drawing["strokes"]:
+        if s["tool"] == "clear":
+            draw.rectangle((0, 0, w, h), fill="white")
+            continue
+        fill = s["color"] if s["tool"] == "pen" else "#ffffff"
+        pts, r = s["points"], s["width"] / 2
+        if len(pts) > 1:
+            draw.line(pts, fill=fill, width=s["width"], joint="curve")
+        # Round caps, like lineCap = 'round' on the canvas
+        for x, y in (pts[0], pts[-1]) if pts else ():
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=fill)
+    if not header:
+        return img
+    final = Image.new("RGB", (w, h + HEADER_HEIGHT), "white")
+    ImageDraw.Draw(final).text((16, 24), TITLE, fill=BRAND, font=_font(28), anchor="ls")
+    final.paste(img, (0, HEADER_HEIGHT))
+    return final
+
+
+# ---------- Storage ----------
+class StrokeStore:
+    """Content-addressed stroke files with a lazily rendered PNG next to each."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, drawing_id, ext):
+        if len(drawing_id) != 64 or not all(c in "0123456789abcdef" for c in drawing_id):
+            raise KeyError(drawing_id)
+        return os.path.join(self.root, f"{drawing_id}.{ext}")
+
+    def save(self, data):
+        decode(data)  # validate before anything touches disk
+        drawing_id = hashlib.sha256(data).hexdigest()
+        path = self._path(drawing_id, "cds")
+        if not os.path.exists(path):
+            _atomic_write(path, data)
+        return drawing_id
+
+    def load(self, drawing_id):
+        with open(self._path(drawing_id, "cds"), "rb") as f:
+            return f.read()
+
+    def png_path(self, drawing_id):
+        """Path to the rendered PNG, rasterizing it the first time it's asked for.
+
+        ValueError if the stored strokes can't be rendered (files saved before
+        a validation rule existed)."""
+        png = self._path(drawing_id, "png")
+        if os.path.exists(png):
+            return png
+        data = self.load(drawing_id)
+        with self._lock:
+            if not os.path.exists(png):
+                buf = io.BytesIO()
+                try:
+                    rasterize(decode(data)).save(buf, "PNG", optimize=True)
+                except (OverflowError, MemoryError) as e:
+                    raise ValueError(f"drawing can't be rendered: {e}") from None
+                _atomic_write(png, buf.getvalue())
+        return png
+
+
+def _atomic_write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
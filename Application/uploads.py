@@ -0,0 +1,184 @@
+# Chunked, resumable uploads for voice recordings.
+#
+# The browser creates an upload, then PUTs numbered chunks as MediaRecorder
+# emits them. Each chunk is copied from the request stream to its own file in
+# small blocks and renamed into place once complete, so a dropped connection
+# never leaves a half chunk behind and re-sending a chunk is harmless. The
+# client asks status() which chunks arrived after reconnecting, and finalize()
+# concatenates them into the finished recording.
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+BLOCK = 64 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+MAX_CHUNKS = 10000
+STALE_AFTER = 24 * 3600          # incomplete uploads older than this are removed
+EXTENSIONS = {"audio/webm": "webm", "audio/ogg": "ogg", "audio/mp4": "m4a", "audio/wav": "wav"}
+
+_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class UploadStore:
+    def __init__(self, root):
+        self.root = root
+        self.parts = os.path.join(root, "parts")
+        os.makedirs(self.parts, exist_ok=True)
+        self._last_purge = 0.0
+
+    # ---------- Paths ----------
+    def _dir(self, upload_id):
+        if not _ID.match(upload_id or ""):
+            raise UploadError("Unknown upload.", 404)
+        return os.path.join(self.parts, upload_id)
+
+    def _meta(self, upload_id):
+        try:
+            with open(os.path.join(self._dir(upload_id), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            meta = self._finished_meta(upload_id)
+            if meta is None:
+                raise UploadError("Unknown upload.", 404)
+            return meta
+
+    def _finished_meta(self, upload_id):
+        try:
+            with open(os.path.join(self.root, f"{upload_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def recording(self, upload_id):
+        """(path, mimetype) of a finished recording, or None."""
+        meta = self._finished_meta(upload_id) if _ID.match(upload_id or "") else None
+        return (os.path.join(self.root, meta["file"]), meta["mimetype"]) if meta else None
+
+    # ---------- API ----------
+    def create(self, mimetype="audio/webm", session_id=None):
+        mimetype = (mimetype or "audio/webm").split(";")[0].strip()
+        if mimetype not in EXTENSIONS:
+            raise UploadError(f"Unsupported audio type '{mimetype}'.", 415)
+        self.purge_stale()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._dir(upload_id))
+        meta = {"id": upload_id, "mimetype": mimetype, "session_id": session_id, "created": time.time()}
+        _atomic_write(os.path.join(self._dir(upload_id), "meta.json"), json.dumps(meta).encode())
+        return upload_id
+
+    def put_chunk(self, upload_id, index, stream, length):
+        """Copy one chunk from a file-like stream to disk; returns its size."""
+        meta = self._meta(upload_id)
+        if meta.get("complete"):
+            raise UploadError("Upload is already finalized.", 409)
+        if not 0 <= index < MAX_CHUNKS:
+            raise UploadError("Chunk index out of range.")
+        if length is None:
+            raise UploadError("Content-Length is required.", 411)
+        if length > MAX_CHUNK:
+            raise UploadError("Chunk too large.", 413)
+        folder = self._dir(upload_id)
+        try:
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        except FileNotFoundError:
+            raise UploadError("Unknown upload.", 404) from None  # purged as stale
+        received = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while received < length:
+                    block = stream.read(min(BLOCK, length - received))
+                    if not block:
+                        break
+                    f.write(block)
+                    received += len(block)
+            if received != length:
+                raise UploadError("Chunk was cut off; send it again.", 400, received=received)
+            os.replace(tmp, os.path.join(folder, f"{index:06d}.part"))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return received
+
+    def status(self, upload_id):
+        meta = self._meta(upload_id)
+        if meta.get("complete"):
+            return {"id": upload_id, "complete": True, "received": list(range(meta["chunks"])),
+                    "bytes": meta["bytes"]}
+        received, total = self._parts(upload_id)
+        return {"id": upload_id, "complete": False, "received": sorted(received), "bytes": total}
+
+    def finalize(self, upload_id, chunks):
+        """Join chunks 0..chunks-1 into the finished file; safe to call again."""
+        meta = self._meta(upload_id)
+        if meta.get("complete"):
+            return meta
+        if not 1 <= chunks <= MAX_CHUNKS:
+            raise UploadError("Chunk count out of range.")
+        received, _ = self._parts(upload_id)
+        missing = [i for i in range(chunks) if i not in received]
+        if missing:
+            raise UploadError("Upload is missing chunks.", 409, missing=missing)
+        folder = self._dir(upload_id)
+        name = f"{upload_id}.{EXTENSIONS[meta['mimetype']]}"
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for i in range(chunks):
+                    with open(os.path.join(folder, f"{i:06d}.part"), "rb") as part:
+                        shutil.copyfileobj(part, out, BLOCK)
+                size = out.tell()
+            os.replace(tmp, os.path.join(self.root, name))
+        except FileNotFoundError:
+            # Another request finalized it first and removed the parts
+            os.remove(tmp)
+            done = self._finished_meta(upload_id)
+            if done is None:
+                raise UploadError("Unknown upload.", 404) from None  # purged as stale
+            return done
+        meta.update(complete=True, chunks=chunks, bytes=size, file=name, finished=time.time())
+        _atomic_write(os.path.join(self.root, f"{upload_id}.json"), json.dumps(meta).encode())
+        shutil.rmtree(folder, ignore_errors=True)
+        return meta
+
+    # ---------- Housekeeping ----------
+    def _parts(self, upload_id):
+        received, total = set(), 0
+        try:
+            with os.scandir(self._dir(upload_id)) as it:
+                for entry in it:
+                    if entry.name.endswith(".part"):
+                        received.add(int(entry.name[:-5]))
+                        total += entry.stat().st_size
+        except FileNotFoundError:
+            # purge_stale() removed it (or a part) since meta.json was read
+            raise UploadError("Unknown upload.", 404) from None
+        return received, total
+
+    def purge_stale(self, max_age=STALE_AFTER, every=3600):
+        """Drop abandoned incomplete uploads; runs at most once per `every` seconds."""
+        now = time.time()
+        if now - self._last_purge < every:
+            return
+        self._last_purge = now
+        with os.scandir(self.parts) as it:
+            for entry in it:
+                if entry.is_dir() and now - entry.stat().st_mtime > max_age:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _atomic_write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
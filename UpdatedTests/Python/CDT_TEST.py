@@ -1,13 +1,47 @@
+import json
 import os
+import queue
 import sys
 import tkinter as tk
+from functools import lru_cache
 from tkinter import ttk, messagebox, colorchooser
-from PIL import Image, ImageDraw, ImageTk, ImageFont
+from PIL import Image, ImageDraw
 from datetime import datetime
+from cdt_export import Exporter
+from cdt_history import StrokeHistory
 
 BRAND = "#0d6efd"   # bootstrap primary blue
 HEADER_HEIGHT = 80
 CANVAS_W, CANVAS_H = 900, 600
+FRAME_MS = 16  # flush live strokes into the bitmap at most once per frame (~60 Hz)
+EXPORT_POLL_MS = 50
+TITLE = "Clock Drawing Test – Draw 10 minutes after 11"
+
+FONT_CANDIDATES = ["SegoeUI.ttf", "Segoe UI.ttf", "Arial.ttf", "Roboto-Regular.ttf"]
+
+@lru_cache(maxsize=None)
+def font_path():
+    # Try a few common fonts once per process; None means PIL's default
+    sysfont = os.path.join(os.path.expanduser("~"), "AppData/Local/Microsoft/Windows/Fonts")
+    search_paths = ["", sysfont, "/usr/share/fonts", "/Library/Fonts", "/System/Library/Fonts"]
+    for folder in search_paths:
+        for name in FONT_CANDIDATES:
+            p = os.path.join(folder, name)
+            if os.path.exists(p):
+                return p
+    return None
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    from PIL import ImageFont  # deferred until the first text is drawn
+    try:
+        return ImageFont.truetype(font_path(), size)
+    except Exception:
+        return ImageFont.load_default()
+
+def photo_image(img):
+    from PIL import ImageTk  # deferred: only needed once a window exists
+    return ImageTk.PhotoImage(img)
 
 def script_dir():
     # Save alongside the .py file (same “root path”)
@@ -15,9 +49,21 @@ def script_dir():
         return os.path.dirname(sys.executable)
     return os.path.dirname(os.path.abspath(__file__))
 
+def compose_submission(drawing):
+    # Header band + drawing, as saved; runs on the export worker
+    final_img = Image.new("RGB", (CANVAS_W, CANVAS_H + HEADER_HEIGHT), "white")
+    fdraw = ImageDraw.Draw(final_img)
+    fdraw.text((16, 24), TITLE, fill=BRAND, font=load_font(28), anchor="ls")  # left, baseline-ish
+    final_img.paste(drawing, (0, HEADER_HEIGHT))
+    return final_img
+
 class ClockDrawingApp:
-    def __init__(self, root):
+    def __init__(self, root, render_mode="incremental", patient_id="", out_dir=None):
+        # render_mode: "incremental" draws live segments as canvas lines and pushes
+        # only the dirty region of the bitmap once per frame; "full" rebuilds the
+        # whole PhotoImage on every motion event (the original behaviour).
         self.root = root
+        self.render_mode = render_mode
         root.title("Clock Drawing Test – Quizzard Style")
         root.geometry("1100x820")
 
@@ -26,13 +72,21 @@ class ClockDrawingApp:
         self.stroke_color = "#111111"
         self.stroke_size = 6
         self.last = None
-        self.history = []  # stack of PIL images
-        self.max_history = 50
+        self.dirty = None        # (x0, y0, x1, y1) not yet pushed to the PhotoImage
+        self.flush_job = None
+
+        # Submissions are encoded and written by a background worker; results
+        # come back through this queue and are shown from the Tk main loop
+        self.exporter = Exporter(out_dir or os.path.join(script_dir(), "clock_drawings"))
+        self.export_results = queue.Queue()
+        self.exports_pending = 0
 
         # PIL drawing surface (what we actually save)
         self.img = Image.new("RGB", (CANVAS_W, CANVAS_H), "white")
         self.draw = ImageDraw.Draw(self.img)
         self._add_intro_text()
+        # Undo/redo from a compact stroke log plus occasional raster checkpoints
+        self.history = StrokeHistory(self.img)
 
         # --- UI Layout ---
         outer = ttk.Frame(root, padding=12)
@@ -51,6 +105,9 @@ class ClockDrawingApp:
             font=("Segoe UI", 10, "bold")
         )
         target.pack(side="right")
+        self.patient_var = tk.StringVar(value=patient_id)
+        ttk.Entry(header, textvariable=self.patient_var, width=16).pack(side="right", padx=(0, 16))
+        ttk.Label(header, text="Patient ID", font=("Segoe UI", 10, "bold")).pack(side="right", padx=(0, 4))
 
         # Instructions
         instr = tk.Frame(outer, bg="#f8fbff", highlightthickness=0)
@@ -97,11 +154,13 @@ class ClockDrawingApp:
         tools.grid_columnconfigure(8, weight=1)  # spacer / push right side
 
         self.undo_btn = ttk.Button(tools, text="↶ Undo", command=self.undo)
+        self.redo_btn = ttk.Button(tools, text="↷ Redo", command=self.redo)
         self.clear_btn = ttk.Button(tools, text="🗑️ Clear", command=self.clear_canvas)
         self.submit_btn = ttk.Button(tools, text="✅ Submit", command=self.submit)
         self.undo_btn.grid(row=0, column=9, padx=4, pady=4)
-        self.clear_btn.grid(row=0, column=10, padx=4, pady=4)
-        self.submit_btn.grid(row=0, column=11, padx=4, pady=4)
+        self.redo_btn.grid(row=0, column=10, padx=4, pady=4)
+        self.clear_btn.grid(row=0, column=11, padx=4, pady=4)
+        self.submit_btn.grid(row=0, column=12, padx=4, pady=4)
 
         # Canvas area
         canvas_wrap = tk.Frame(outer, bd=2, relief="groove", bg="#ffffff")
@@ -112,7 +171,7 @@ class ClockDrawingApp:
         self.canvas.pack(padx=10, pady=10)
 
         # Prepare image on canvas
-        self.tkimg = ImageTk.PhotoImage(self.img)
+        self.tkimg = photo_image(self.img)
         self.canvas_image_id = self.canvas.create_image(0, 0, image=self.tkimg, anchor="nw")
 
         # Bind events
@@ -122,7 +181,6 @@ class ClockDrawingApp:
 
         # Visual state
         self._set_active_button(self.pen_btn)
-        self.push_history()  # baseline
 
         # Tip
         ttk.Label(
@@ -140,37 +198,43 @@ class ClockDrawingApp:
 
     # ---------- Drawing helpers ----------
     def _update_canvas_from_image(self):
-        self.tkimg = ImageTk.PhotoImage(self.img)
+        self._cancel_flush()
+        self.tkimg = photo_image(self.img)
         self.canvas.itemconfig(self.canvas_image_id, image=self.tkimg)
 
+    def _mark_dirty(self, x0, y0, x1, y1, pad):
+        box = (max(0, min(x0, x1) - pad), max(0, min(y0, y1) - pad),
+               min(CANVAS_W, max(x0, x1) + pad + 1), min(CANVAS_H, max(y0, y1) + pad + 1))
+        if self.dirty:
+            d = self.dirty
+            box = (min(d[0], box[0]), min(d[1], box[1]), max(d[2], box[2]), max(d[3], box[3]))
+        self.dirty = box
+        if self.flush_job is None:
+            self.flush_job = self.root.after(FRAME_MS, self._flush_dirty)
+
+    def _flush_dirty(self):
+        # Copy just the touched rectangle into the on-screen PhotoImage, then drop
+        # the temporary line items it now covers.
+        self.flush_job = None
+        if self.dirty:
+            x0, y0, x1, y1 = self.dirty
+            self.dirty = None
+            if x1 > x0 and y1 > y0:
+                patch = photo_image(self.img.crop((x0, y0, x1, y1)))
+                self.root.tk.call(str(self.tkimg), "copy", str(patch), "-to", x0, y0)
+        self.canvas.delete("live")
+
+    def _cancel_flush(self):
+        if self.flush_job is not None:
+            self.root.after_cancel(self.flush_job)
+            self.flush_job = None
+        self.dirty = None
+        self.canvas.delete("live")
+
     def _add_intro_text(self):
         # Subtle watermark line like the JS init()
-        try:
-            font = ImageFont.truetype(self._pick_font(), 20)
-        except Exception:
-            font = ImageFont.load_default()
         self.draw.text((16, 12), "Draw a clock showing 10 minutes after 11",
-                       fill=(13, 110, 253, 180), font=font)
-
-    def _pick_font(self):
-        # Try a few common fonts; fallback handled by PIL if not found
-        candidates = [
-            "SegoeUI.ttf", "Segoe UI.ttf", "Arial.ttf", "Roboto-Regular.ttf"
-        ]
-        sysfont = os.path.join(os.path.expanduser("~"), "AppData/Local/Microsoft/Windows/Fonts")
-        search_paths = ["", sysfont, "/usr/share/fonts", "/Library/Fonts", "/System/Library/Fonts"]
-        for folder in search_paths:
-            for name in candidates:
-                p = os.path.join(folder, name)
-                if os.path.exists(p):
-                    return p
-        raise FileNotFoundError
-
-    def push_history(self):
-        # Keep a capped stack of previous images
-        self.history.append(self.img.copy())
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
+                       fill=(13, 110, 253, 180), font=load_font(20))
 
     # ---------- Tools ----------
     def _set_active_button(self, btn):
@@ -202,7 +266,7 @@ class ClockDrawingApp:
 
     # ---------- Mouse drawing ----------
     def on_press(self, event):
-        self.push_history()
+        self.history.begin(self.tool, self.stroke_color, self.stroke_size, event.x, event.y)
         self.last = (event.x, event.y)
 
     def on_move(self, event):
@@ -214,57 +278,76 @@ class ClockDrawingApp:
         # Draw on PIL image
         color = self.stroke_color if self.tool == "pen" else "#ffffff"
         self.draw.line((x0, y0, x1, y1), fill=color, width=self.stroke_size, joint="curve")
+        self.history.add_point(x1, y1)
 
         # Update canvas
-        self._update_canvas_from_image()
+        if self.render_mode == "full":
+            self._update_canvas_from_image()
+        else:
+            self.canvas.create_line(x0, y0, x1, y1, fill=color, width=self.stroke_size,
+                                    capstyle="round", joinstyle="round", tags="live")
+            self._mark_dirty(x0, y0, x1, y1, self.stroke_size // 2 + 1)
 
         # Next segment
         self.last = (x1, y1)
 
     def on_release(self, _event):
         self.last = None
+        self.history.end(self.img)
+        if self.flush_job is not None:
+            self.root.after_cancel(self.flush_job)
+            self._flush_dirty()
 
     # ---------- Commands ----------
     def undo(self):
-        if len(self.history) <= 1:
-            return
-        # Discard current, revert to previous
-        self.history.pop()
-        self.img = self.history[-1].copy()
+        img = self.history.undo()
+        if img is not None:
+            self._set_image(img)
+
+    def redo(self):
+        img = self.history.redo()
+        if img is not None:
+            self._set_image(img)
+
+    def _set_image(self, img):
+        self.img = img
         self.draw = ImageDraw.Draw(self.img)
         self._update_canvas_from_image()
 
     def clear_canvas(self):
-        self.push_history()
-        self.img = Image.new("RGB", (CANVAS_W, CANVAS_H), "white")
-        self.draw = ImageDraw.Draw(self.img)
-        self._update_canvas_from_image()
+        self._set_image(Image.new("RGB", (CANVAS_W, CANVAS_H), "white"))
+        self.history.clear(self.img)
 
     def submit(self):
-        # Compose header + drawing and save alongside the script
-        out_w, out_h = CANVAS_W, CANVAS_H + HEADER_HEIGHT
-        final_img = Image.new("RGB", (out_w, out_h), "white")
-        fdraw = ImageDraw.Draw(final_img)
-
-        # Header text
-        title = "Clock Drawing Test – Draw 10 minutes after 11"
-        try:
-            font = ImageFont.truetype(self._pick_font(), 28)
-        except Exception:
-            font = ImageFont.load_default()
-
-        fdraw.text((16, 24), title, fill=BRAND, font=font, anchor="ls")  # left, baseline-ish
-
-        # Paste the drawing
-        final_img.paste(self.img, (0, HEADER_HEIGHT))
-
-        # Save to same root path
-        out_path = os.path.join(script_dir(), "clock_drawing.png")
-        try:
-            final_img.save(out_path, "PNG")
-            messagebox.showinfo("Saved", f"Image saved:\n{out_path}")
-        except Exception as e:
-            messagebox.showerror("Save failed", f"Could not save image:\n{e}")
+        # Snapshot now; composing, encoding and writing happen on the export
+        # worker so the window stays responsive
+        strokes = json.dumps(self.history.to_dict(), separators=(",", ":")).encode("utf-8")
+        self.exporter.export(self.img.copy(), self.patient_var.get().strip(), compose=compose_submission,
+                             sidecars=[(".strokes.json", strokes)], callback=self.export_results.put)
+        if self.exports_pending == 0:
+            self.root.after(EXPORT_POLL_MS, self._poll_exports)
+        self.exports_pending += 1
+        self.submit_btn.configure(text="⏳ Saving…")
+
+    def _poll_exports(self):
+        while True:
+            try:
+                result = self.export_results.get_nowait()
+            except queue.Empty:
+                break
+            self.exports_pending -= 1
+            if result.error is None:
+                messagebox.showinfo("Saved", f"Image saved:\n{result.path}")
+            else:
+                messagebox.showerror("Save failed", f"Could not save image:\n{result.error}")
+        if self.exports_pending:
+            self.root.after(EXPORT_POLL_MS, self._poll_exports)
+        else:
+            self.submit_btn.configure(text="✅ Submit")
+
+    def close(self):
+        self.exporter.close(wait=True)  # finish queued saves before exiting
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -276,5 +359,6 @@ if __name__ == "__main__":
             style.theme_use("clam")
     except Exception:
         pass
-    app = ClockDrawingApp(root)
+    app = ClockDrawingApp(root, patient_id=sys.argv[1] if len(sys.argv) > 1 else "")
+    root.protocol("WM_DELETE_WINDOW", app.close)
     root.mainloop()
@@ -1,35 +1,14 @@
 # streamlit_faq.py
-import json
+import uuid
 from pathlib import Path
 import streamlit as st
 from datetime import datetime
+from faq_progress import ProgressJournal
+from faq_scoring import KEY_TO_LABEL, LABEL_TO_KEY, MAX_SCORE, OPTION_LABELS, QUESTIONS, score
 
 st.set_page_config(page_title="Functional Activities Questionnaire – Quizzard", page_icon="🧩", layout="centered")
 
-QUESTIONS = [
-    "Writing checks, paying bills, balancing checkbook",
-    "Assembling tax records, business affairs, or papers",
-    "Shopping alone for clothes, household necessities, or groceries",
-    "Playing a game of skill, working on a hobby",
-    "Heating water, making a cup of coffee, turning off stove after use",
-    "Preparing a balanced meal",
-    "Keeping track of current events",
-    "Paying attention to, understanding, discussing TV, book, magazine",
-    "Remembering appointments, family occasions, holidays, medications",
-    "Traveling out of neighborhood, driving, arranging to take buses",
-]
-
-OPTIONS = [
-    {"key": "dependent",        "label": "Dependent",                                          "score": 3},
-    {"key": "assist",           "label": "Requires assistance",                                "score": 2},
-    {"key": "diff-self",        "label": "Has difficulty but does by self",                    "score": 1},
-    {"key": "normal",           "label": "Normal (Has no difficulty to do it by self)",        "score": 0},
-    {"key": "never-could-now",  "label": "Never did [the activity] but could do now",          "score": 0},
-    {"key": "never-diff",       "label": "Never did and would have difficulty now",            "score": 1},
-]
-
-MAX_SCORE = len(QUESTIONS) * 3
-PROGRESS_FILE = Path("faq_progress.json")
+PROGRESS_DIR = Path("faq_progress")  # one journal per session id (see faq_progress.py)
 ROOT_SAVE_PATH = Path("FAQ_Report.txt")  # <-- root folder save target
 
 def init_state():
@@ -41,16 +20,19 @@ def init_state():
         st.session_state.submitted = False
     if "last_report_txt" not in st.session_state:
         st.session_state.last_report_txt = ""
+    if "session_id" not in st.session_state:
+        # ?session=<id> in the URL resumes that patient's progress after a reload
+        st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex[:12]
+        st.query_params["session"] = st.session_state.session_id
+
+@st.cache_resource
+def progress_journal():
+    # Shared by every browser session of this Streamlit server
+    return ProgressJournal(str(PROGRESS_DIR), len(QUESTIONS)).start()
 
 def compute_score(answers):
-    total = 0
-    detail = []
-    for i, key in enumerate(answers):
-        opt = next((o for o in OPTIONS if o["key"] == key), None)
-        score = opt["score"] if opt else 0
-        total += score
-        detail.append({"q": QUESTIONS[i], "label": opt["label"] if opt else "—", "score": score})
-    return total, detail
+    result = score(answers)
+    return result["totalScore"], result["details"]
 
 def report_text(answers):
     total, detail = compute_score(answers)
@@ -67,23 +49,31 @@ def report_text(answers):
     lines.append(f"\nGenerated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     return "\n".join(lines)
 
+def record_answer(idx, key):
+    # Every change is journaled as it happens; Save only forces it to disk
+    if st.session_state.answers[idx] != key:
+        st.session_state.answers[idx] = key
+        progress_journal().set_answer(st.session_state.session_id, idx, key)
+
+def record_step(idx):
+    st.session_state.idx = idx
+    progress_journal().set_index(st.session_state.session_id, idx)
+
 def save_progress():
-    data = {"idx": st.session_state.idx, "answers": st.session_state.answers}
-    PROGRESS_FILE.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    progress_journal().set_index(st.session_state.session_id, st.session_state.idx)
+    progress_journal().sync(st.session_state.session_id)
 
 def load_progress():
-    if PROGRESS_FILE.exists():
-        data = json.loads(PROGRESS_FILE.read_text(encoding="utf-8"))
-        st.session_state.idx = int(data.get("idx", 0))
-        arr = data.get("answers", [])
-        if isinstance(arr, list) and len(arr) == len(QUESTIONS):
-            st.session_state.answers = arr
+    data = progress_journal().load(st.session_state.session_id)
+    if data:
+        st.session_state.idx = data["idx"]
+        st.session_state.answers = data["answers"]
 
 # --- UI ---
 init_state()
 
 st.markdown("## 🧩 Functional Activities Questionnaire")
-st.caption("One question per step • Select one answer")
+st.caption(f"One question per step • Select one answer • Session `{st.session_state.session_id}`")
 
 with st.container(border=True):
     cols = st.columns([1, 3])
@@ -94,31 +84,30 @@ with st.container(border=True):
         st.markdown(f"### {QUESTIONS[st.session_state.idx]}")
 
     # radio group
-    label_to_key = {o["label"]: o["key"] for o in OPTIONS}
-    key_to_label = {o["key"]: o["label"] for o in OPTIONS}
     current_key = st.session_state.answers[st.session_state.idx]
-    current_label = key_to_label[current_key] if current_key else None
+    current_label = KEY_TO_LABEL[current_key] if current_key else None
 
     choice = st.radio(
         "Select one:",
-        options=[o["label"] for o in OPTIONS],
-        index=[o["label"] for o in OPTIONS].index(current_label) if current_label else None,
+        options=OPTION_LABELS,
+        index=OPTION_LABELS.index(current_label) if current_label else None,
         key=f"radio_{st.session_state.idx}",
         label_visibility="collapsed",
     )
-    st.session_state.answers[st.session_state.idx] = label_to_key[choice] if choice else None
+    record_answer(st.session_state.idx, LABEL_TO_KEY[choice] if choice else None)
 
     c1, c2, c3, c4 = st.columns(4)
     with c1:
         if st.button("◀ Previous", disabled=st.session_state.idx == 0):
-            st.session_state.idx -= 1
+            record_step(st.session_state.idx - 1)
             st.rerun()
     with c2:
         if st.button("💾 Save Progress"):
             save_progress()
-            st.success("Progress saved to faq_progress.json", icon="✅")
+            st.success(f"Progress saved for session {st.session_state.session_id}", icon="✅")
     with c3:
-        if st.button("⟳ Load Progress", disabled=not PROGRESS_FILE.exists()):
+        if st.button("⟳ Load Progress",
+                     disabled=progress_journal().load(st.session_state.session_id) is None):
             load_progress()
             st.info("Progress loaded.", icon="ℹ️")
             st.rerun()
@@ -132,7 +121,7 @@ with st.container(border=True):
                 st.session_state.last_report_txt = txt
                 ROOT_SAVE_PATH.write_text(txt, encoding="utf-8")
             else:
-                st.session_state.idx += 1
+                record_step(st.session_state.idx + 1)
             st.rerun()
 
 # Report
@@ -1,16 +1,15 @@
 # voice_assessment_sd.py
 import streamlit as st
-import sounddevice as sd
-import numpy as np
-import wave, io, os, time, queue, threading
+import os, time
 from datetime import datetime
+# voice_capture and voice_features (PortAudio, NumPy) are imported on first
+# use: Streamlit re-runs this script on every click.
 
 # ---------- Config ----------
 st.set_page_config(page_title="Speech Assessment Recorder", page_icon="🗣️", layout="centered")
 SAMPLE_RATE = 16000        # 16 kHz mono
 MAX_SECONDS = 120          # 2 minutes default
 OUTPUT_DIR = "recordings"  # local folder to also save a copy (optional)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # ---------- Question Bank ----------
 QUESTION_BANK = {
@@ -50,95 +49,54 @@ def init_state():
     st.session_state.setdefault("recording", False)
     st.session_state.setdefault("start_ts", None)
     st.session_state.setdefault("stop_by_timer", False)
-    st.session_state.setdefault("wav_bytes", None)
-    st.session_state.setdefault("local_file", None)
-    st.session_state.setdefault("rec_thread", None)
-    st.session_state.setdefault("stop_event", None)
-    st.session_state.setdefault("frames_bytes", [])  # list of raw int16 bytes
+    st.session_state.setdefault("local_file", None)  # finished WAV; also the download source
+    st.session_state.setdefault("voice_data", None)  # metrics computed while recording
+    st.session_state.setdefault("capture", None)     # voice_capture.CaptureSession while recording
 init_state()
 
 def reset_audio_buffers():
-    st.session_state.frames_bytes = []
-    st.session_state.wav_bytes = None
     st.session_state.local_file = None
+    st.session_state.voice_data = None
     st.session_state.stop_by_timer = False
 
-# ---------- WAV helpers ----------
-def build_wav_from_bytes(frames_bytes: list[bytes], samplerate: int) -> bytes:
-    """Combine raw int16 mono chunks into a WAV in-memory bytes."""
-    if not frames_bytes:
-        return None
-    buf = io.BytesIO()
-    with wave.open(buf, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)  # int16
-        wf.setframerate(samplerate)
-        for chunk in frames_bytes:
-            wf.writeframes(chunk)
-    return buf.getvalue()
-
-def save_wav_file(frames_bytes: list[bytes], samplerate: int, file_path: str):
-    with wave.open(file_path, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(samplerate)
-        for chunk in frames_bytes:
-            wf.writeframes(chunk)
-
 # ---------- Background Recorder (sounddevice) ----------
-def start_recording_thread(samplerate: int, max_seconds: int):
-    q = queue.Queue()
-    stop_event = threading.Event()
-    st.session_state.stop_event = stop_event
-
-    def audio_callback(indata, frames, time_info, status):
-        # indata dtype=int16, mono channel expected
-        if status:
-            # You can log statuses if needed: st.write(status)
-            pass
-        q.put(bytes(indata))  # raw bytes (int16)
-
-    def runner():
-        start_time = time.time()
-        try:
-            with sd.RawInputStream(samplerate=samplerate, channels=1, dtype='int16', callback=audio_callback):
-                while not stop_event.is_set():
-                    # Pull audio chunks as they arrive
-                    try:
-                        chunk = q.get(timeout=0.1)
-                        st.session_state.frames_bytes.append(chunk)
-                    except queue.Empty:
-                        pass
-                    # Auto-stop at max_seconds
-                    if time.time() - start_time >= max_seconds:
-                        st.session_state.stop_by_timer = True
-                        break
-        except Exception as e:
-            # Expose any microphone/driver errors in the UI
-            st.session_state.recording = False
-            st.session_state.wav_bytes = None
-            st.session_state.local_file = None
-            st.session_state["rec_error"] = str(e)
-            return
-
-        # Build WAV in memory
-        wav_bytes = build_wav_from_bytes(st.session_state.frames_bytes, samplerate)
-        st.session_state.wav_bytes = wav_bytes
-
-        # Also save a copy locally (optional)
-        if wav_bytes:
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base = QUESTION_BANK[st.session_state.assessment_key]['label'].replace(" ", "_")
-            fname = f"{base}_{ts}.wav"
-            fpath = os.path.join(OUTPUT_DIR, fname)
-            save_wav_file(st.session_state.frames_bytes, samplerate, fpath)
-            st.session_state.local_file = fpath
-
-        st.session_state.recording = False  # mark finished
-
-    t = threading.Thread(target=runner, daemon=True)
-    t.start()
-    st.session_state.rec_thread = t
+@st.cache_resource
+def capture_manager():
+    # One per process: every browser session records through the same input stream
+    from voice_capture import CaptureManager, SoundDeviceBackend
+    return CaptureManager(SoundDeviceBackend(), SAMPLE_RATE)
+
+
+def start_recording(max_seconds: int):
+    from voice_features import FeatureEngine
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    # File name is fixed at start: audio streams straight into it while recording
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = QUESTION_BANK[st.session_state.assessment_key]['label'].replace(" ", "_")
+    fpath = os.path.join(OUTPUT_DIR, f"{base}_{ts}.wav")
+    features = FeatureEngine(SAMPLE_RATE)
+    st.session_state.capture = capture_manager().open(
+        fpath, max_seconds, sinks=[features.feed], finish=features.finalize)
+
+
+def collect_recording():
+    # The capture thread never touches session_state; finished results land here, on the script run
+    capture = st.session_state.capture
+    done = capture.poll() if capture else None
+    if done is None:
+        return
+    st.session_state.capture = None
+    st.session_state.recording = False
+    if done["error"]:
+        # Expose any microphone/driver errors in the UI
+        st.session_state.local_file = None
+        st.session_state["rec_error"] = done["error"]
+        return
+    st.session_state.pop("rec_error", None)
+    st.session_state.stop_by_timer = done["stopped_by_timer"]
+    st.session_state.voice_data = done["result"]
+    st.session_state.local_file = done["path"]
 
 # ---------- UI ----------
 st.title("🗣️ Speech Assessment Recorder (SoundDevice)")
@@ -187,14 +145,14 @@ if start_clicked:
     reset_audio_buffers()
     st.session_state.recording = True
     st.session_state.start_ts = time.time()
-    # Launch background recording thread
-    start_recording_thread(SAMPLE_RATE, MAX_SECONDS)
+    start_recording(MAX_SECONDS)
 
 # Stop
-if stop_clicked and st.session_state.recording:
-    # Signal thread to stop
-    if st.session_state.stop_event:
-        st.session_state.stop_event.set()
+if stop_clicked and st.session_state.recording and st.session_state.capture:
+    st.session_state.capture.stop()
+    st.session_state.capture.wait(5)  # usually one drain tick; then this run shows the result
+
+collect_recording()
 
 # Timer (client-side countdown) + status
 timer_box = st.empty()
@@ -209,7 +167,7 @@ if st.session_state.recording:
     status_box.write("🎙️ Speak now… (microphone in use)")
 else:
     # Finished or idle
-    if st.session_state.wav_bytes:
+    if st.session_state.local_file:
         finished_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         status_box.success(
             f"✅ Finished at {finished_str} "
@@ -221,20 +179,34 @@ else:
         status_box.info("Ready to record.")
 
 # Download section
-if st.session_state.wav_bytes:
-    file_base = f"{QUESTION_BANK[assessment_key]['label'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+if st.session_state.local_file:
+    file_base = os.path.basename(st.session_state.local_file)
     st.subheader("🎧 Your recording is ready")
     st.write(f"**Assessment:** {QUESTION_BANK[assessment_key]['label']}  \n**Question:** {st.session_state.question}")
 
+    with open(st.session_state.local_file, "rb") as f:
+        wav_bytes = f.read()
     st.download_button(
         label="⬇️ Download Recording (WAV)",
-        data=st.session_state.wav_bytes,
+        data=wav_bytes,
         file_name=file_base,
         mime="audio/wav",
     )
 
-    if st.session_state.local_file:
-        st.caption(f"Also saved locally: `{st.session_state.local_file}`")
+    st.caption(f"Saved locally: `{st.session_state.local_file}`")
+
+# Speech metrics (same fields as voice_data in the web task)
+if st.session_state.local_file and st.session_state.voice_data:
+    vd = st.session_state.voice_data
+    st.subheader("📊 Speech metrics")
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Clarity", vd["metrics"]["clarity"])
+    m2.metric("Fluency", vd["metrics"]["fluency"])
+    m3.metric("Prosody", vd["metrics"]["prosody"])
+    m4.metric("Total", vd["metrics"]["total"])
+    st.write(vd["narrative"])
+    with st.expander("Acoustic features"):
+        st.json(vd["features"])
 
 # Troubleshooting
 with st.expander("Troubleshooting"):
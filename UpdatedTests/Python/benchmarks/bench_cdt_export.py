@@ -0,0 +1,87 @@
+# Clock drawing export: time the Tk thread is blocked per Submit (the old
+# synchronous compose + save vs handing a snapshot to cdt_export.Exporter),
+# file size (RGB PNG vs lossless palette PNG), and bulk re-encode throughput.
+# No display needed. Run from UpdatedTests/Python:  python -m benchmarks.bench_cdt_export [drawings]
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+import cdt_export
+from CDT_TEST import CANVAS_H, CANVAS_W, compose_submission, load_font
+
+
+def drawing(seed):
+    rnd = random.Random(seed)
+    img = Image.new("RGB", (CANVAS_W, CANVAS_H), "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((16, 12), "Draw a clock showing 10 minutes after 11", fill=(13, 110, 253),
+              font=load_font(20))
+    cx, cy, r = 450, 320, rnd.randint(180, 250)
+    pts = [(cx + (r + rnd.randint(-4, 4)) * math.cos(a / 90 * math.tau),
+            cy + (r + rnd.randint(-4, 4)) * math.sin(a / 90 * math.tau)) for a in range(91)]
+    draw.line(pts, fill="#111111", width=6, joint="curve")
+    for h in range(12):  # numerals as short scribbles
+        a = h / 12 * math.tau
+        x, y = cx + 0.8 * r * math.sin(a), cy - 0.8 * r * math.cos(a)
+        draw.line([(x - 6, y - 8), (x + 6, y), (x - 6, y + 8)], fill="#111111", width=4)
+    for a, length in ((rnd.uniform(5.7, 5.9), 0.5), (rnd.uniform(1.0, 1.1), 0.75)):
+        draw.line([(cx, cy), (cx + length * r * math.sin(a), cy - length * r * math.cos(a))],
+                  fill="#cc0000" if seed % 3 == 0 else "#111111", width=6)
+    return img
+
+
+def main(n=40):
+    imgs = [drawing(i) for i in range(n)]
+    out = tempfile.mkdtemp(prefix="cdt_export_")
+
+    blocked_sync, rgb_sizes = [], []
+    for i, img in enumerate(imgs):
+        t0 = time.perf_counter()
+        final = compose_submission(img)  # what submit() used to do inline
+        final.save(os.path.join(out, f"sync_{i}.png"), "PNG")
+        blocked_sync.append(time.perf_counter() - t0)
+        rgb_sizes.append(os.path.getsize(os.path.join(out, f"sync_{i}.png")))
+
+    exporter = cdt_export.Exporter(os.path.join(out, "exported"))
+    results, done = [], threading.Event()
+
+    def finished(result):
+        results.append(result)
+        if len(results) == n:
+            done.set()
+
+    blocked_async = []
+    for i, img in enumerate(imgs):
+        t0 = time.perf_counter()
+        exporter.export(img.copy(), f"bench-{i}", compose=compose_submission, callback=finished)
+        blocked_async.append(time.perf_counter() - t0)
+    done.wait()
+    exporter.close()
+    assert all(r.error is None for r in results)
+    sizes = [r.bytes for r in results]
+
+    ms = lambda xs: f"p50 {statistics.median(xs) * 1000:7.2f} ms  max {max(xs) * 1000:7.2f} ms"
+    print(f"{n} drawings")
+    print(f"Tk thread blocked, synchronous save   {ms(blocked_sync)}")
+    print(f"Tk thread blocked, background export  {ms(blocked_async)}")
+    print(f"worker time per export                {ms([r.seconds for r in results])}")
+    print(f"size  RGB PNG {statistics.mean(rgb_sizes) / 1024:6.1f} KB   palette PNG "
+          f"{statistics.mean(sizes) / 1024:6.1f} KB  ({1 - sum(sizes) / sum(rgb_sizes):.0%} smaller)")
+    for r in results:  # exported files are pixel-identical to the synchronous ones
+        i = int(os.path.basename(r.path).split("_")[1].split("-")[1])
+        with Image.open(r.path) as a, Image.open(os.path.join(out, f"sync_{i}.png")) as b:
+            assert cdt_export.same_pixels(b, a)
+
+    print("bulk re-encode (RGB saves shrink, exported ones are kept):")
+    cdt_export.main([out, "--workers", str(os.cpu_count())])
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
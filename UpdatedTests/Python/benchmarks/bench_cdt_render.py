@@ -0,0 +1,51 @@
+# Per-event latency of ClockDrawingApp.on_move, "full" vs "incremental" rendering.
+# Needs a display (use xvfb-run on a headless box).
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_cdt_render [events]
+import math
+import sys
+import time
+import tkinter as tk
+from types import SimpleNamespace
+
+from CDT_TEST import ClockDrawingApp
+
+
+def circle(n, cx=450, cy=300, r=220):
+    return [(int(cx + r * math.cos(2 * math.pi * i / n)), int(cy + r * math.sin(2 * math.pi * i / n)))
+            for i in range(n + 1)]
+
+
+def measure(mode, points):
+    root = tk.Tk()
+    app = ClockDrawingApp(root, render_mode=mode)
+    root.update()
+    handler, total = [], []
+    app.on_press(SimpleNamespace(x=points[0][0], y=points[0][1]))
+    for x, y in points[1:]:
+        t0 = time.perf_counter()
+        app.on_move(SimpleNamespace(x=x, y=y))
+        t1 = time.perf_counter()
+        root.update()  # let Tk redraw (and run any due flush) like the real event loop
+        t2 = time.perf_counter()
+        handler.append((t1 - t0) * 1000)
+        total.append((t2 - t0) * 1000)
+    app.on_release(None)
+    root.destroy()
+    return sorted(handler), sorted(total)
+
+
+def pct(xs, p):
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def main(n=600):
+    points = circle(n)
+    print(f"{'mode':<12}{'handler p50':>12}{'p95':>8}{'handler+redraw p50':>20}{'p95':>8}  (ms, {n} events)")
+    for mode in ("full", "incremental"):
+        handler, total = measure(mode, points)
+        print(f"{mode:<12}{pct(handler, .5):>12.3f}{pct(handler, .95):>8.3f}"
+              f"{pct(total, .5):>20.3f}{pct(total, .95):>8.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
@@ -0,0 +1,425 @@
+# Headless drawing benchmark for ClockDrawingApp: replays a stroke trace (a
+# synthetic clock, or a recorded one) as real <ButtonPress-1>, <B1-Motion> and
+# <ButtonRelease-1> events through the Tk event loop, at mouse rate, and
+# reports percentiles as JSON so drawing-path changes can be compared across
+# commits:
+#   on_move      handler time per motion event (likewise on_press, on_release)
+#   flush        time of each dirty-region flush into the PhotoImage
+#   lag          delay from when an event was due to when its handler ran
+#                (grows when handlers can't keep up; coalesced motion counted)
+#   history      StrokeHistory bytes and process RSS after each stroke
+#   submit       time the Tk thread spends in submit(), and until the export
+#                worker reports the file written
+#
+# Runs under its own Xvfb when one is installed (apt install xvfb), else on
+# $DISPLAY. Traces are {"strokes": [{"label", "points": [[t_ms, x, y], ...]}]}
+# or a drawing's .strokes.json sidecar (retimed at --speed / --hz).
+# Run from UpdatedTests/Python:
+#   python -m benchmarks.bench_cdt_replay [--trace file] [--rounds 5] [--mode incremental|full]
+#                                         [--hz 125] [--speed 600] [--json out.json] [--compare base.json]
+#                                         [--save-trace clock.json] [--tracemalloc]
+import argparse
+import json
+import math
+import os
+import platform
+import queue
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 95, 99)
+PEN_UP_MS = 250      # pause between strokes
+SUBMIT_TIMEOUT = 60  # seconds to wait for the export worker
+
+# Numerals as polylines in a unit box (y down), one stroke per digit
+DIGITS = {
+    "0": [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)],
+    "1": [(0.3, 0.2), (0.5, 0), (0.5, 1)],
+    "2": [(0, 0), (1, 0), (1, 0.5), (0, 0.5), (0, 1), (1, 1)],
+    "3": [(0, 0), (1, 0), (1, 0.5), (0.2, 0.5), (1, 0.5), (1, 1), (0, 1)],
+    "4": [(0, 0), (0, 0.5), (1, 0.5), (1, 0), (1, 1)],
+    "5": [(1, 0), (0, 0), (0, 0.5), (1, 0.5), (1, 1), (0, 1)],
+    "6": [(1, 0), (0, 0), (0, 1), (1, 1), (1, 0.5), (0, 0.5)],
+    "7": [(0, 0), (1, 0), (0.4, 1)],
+    "8": [(0, 0.5), (0, 0), (1, 0), (1, 1), (0, 1), (0, 0.5), (1, 0.5)],
+    "9": [(1, 0.5), (0, 0.5), (0, 0), (1, 0), (1, 1), (0, 1)],
+}
+
+
+# ---------- Traces ----------
+def timed_path(path, t0, hz, speed, rnd, jitter=1.0):
+    """[t_ms, x, y] samples along a polyline, as a mouse at hz moving at speed px/s would report."""
+    seg = [math.dist(a, b) for a, b in zip(path, path[1:])]
+    length = sum(seg) or 1.0
+    n = max(2, int(length / speed * hz) + 1)
+    out, i, done = [], 0, 0.0
+    for k in range(n):
+        d = length * k / (n - 1)
+        while i < len(seg) - 1 and done + seg[i] < d:
+            done += seg[i]
+            i += 1
+        u = (d - done) / seg[i] if seg[i] else 0.0
+        (ax, ay), (bx, by) = path[i], path[i + 1]
+        x = ax + (bx - ax) * u + (rnd.gauss(0, jitter) if 0 < k < n - 1 else 0)
+        y = ay + (by - ay) * u + (rnd.gauss(0, jitter) if 0 < k < n - 1 else 0)
+        out.append([round(t0 + k * 1000 / hz, 3), int(round(x)), int(round(y))])
+    return out
+
+
+def synthetic_clock(hz=125, speed=600, seed=0, cx=450, cy=300, r=230):
+    """Circle, the twelve numerals and two hands at 11:10, drawn the way a patient would."""
+    rnd = random.Random(seed)
+    paths = [("circle", [(cx + (r + rnd.uniform(-3, 3)) * math.sin(a), cy - (r + rnd.uniform(-3, 3)) * math.cos(a))
+                         for a in np.linspace(0, 2.1 * math.pi, 160)])]
+    w, h = 14, 24
+    for hour in range(1, 13):
+        a = hour / 12 * 2 * math.pi
+        x, y = cx + 0.82 * r * math.sin(a), cy - 0.82 * r * math.cos(a)
+        text = str(hour)
+        left = x - (len(text) * (w + 6) - 6) / 2
+        for j, digit in enumerate(text):
+            ox = left + j * (w + 6)
+            paths.append((f"numeral {text}", [(ox + px * w, y - h / 2 + py * h) for px, py in DIGITS[digit]]))
+    for label, hour, length in (("hour hand", 11 + 10 / 60, 0.5), ("minute hand", 2, 0.75)):
+        a = hour / 12 * 2 * math.pi
+        paths.append((label, [(cx, cy), (cx + length * r * math.sin(a), cy - length * r * math.cos(a))]))
+    strokes, t = [], 0.0
+    for label, path in paths:
+        points = timed_path(path, t, hz, speed, rnd)
+        strokes.append({"label": label, "points": points})
+        t = points[-1][0] + PEN_UP_MS
+    return {"source": f"synthetic clock (seed {seed})", "hz": hz, "speed": speed, "strokes": strokes}
+
+
+def load_trace(path, hz=125, speed=600):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    strokes = [s for s in data.get("strokes", []) if s.get("tool", "pen") != "clear"]
+    if strokes and strokes[0]["points"] and not isinstance(strokes[0]["points"][0], list):
+        # A StrokeHistory sidecar: flat x0, y0, x1, y1, ... without timestamps
+        rnd, t, timed = random.Random(0), 0.0, []
+        for i, s in enumerate(strokes):
+            p = s["points"]
+            xy = list(zip(p[0::2], p[1::2]))
+            if len(xy) == 1:
+                xy.append(xy[0])
+            points = timed_path(xy, t, hz, speed, rnd, jitter=0)
+            timed.append({"label": f"{s.get('tool', 'pen')} {i}", "points": points})
+            t = points[-1][0] + PEN_UP_MS
+        return {"source": os.path.basename(path), "hz": hz, "speed": speed, "strokes": timed}
+    data.setdefault("source", os.path.basename(path))
+    return data
+
+
+def events(trace, speedup=1.0):
+    """(due seconds, sequence, x, y) for the whole trace, in order."""
+    out = []
+    for stroke in trace["strokes"]:
+        pts = stroke["points"]
+        out.append((pts[0][0] / 1000 / speedup, "<ButtonPress-1>", pts[0][1], pts[0][2]))
+        out.extend((t / 1000 / speedup, "<B1-Motion>", x, y) for t, x, y in pts[1:])
+        out.append((pts[-1][0] / 1000 / speedup, "<ButtonRelease-1>", pts[-1][1], pts[-1][2]))
+    return out
+
+
+# ---------- Display ----------
+def start_xvfb(screen="1280x1024x24"):
+    """Start a private Xvfb and point DISPLAY at it; None if Xvfb isn't installed."""
+    exe = shutil.which("Xvfb")
+    if exe is None:
+        return None
+    r, w = os.pipe()
+    proc = subprocess.Popen([exe, "-displayfd", str(w), "-screen", "0", screen, "-nolisten", "tcp"],
+                            pass_fds=(w,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(w)
+    with os.fdopen(r) as f:
+        number = f.readline().strip()
+    if not number:
+        proc.kill()
+        return None
+    os.environ["DISPLAY"] = f":{number}"
+    return proc
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+# ---------- Replay ----------
+def instrumented(base):
+    class Instrumented(base):
+        """ClockDrawingApp with its handlers timed; bindings pick these up in __init__."""
+
+        def __init__(self, root, **kwargs):
+            self.samples = {"on_press": [], "on_move": [], "on_release": [], "flush": [], "lag": []}
+            self.pending = deque()   # (due, x, y) of generated events not yet handled
+            self.coalesced = 0
+            self.strokes_done = []   # per stroke: history bytes, rss, traced bytes
+            self.saved = None
+            super().__init__(root, **kwargs)
+
+        def _timed(self, name, handler, event):
+            t0 = time.perf_counter()
+            if event is not None:
+                while self.pending:
+                    due, x, y = self.pending.popleft()
+                    if (x, y) == (event.x, event.y):
+                        self.samples["lag"].append((t0 - due) * 1000)
+                        break
+                    self.coalesced += 1  # Tk folded this motion into a later one
+            handler(event)
+            self.samples[name].append((time.perf_counter() - t0) * 1000)
+
+        def on_press(self, event):
+            self._timed("on_press", super().on_press, event)
+
+        def on_move(self, event):
+            self._timed("on_move", super().on_move, event)
+
+        def on_release(self, event):
+            self._timed("on_release", super().on_release, event)
+            traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+            self.strokes_done.append((self.history.nbytes, rss_bytes(), traced))
+
+        def _flush_dirty(self):
+            t0 = time.perf_counter()
+            super()._flush_dirty()
+            self.samples["flush"].append((time.perf_counter() - t0) * 1000)
+
+        def _poll_exports(self):
+            # No message box: just note when the worker reported back
+            while True:
+                try:
+                    result = self.export_results.get_nowait()
+                except queue.Empty:
+                    break
+                self.exports_pending -= 1
+                self.saved = result
+            if self.exports_pending:
+                self.root.after(1, self._poll_exports)
+
+    return Instrumented
+
+
+def replay(tk, app_cls, trace, mode, speedup, out_dir):
+    root = tk.Tk()
+    app = app_cls(root, render_mode=mode, patient_id="bench", out_dir=out_dir)
+    root.update()
+    canvas = app.canvas
+    evs, t0 = events(trace, speedup), None
+    state = {"i": 0, "s0": None, "submit_call": None, "submit_saved": None}
+
+    def pump():
+        nonlocal t0
+        if t0 is None:
+            t0 = time.perf_counter()
+        now = time.perf_counter() - t0
+        i = state["i"]
+        while i < len(evs) and evs[i][0] <= now:
+            due, seq, x, y = evs[i]
+            app.pending.append((t0 + due, x, y))
+            canvas.event_generate(seq, x=x, y=y, when="tail")
+            i += 1
+        state["i"] = i
+        if i < len(evs):
+            root.after(max(0, int((evs[i][0] - (time.perf_counter() - t0)) * 1000)), pump)
+        else:
+            root.after(50, submit)  # let the last release and flush run
+
+    def submit():
+        # Stamp "saved" on the worker as it reports back, not at the next poll
+        put = app.export_results.put
+
+        def saved(result):
+            state["submit_saved"] = time.perf_counter()
+            put(result)
+
+        app.export_results.put = saved
+        state["s0"] = time.perf_counter()
+        app.submit()
+        state["submit_call"] = (time.perf_counter() - state["s0"]) * 1000
+        wait_saved(time.perf_counter() + SUBMIT_TIMEOUT)
+
+    def wait_saved(deadline):
+        if app.saved is None and time.perf_counter() < deadline:
+            root.after(5, wait_saved, deadline)
+        else:
+            root.quit()
+
+    root.after(0, pump)
+    root.mainloop()
+    if app.saved is None or app.saved.error is not None:
+        raise RuntimeError(f"submit did not save: {getattr(app.saved, 'error', 'timed out')}")
+    saved_ms = (state["submit_saved"] - state["s0"]) * 1000
+    app.close()
+    return app, state["submit_call"], saved_ms
+
+
+def summary(samples):
+    if not samples:
+        return {"n": 0}
+    xs = np.asarray(samples, dtype=float)
+    out = {"n": int(xs.size), "mean": round(float(xs.mean()), 4)}
+    out.update({f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, np.percentile(xs, PERCENTILES))})
+    out["max"] = round(float(xs.max()), 4)
+    return out
+
+
+def git_commit():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=HERE, capture_output=True,
+                               text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(trace, rounds, mode, speedup, trace_memory):
+    import tkinter as tk
+    from CDT_TEST import ClockDrawingApp
+
+    app_cls = instrumented(ClockDrawingApp)
+    merged = {k: [] for k in ("on_press", "on_move", "on_release", "flush", "lag",
+                              "submit_call", "submit_saved")}
+    generated = coalesced = 0
+    memory = []
+    out_dir = tempfile.mkdtemp(prefix="bench_cdt_replay_")
+    try:
+        for _ in range(rounds):
+            if trace_memory:
+                tracemalloc.start()
+            app, call_ms, saved_ms = replay(tk, app_cls, trace, mode, speedup, out_dir)
+            if trace_memory:
+                tracemalloc.stop()
+            for k, v in app.samples.items():
+                merged[k].extend(v)
+            merged["submit_call"].append(call_ms)
+            merged["submit_saved"].append(saved_ms)
+            generated += sum(1 for s in trace["strokes"] for _ in s["points"][1:])
+            coalesced += app.coalesced
+            memory.append(app.strokes_done)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    # Memory: how the undo history and the process grow over one drawing, and
+    # whether RSS keeps climbing from one fresh window to the next
+    history = [m[0] for m in memory[0]]
+    rss = [m[1] for m in memory[0] if m[1] is not None]
+    traced = [m[2] for m in memory[0] if m[2] is not None]
+    growth = {
+        "strokes": len(history),
+        "history_bytes_final": history[-1] if history else None,
+        "history_bytes_per_stroke": summary(np.diff([0, *history]).tolist()),
+        "rss_growth_bytes": rss[-1] - rss[0] if len(rss) > 1 else None,
+        "rss_growth_bytes_all_rounds": memory[-1][-1][1] - memory[0][0][1]
+        if memory[0] and memory[0][0][1] is not None else None,
+    }
+    if traced:
+        growth["traced_growth_bytes"] = traced[-1] - traced[0]
+    return {
+        "metrics_ms": {k: summary(v) for k, v in merged.items()},
+        "motion_events": {"generated": generated, "coalesced": coalesced},
+        "memory": growth,
+    }
+
+
+def report(result):
+    print(f"{'metric':<14}{'n':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}   (ms)")
+    for name, s in result["metrics_ms"].items():
+        if s["n"]:
+            print(f"{name:<14}{s['n']:>7}" + "".join(f"{s[k]:>9.3f}" for k in ("p50", "p90", "p95", "p99", "max")))
+    ev, mem = result["motion_events"], result["memory"]
+    print(f"motion events {ev['generated']:,} generated, {ev['coalesced']:,} coalesced by Tk")
+    print(f"history       {mem['history_bytes_final'] or 0:,} bytes after {mem['strokes']} strokes"
+          + (f", RSS +{mem['rss_growth_bytes'] / 1024:,.0f} KiB" if mem["rss_growth_bytes"] is not None else ""))
+
+
+def compare(result, baseline):
+    print(f"{'vs baseline':<14}{'p50':>9}{'p95':>9}   ({baseline.get('commit') or 'baseline'})")
+    for name, s in result["metrics_ms"].items():
+        b = baseline.get("metrics_ms", {}).get(name)
+        if s["n"] and b and b.get("n"):
+            print(f"{name:<14}" + "".join(f"{s[k] / b[k] if b[k] else float('nan'):>8.2f}x" for k in ("p50", "p95")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a clock drawing through ClockDrawingApp under Xvfb.")
+    parser.add_argument("--trace", help="trace or .strokes.json to replay (default: a synthetic clock)")
+    parser.add_argument("--rounds", type=int, default=5, help="fresh windows to replay the trace in")
+    parser.add_argument("--mode", choices=("incremental", "full"), default="incremental")
+    parser.add_argument("--hz", type=float, default=125, help="mouse report rate for synthetic/retimed traces")
+    parser.add_argument("--speed", type=float, default=600, help="pen speed in px/s for synthetic/retimed traces")
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay this many times faster than real time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--display", choices=("auto", "xvfb", "current"), default="auto",
+                        help="auto: a private Xvfb if installed, else $DISPLAY")
+    parser.add_argument("--tracemalloc", action="store_true", help="also trace Python allocations (slows handlers)")
+    parser.add_argument("--save-trace", help="write the trace used, to replay the same one later")
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--compare", help="a previous --json report to compare against")
+    args = parser.parse_args(argv)
+
+    trace = load_trace(args.trace, args.hz, args.speed) if args.trace else \
+        synthetic_clock(args.hz, args.speed, args.seed)
+    if args.save_trace:
+        with open(args.save_trace, "w", encoding="utf-8") as f:
+            json.dump(trace, f, separators=(",", ":"))
+
+    xvfb = None
+    if args.display != "current":
+        xvfb = start_xvfb()
+        if xvfb is None and args.display == "xvfb":
+            print("Xvfb is not installed (apt install xvfb)", file=sys.stderr)
+            return 2
+    if xvfb is None and not os.environ.get("DISPLAY"):
+        print("no display: install Xvfb or set DISPLAY", file=sys.stderr)
+        return 2
+    try:
+        result = run(trace, args.rounds, args.mode, args.speedup, args.tracemalloc)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    n_points = sum(len(s["points"]) for s in trace["strokes"])
+    result = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "tk": __import__("tkinter").TkVersion,
+        "display": "xvfb" if xvfb is not None else os.environ.get("DISPLAY"),
+        "mode": args.mode,
+        "rounds": args.rounds,
+        "trace": {"source": trace.get("source"), "strokes": len(trace["strokes"]), "points": n_points,
+                  "hz": trace.get("hz"), "speed": trace.get("speed"), "speedup": args.speedup},
+        **result,
+    }
+    print(f"{result['trace']['source']}: {len(trace['strokes'])} strokes, {n_points:,} points, "
+          f"{args.mode} mode, {args.rounds} rounds")
+    report(result)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# Throughput of cdt_score: single image, batch across a process pool, and a
+# warm rerun that is served from the result cache.
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_cdt_score [images]
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+import cdt_score
+
+
+def synthetic_clock(seed, size=(900, 600)):
+    # A plausible hand-drawn 11:10 clock with some jitter per drawing
+    rnd = random.Random(seed)
+    img = Image.new("RGB", size, "white")
+    d = ImageDraw.Draw(img)
+    cx, cy = size[0] / 2 + rnd.uniform(-40, 40), size[1] / 2 + rnd.uniform(-20, 20)
+    r = rnd.uniform(200, 260)
+    pts = [(cx + r * math.sin(t) * rnd.uniform(.98, 1.02), cy - r * math.cos(t) * rnd.uniform(.98, 1.02))
+           for t in (2 * math.pi * i / 120 for i in range(121))]
+    d.line(pts, fill="#111111", width=6, joint="curve")
+    font = ImageFont.load_default()
+    for hour in range(1, 13):
+        if rnd.random() < 0.05:
+            continue  # occasionally a missing number
+        t = math.radians(hour * 30)
+        d.text((cx + 0.75 * r * math.sin(t), cy - 0.75 * r * math.cos(t)), str(hour),
+               fill="#111111", font=font, anchor="mm", stroke_width=2)
+    for angle, length in ((cdt_score.HOUR_TARGET, 0.3), (cdt_score.MINUTE_TARGET, 0.5)):
+        t = math.radians(angle + rnd.uniform(-6, 6))
+        d.line((cx, cy, cx + length * r * math.sin(t), cy - length * r * math.cos(t)), fill="#111111", width=6)
+    return img
+
+
+def main(n=500):
+    root = tempfile.mkdtemp(prefix="cdt_bench_")
+    for i in range(n):
+        synthetic_clock(i).save(os.path.join(root, f"clock_{i:05d}.png"))
+
+    paths = list(cdt_score.find_drawings(root))
+    t0 = time.perf_counter()
+    for p in paths[:50]:
+        cdt_score.score(p)
+    single = 50 / (time.perf_counter() - t0)
+
+    out = os.path.join(root, "scores.jsonl")
+    total, scored, cold = cdt_score.score_directory(root, out)
+    t0 = time.perf_counter()
+    cdt_score.score_directory(root, out)
+    warm = time.perf_counter() - t0
+
+    print(f"single process : {single:8.1f} images/s")
+    print(f"process pool   : {scored / cold:8.1f} images/s ({os.cpu_count()} CPUs, {total} images)")
+    print(f"cached rerun   : {total / warm:8.1f} images/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
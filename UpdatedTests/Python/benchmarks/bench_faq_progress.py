@@ -0,0 +1,72 @@
+# Concurrency stress test for faq_progress.ProgressJournal: hundreds of
+# simultaneous respondents answer, revise and step through the FAQ, each on
+# its own thread, and every session must resume to exactly its last state,
+# both from the live journal and from a fresh one reading the files back.
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_faq_progress [respondents]
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from faq_progress import ProgressJournal
+from faq_scoring import OPTIONS, QUESTIONS
+
+KEYS = [o["key"] for o in OPTIONS]
+
+
+def respondent(journal, session_id, seed, expected, latencies, start):
+    rnd = random.Random(seed)
+    state = {"idx": 0, "answers": [None] * len(QUESTIONS)}
+    start.wait()
+    for _ in range(rnd.randint(20, 200)):  # answers, changes of mind, back and forth
+        t0 = time.perf_counter()
+        if rnd.random() < 0.7:
+            i, key = state["idx"], rnd.choice(KEYS)
+            journal.set_answer(session_id, i, key)
+            state["answers"][i] = key
+        else:
+            state["idx"] = max(0, min(len(QUESTIONS) - 1, state["idx"] + rnd.choice((-1, 1))))
+            journal.set_index(session_id, state["idx"])
+        latencies.append(time.perf_counter() - t0)
+        if rnd.random() < 0.05:
+            journal.sync(session_id)  # the Save button
+        time.sleep(rnd.uniform(0, 0.002))
+    expected[session_id] = state
+
+
+def main(respondents=300):
+    root = tempfile.mkdtemp(prefix="faq_progress_")
+    # Above the default max_open (512) respondents also exercise eviction and reopen
+    journal = ProgressJournal(root, len(QUESTIONS), compact_every=32).start()
+    expected, latencies = {}, []
+    start = threading.Event()
+    threads = [threading.Thread(target=respondent, args=(journal, f"patient-{n}", n, expected, latencies, start))
+               for n in range(respondents)]
+    for t in threads:
+        t.start()
+    t0 = time.perf_counter()
+    start.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    live = sum(journal.load(sid) == state for sid, state in expected.items())
+    journal.close()
+    fresh = ProgressJournal(root, len(QUESTIONS))
+    t1 = time.perf_counter()
+    reread = sum(fresh.load(sid) == state for sid, state in expected.items())
+    resume = (time.perf_counter() - t1) / len(expected)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print(f"{respondents} respondents, {len(latencies)} changes in {elapsed:.2f}s"
+          f" = {len(latencies) / elapsed:,.0f} changes/s  ({root})")
+    print(f"change latency  p50 {pct(.5):.3f} ms  p95 {pct(.95):.3f} ms  p99 {pct(.99):.3f} ms")
+    print(f"resume          {resume * 1000:.3f} ms per session from disk")
+    print(f"consistent      live {live}/{respondents}  reopened {reread}/{respondents}")
+    return 0 if live == reread == respondents else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
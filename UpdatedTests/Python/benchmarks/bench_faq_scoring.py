@@ -0,0 +1,69 @@
+# Cohort scoring throughput for faq_scoring: the original per-answer linear
+# search, the vectorized core on an already-encoded matrix, encode + score from
+# answer keys, and the chunked CSV CLI end to end.
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_faq_scoring [rows]
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import faq_scoring
+from faq_scoring import OPTIONS, QUESTIONS
+
+
+def linear_score(answers):
+    # compute_score() as FAQ-TEST.py had it
+    total = 0
+    for key in answers:
+        opt = next((o for o in OPTIONS if o["key"] == key), None)
+        total += opt["score"] if opt else 0
+    return total
+
+
+def cohort(n, seed=0):
+    rnd = np.random.default_rng(seed)
+    keys = np.array([o["key"] for o in OPTIONS] + [""])
+    return keys[rnd.integers(0, len(keys), size=(n, len(QUESTIONS)))]
+
+
+def rate(n, seconds):
+    return f"{n / seconds * 60:>14,.0f} /min"
+
+
+def main(n=1_000_000):
+    scoring = faq_scoring.DEFAULT
+    answers = cohort(n)
+    rows = answers.tolist()
+    print(f"{n:,} questionnaires")
+
+    sample = rows[:20000]
+    t0 = time.perf_counter()
+    linear = [linear_score(r) for r in sample]
+    print(f"linear search        {rate(len(sample), time.perf_counter() - t0)}")
+
+    codes = scoring.encode(answers)
+    t0 = time.perf_counter()
+    scored = scoring.score_codes(codes)
+    print(f"score_codes          {rate(n, time.perf_counter() - t0)}")
+    assert scored["total"][:len(sample)].tolist() == linear
+
+    t0 = time.perf_counter()
+    scoring.score_codes(scoring.encode(rows))
+    print(f"encode + score       {rate(n, time.perf_counter() - t0)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src, out = os.path.join(tmp, "answers.csv"), os.path.join(tmp, "scores.csv")
+        with open(src, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["id"] + [f"q{i + 1}" for i in range(len(QUESTIONS))])
+            w.writerows([i, *r] for i, r in enumerate(rows))
+        t0 = time.perf_counter()
+        faq_scoring.score_file(src, out)
+        print(f"CSV CLI end to end   {rate(n, time.perf_counter() - t0)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
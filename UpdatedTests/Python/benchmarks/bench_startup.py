@@ -0,0 +1,99 @@
+# Cold-start and rerun cost of the three tools.
+#
+# Each sample runs in a fresh interpreter so imports are really cold:
+#   import   time to import the tool's module set (streamlit + first script run,
+#            or CDT_TEST plus building the window)
+#   rerun    median time of a Streamlit rerun of the already-loaded script (via
+#            streamlit.testing's AppTest), or of a second font lookup + header
+#            render for the Tk app
+# Needs streamlit installed; the CDT rows need a display (xvfb-run works).
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_startup [samples] [reruns]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS = ("FAQ-TEST.py", "VoiceCog_TEST.py", "CDT_TEST.py")
+
+
+def child_streamlit(script, reruns):
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t1 = time.perf_counter()
+    at = AppTest.from_file(os.path.join(HERE, script), default_timeout=30)
+    at.run()
+    t2 = time.perf_counter()
+    times = []
+    for i in range(reruns):
+        if at.radio:  # change an answer each time, like a respondent clicking
+            radio = at.radio[0]
+            radio.set_value(radio.options[i % len(radio.options)])
+        t = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return {"framework": t1 - t0, "first_run": t2 - t1, "reruns": times}
+
+
+def child_tk(reruns):
+    t0 = time.perf_counter()
+    import tkinter as tk
+    import CDT_TEST
+    t1 = time.perf_counter()
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return {"framework": t1 - t0, "first_run": None, "reruns": []}
+    app = CDT_TEST.ClockDrawingApp(root)
+    root.update()
+    t2 = time.perf_counter()
+    times = []
+    for _ in range(reruns):
+        t = time.perf_counter()
+        app._add_intro_text()
+        CDT_TEST.load_font(28)
+        times.append(time.perf_counter() - t)
+    root.destroy()
+    return {"framework": t1 - t0, "first_run": t2 - t1, "reruns": times}
+
+
+def sample(script, reruns):
+    cmd = [sys.executable, "-m", "benchmarks.bench_startup", "--child", script, str(reruns)]
+    out = subprocess.run(cmd, cwd=HERE, capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "child failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def ms(x):
+    return f"{x * 1000:9.1f}" if x is not None else "      n/a"
+
+
+def main(samples=5, reruns=20):
+    print(f"{'tool':<18}{'import':>9}{'first run':>11}{'rerun p50':>11}{'rerun max':>11}"
+          f"   (ms, median of {samples} cold processes)")
+    for script in TOOLS:
+        try:
+            runs = [sample(script, reruns) for _ in range(samples)]
+        except RuntimeError as e:
+            print(f"{script:<18}skipped: {e}")
+            continue
+        first = [r["first_run"] for r in runs if r["first_run"] is not None]
+        reruns_all = [t for r in runs for t in r["reruns"]]
+        print(f"{script:<18}{ms(statistics.median(r['framework'] for r in runs))}"
+              f"  {ms(statistics.median(first) if first else None)}"
+              f"  {ms(statistics.median(reruns_all) if reruns_all else None)}"
+              f"  {ms(max(reruns_all) if reruns_all else None)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        script, reruns = sys.argv[2], int(sys.argv[3])
+        result = child_tk(reruns) if script == "CDT_TEST.py" else child_streamlit(script, reruns)
+        print(json.dumps(result))
+    else:
+        main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,70 @@
+# Concurrent recording through one voice_capture.CaptureManager: dozens of
+# sessions share a fake input device (synthetic speech, real-time clock), each
+# streaming to its own WAV with a FeatureEngine sink, as the Streamlit app
+# does. Reports dropped-frame rates (ring overruns per session, blocks the
+# device lost because the callback ran late) and how long stop() takes to
+# return a result. --speed > 1 runs the device faster than real time to find
+# the headroom.
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_voice_capture [--sessions 1 8 32 64] [--seconds 10]
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_voice_features import synthetic_speech
+from voice_capture import CaptureManager, FakeDevice
+from voice_features import FeatureEngine
+
+SAMPLE_RATE = 16000  # same as VoiceCog_TEST.py
+
+
+def speech(n, rng):
+    return synthetic_speech(n / SAMPLE_RATE, seed=int(rng.integers(1 << 30)))
+
+
+def run(n_sessions, seconds, speed, out):
+    device = FakeDevice(signal=speech, speed=speed)
+    manager = CaptureManager(device, SAMPLE_RATE)
+    sessions = []
+    for i in range(n_sessions):
+        features = FeatureEngine(SAMPLE_RATE)
+        sessions.append(manager.open(os.path.join(out, f"s{n_sessions}_{i}.wav"), 3600,
+                                     sinks=[features.feed], finish=features.finalize))
+    time.sleep(seconds / speed)
+
+    stop_latency = []
+    for session in sessions:
+        t0 = time.perf_counter()
+        session.stop()
+        session.wait()
+        stop_latency.append(time.perf_counter() - t0)
+    results = [s.poll() for s in sessions]
+    assert all(r["error"] is None and r["result"] for r in results), results
+
+    frames = sum(s.recorder.wav.frames for s in sessions)
+    dropped = sum(r["dropped"] for r in results)
+    blocks = manager.callbacks + device.skipped
+    return {"sessions": n_sessions, "audio_s": statistics.mean(r["seconds"] for r in results),
+            "ring_drop": dropped / (frames + dropped), "device_drop": device.skipped / blocks if blocks else 0,
+            "stop_p50": statistics.median(stop_latency), "stop_max": max(stop_latency)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dropped frames across concurrent capture sessions.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--seconds", type=float, default=10.0, help="audio seconds per session")
+    parser.add_argument("--speed", type=float, default=1.0, help="device clock vs real time")
+    args = parser.parse_args(argv)
+
+    out = tempfile.mkdtemp(prefix="voice_capture_")
+    print(f"{args.seconds:g}s of audio per session at {SAMPLE_RATE} Hz, device at {args.speed:g}x real time")
+    print(f"{'sessions':>8}{'audio/session':>15}{'ring dropped':>14}{'device dropped':>16}{'stop p50':>11}{'stop max':>11}")
+    for n in args.sessions:
+        r = run(n, args.seconds, args.speed, out)
+        print(f"{r['sessions']:>8}{r['audio_s']:>14.2f}s{r['ring_drop']:>14.3%}{r['device_drop']:>16.3%}"
+              f"{r['stop_p50'] * 1000:>8.1f} ms{r['stop_max'] * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Real-time headroom of voice_features.FeatureEngine at the recorder's rate.
+# Feeds synthetic speech in the block sizes the capture drain thread sees and
+# reports the real-time factor (audio seconds processed per CPU second) and
+# how long finalize() takes once recording stops.
+# Run from UpdatedTests/Python:  python -m benchmarks.bench_voice_features [seconds]
+import sys
+import time
+
+import numpy as np
+
+from voice_features import FeatureEngine
+
+SAMPLE_RATE = 16000  # same as VoiceCog_TEST.py
+POLL = 0.02          # CaptureManager drain interval (voice_capture.py)
+
+
+def synthetic_speech(seconds, samplerate=SAMPLE_RATE, seed=0):
+    # Voiced "phrases" of gliding harmonics with syllable-rate amplitude
+    # modulation, separated by pauses, over low background noise.
+    rnd = np.random.default_rng(seed)
+    n = int(seconds * samplerate)
+    t = np.arange(n) / samplerate
+    f0 = 120 + 25 * np.sin(2 * np.pi * 0.3 * t) + 10 * np.sin(2 * np.pi * 1.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / samplerate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * t) ** 2
+    gate = np.zeros(n)
+    pos = 0
+    while pos < n:
+        phrase = int(rnd.uniform(1.5, 4.0) * samplerate)
+        gate[pos:pos + phrase] = 1.0
+        pos += phrase + int(rnd.uniform(0.3, 1.2) * samplerate)
+    signal = 0.25 * voice * syllables * gate + 0.003 * rnd.standard_normal(n)
+    return np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+
+
+def main(seconds=120.0):
+    audio = synthetic_speech(seconds)
+    block = int(POLL * SAMPLE_RATE)
+    print(f"{seconds:.0f}s of audio at {SAMPLE_RATE} Hz, {block}-sample chunks")
+
+    engine = FeatureEngine(SAMPLE_RATE)
+    start = time.perf_counter()
+    worst = 0.0
+    for i in range(0, len(audio), block):
+        t0 = time.perf_counter()
+        engine.feed(audio[i:i + block])
+        worst = max(worst, time.perf_counter() - t0)
+    feed = time.perf_counter() - start
+
+    t0 = time.perf_counter()
+    result = engine.finalize()
+    final = time.perf_counter() - t0
+
+    print(f"feed      {feed * 1000:8.1f} ms total   real-time factor {seconds / feed:8.0f}x")
+    print(f"worst chunk {worst * 1000:6.2f} ms   (budget {POLL * 1000:.0f} ms per drain)")
+    print(f"finalize  {final * 1000:8.1f} ms")
+    print(f"metrics   {result['metrics']}")
+    print(f"features  {result['features']}")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 120.0)
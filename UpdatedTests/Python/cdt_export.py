@@ -0,0 +1,195 @@
+# Clock drawing export, off the Tk main thread.
+#
+# The UI hands over a snapshot of the drawing; one background worker composes
+# it, encodes it and writes it under a unique per-patient name via a temp file
+# and an atomic rename, then reports back through a callback (called on the
+# worker thread: Tk code should queue it for the main loop).
+#
+# Drawings are a white page, a few pen colours and the antialiased header, so
+# they nearly always fit a 256-colour palette. encode_png() then writes an
+# exact (lossless) palette PNG, about half the size of an RGB one, and falls back
+# to an optimized RGB(A) PNG otherwise.
+#
+# Shrink drawings saved before this existed (only rewritten when smaller, and
+# only after checking the pixels are identical):
+#   python cdt_export.py <folder or .png> [...] [--workers N] [--dry-run]
+import argparse
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+# ---------- Encoding ----------
+def encode_png(img, **params):
+    """Smallest lossless PNG we can make quickly: exact palette if <= 256 colours."""
+    buf = io.BytesIO()
+    (to_palette(img) or img).save(buf, "PNG", optimize=True, **params)
+    return buf.getvalue()
+
+
+def to_palette(img):
+    """The same pixels as a "P" image, or None if there are more than 256 colours."""
+    if img.mode == "P":
+        return img
+    if img.mode not in ("RGB", "RGBA"):
+        return None
+    px = np.asarray(img)
+    channels = px.shape[2]
+    key = px[..., 0].astype(np.uint32) << 16 | px[..., 1].astype(np.uint32) << 8 | px[..., 2]
+    if channels == 4:
+        key = key.astype(np.uint64) << 8 | px[..., 3]
+    colors, index = np.unique(key.ravel(), return_inverse=True)
+    if len(colors) > 256:
+        return None
+    out = Image.fromarray(index.reshape(key.shape).astype(np.uint8), "P")
+    rgb = colors >> 8 if channels == 4 else colors
+    palette = np.stack([(rgb >> 16) & 255, (rgb >> 8) & 255, rgb & 255], axis=1).astype(np.uint8)
+    out.putpalette(palette.tobytes())
+    if channels == 4:
+        alpha = (colors & 255).astype(np.uint8)
+        if (alpha < 255).any():
+            out.info["transparency"] = alpha.tobytes()
+    return out
+
+
+def same_pixels(a, b):
+    mode = "RGBA" if "A" in a.getbands() or "transparency" in a.info else "RGB"
+    return a.size == b.size and np.array_equal(np.asarray(a.convert(mode)), np.asarray(b.convert(mode)))
+
+
+def atomic_write(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# ---------- Background export ----------
+class ExportResult:
+    __slots__ = ("path", "bytes", "seconds", "error")
+
+    def __init__(self, path, nbytes=0, seconds=0.0, error=None):
+        self.path = path
+        self.bytes = nbytes
+        self.seconds = seconds
+        self.error = error
+
+
+class Exporter:
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        # One worker: exports finish in order and never compete with each other
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cdt-export")
+
+    def unique_path(self, patient_id, ext="png"):
+        who = _UNSAFE.sub("_", str(patient_id or "anonymous")).strip("_")[:64] or "anonymous"
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.out_dir, f"cdt_{who}_{stamp}_{uuid.uuid4().hex[:8]}.{ext}")
+
+    def export(self, snapshot, patient_id=None, compose=None, sidecars=(), callback=None):
+        """Queue a snapshot (an image the caller won't modify again); returns a Future.
+
+        compose(snapshot) -> final image runs on the worker; sidecars are
+        (suffix, bytes) written next to the PNG, e.g. (".strokes.json", ...).
+        """
+        path = self.unique_path(patient_id)
+        fut = self._pool.submit(self._write, snapshot, path, compose, sidecars)
+        if callback is not None:
+            fut.add_done_callback(lambda f: callback(f.result()))
+        return fut
+
+    def _write(self, snapshot, path, compose, sidecars):
+        t0 = time.perf_counter()
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            img = compose(snapshot) if compose is not None else snapshot
+            data = encode_png(img)
+            base = os.path.splitext(path)[0]
+            for suffix, payload in sidecars:
+                atomic_write(base + suffix, payload)
+            atomic_write(path, data)  # last, so a PNG on disk always has its sidecars
+            return ExportResult(path, len(data), time.perf_counter() - t0)
+        except Exception as e:
+            return ExportResult(path, seconds=time.perf_counter() - t0, error=e)
+
+    def close(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+# ---------- Bulk re-encode ----------
+def reencode(path, dry_run=False):
+    """(path, bytes before, bytes after, status) for one existing PNG."""
+    before = os.path.getsize(path)
+    try:
+        with Image.open(path) as src:
+            src.load()
+            # Keep the DPI the original declared
+            data = encode_png(src, **{k: v for k, v in src.info.items() if k == "dpi"})
+            with Image.open(io.BytesIO(data)) as check:
+                if not same_pixels(src, check):
+                    return path, before, before, "skipped: not lossless"
+    except (OSError, ValueError) as e:
+        return path, before, before, f"error: {e}"
+    if len(data) >= before:
+        return path, before, before, "kept"
+    if not dry_run:
+        stat = os.stat(path)
+        atomic_write(path, data)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return path, before, len(data), "shrunk"
+
+
+def find_pngs(paths):
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, _dirs, files in os.walk(p):
+                yield from (os.path.join(dirpath, f) for f in sorted(files) if f.lower().endswith(".png"))
+        elif p.lower().endswith(".png"):
+            yield p
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Losslessly shrink saved clock drawing PNGs in place.")
+    parser.add_argument("paths", nargs="+", help="PNG files or folders (searched recursively)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    args = parser.parse_args(argv)
+
+    files = list(find_pngs(args.paths))
+    start = time.perf_counter()
+    before = after = shrunk = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, b, a, status in pool.map(reencode, files, [args.dry_run] * len(files), chunksize=8):
+            before += b
+            after += a
+            shrunk += status == "shrunk"
+            if not status.startswith(("shrunk", "kept")):
+                failed += 1
+                print(f"{path}: {status}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    saved = 1 - after / before if before else 0
+    verb = "would shrink" if args.dry_run else "shrunk"
+    print(f"{len(files)} PNGs in {elapsed:.1f}s ({len(files) / elapsed if elapsed else 0:.0f}/s): {verb} {shrunk}, "
+          f"{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB ({saved:.0%} smaller), {failed} skipped")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
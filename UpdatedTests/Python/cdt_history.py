@@ -0,0 +1,141 @@
+# Stroke-log undo/redo for the Clock Drawing canvas.
+#
+# Instead of copying the whole 900x600 bitmap on every pen-down, each stroke is
+# stored as (tool, colour, width, points) with the points in a flat int16
+# array. Undo/redo replays strokes on top of the nearest raster checkpoint, so
+# history is effectively unlimited while memory stays under a byte budget.
+import json
+from array import array
+from PIL import Image, ImageDraw
+
+BACKGROUND = "#ffffff"
+
+
+class Stroke:
+    __slots__ = ("tool", "color", "width", "points")
+
+    def __init__(self, tool, color, width, x=None, y=None):
+        self.tool = tool        # "pen", "eraser" or "clear"
+        self.color = color
+        self.width = width
+        self.points = array("h")  # x0, y0, x1, y1, ...
+        if x is not None:
+            self.points.extend((x, y))
+
+    @property
+    def nbytes(self):
+        return self.points.itemsize * len(self.points) + 64
+
+    def paint(self, img, draw):
+        """Apply this stroke to img; returns the (possibly new) image."""
+        if self.tool == "clear":
+            return Image.new("RGB", img.size, BACKGROUND)
+        fill = self.color if self.tool == "pen" else BACKGROUND
+        p = self.points
+        # Segment by segment, exactly as on_move drew it live
+        for i in range(2, len(p), 2):
+            draw.line((p[i - 2], p[i - 1], p[i], p[i + 1]), fill=fill, width=self.width, joint="curve")
+        return img
+
+    def to_dict(self):
+        return {"tool": self.tool, "color": self.color, "width": self.width,
+                "points": self.points.tolist()}
+
+
+class StrokeHistory:
+    def __init__(self, base, checkpoint_every=16, max_bytes=16 * 1024 * 1024):
+        self.checkpoint_every = checkpoint_every
+        self.max_bytes = max_bytes
+        self.strokes = []          # full log, including undone strokes available for redo
+        self.pos = 0               # strokes[:pos] are currently applied
+        self.checkpoints = {0: base.copy()}  # stroke count -> raster after that many strokes
+        self.current = None
+
+    # ---------- Recording ----------
+    def begin(self, tool, color, width, x, y):
+        self._truncate()
+        self.current = Stroke(tool, color, width, x, y)
+        self.strokes.append(self.current)
+        self.pos += 1
+
+    def add_point(self, x, y):
+        if self.current is not None:
+            self.current.points.extend((x, y))
+
+    def end(self, img):
+        """Finish the open stroke; img is the live canvas after it."""
+        self.current = None
+        self._maybe_checkpoint(img)
+
+    def clear(self, img):
+        self._truncate()
+        self.strokes.append(Stroke("clear", None, 0))
+        self.pos += 1
+        self._maybe_checkpoint(img)
+
+    def _truncate(self):
+        # A new action after undo discards the redo tail
+        if self.pos < len(self.strokes):
+            del self.strokes[self.pos:]
+            for k in [k for k in self.checkpoints if k > self.pos]:
+                del self.checkpoints[k]
+
+    def _maybe_checkpoint(self, img):
+        if self.pos % self.checkpoint_every == 0:
+            self.checkpoints[self.pos] = img.copy()
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        # Thin out checkpoints (never the base) until we're under budget; replay
+        # cost grows but stays bounded by the gap between the survivors
+        while self.nbytes > self.max_bytes:
+            keys = sorted(self.checkpoints)[1:]
+            if not keys:
+                break
+            for k in keys[::2]:
+                del self.checkpoints[k]
+
+    # ---------- Undo / redo ----------
+    def can_undo(self):
+        return self.pos > 0
+
+    def can_redo(self):
+        return self.pos < len(self.strokes)
+
+    def undo(self):
+        if not self.can_undo():
+            return None
+        self.pos -= 1
+        return self.render(self.pos)
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        self.pos += 1
+        return self.render(self.pos)
+
+    def render(self, n):
+        """Raster after the first n strokes: nearest checkpoint, then replay."""
+        start = max(k for k in self.checkpoints if k <= n)
+        img = self.checkpoints[start].copy()
+        draw = ImageDraw.Draw(img)
+        for stroke in self.strokes[start:n]:
+            out = stroke.paint(img, draw)
+            if out is not img:
+                img, draw = out, ImageDraw.Draw(out)
+        return img
+
+    # ---------- Accounting / export ----------
+    @property
+    def nbytes(self):
+        raster = sum(len(im.getbands()) * im.width * im.height for im in self.checkpoints.values())
+        return raster + sum(s.nbytes for s in self.strokes)
+
+    def to_dict(self):
+        base = self.checkpoints[0]
+        return {"width": base.width, "height": base.height,
+                "strokes": [s.to_dict() for s in self.strokes[:self.pos]]}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
@@ -0,0 +1,270 @@
+# Automatic Clock Drawing Test scorer.
+#
+# Scores a clock drawing (the PNG written by ClockDrawingApp.submit() or a
+# cdt.html data URL) into the same fields cdt.html stores in cdt_data:
+#   scores.contour (0-3), scores.numbers (0-11), scores.hands (0-6), scores.total (0-20)
+# Everything after loading the image is NumPy array work, no per-pixel Python.
+#
+# Batch use:  python cdt_score.py DRAWINGS_DIR --out scores.jsonl [--workers N]
+import argparse
+import base64
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+SCORER_VERSION = 1
+MAX_SCORES = {"contour": 3, "numbers": 11, "hands": 6}
+HEADER_HEIGHT = 80             # header band ClockDrawingApp.submit() adds on top
+SUBMIT_SIZE = (900, 680)       # CANVAS_W x (CANVAS_H + HEADER_HEIGHT)
+WATERMARK_ROWS = 45            # intro text drawn at the top of the desktop canvas
+WORK_SIZE = 300                # analyse at roughly this many pixels on the long side
+
+# Clock-face angles in degrees, 0 = 12 o'clock, clockwise
+HOUR_TARGET = 335.0            # hour hand at 11:10 sits a sixth past 11
+MINUTE_TARGET = 60.0           # minute hand on the 2
+HAND_TOLERANCE = 20.0
+
+
+# ---------- Loading ----------
+def load_image(source):
+    """PIL image from a path, raw bytes or a data:image/... URL, flattened onto white."""
+    if isinstance(source, str) and source.startswith("data:image"):
+        source = base64.b64decode(source.split(",", 1)[1])
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    img = Image.open(source)
+    if img.mode in ("RGBA", "LA", "P"):
+        # cdt.html canvases are transparent where nothing was drawn
+        img = img.convert("RGBA")
+        bg = Image.new("RGBA", img.size, "white")
+        img = Image.alpha_composite(bg, img)
+    img = img.convert("RGB")
+    if img.size == SUBMIT_SIZE:
+        img = img.crop((0, HEADER_HEIGHT, SUBMIT_SIZE[0], SUBMIT_SIZE[1]))
+    return img
+
+
+def ink_mask(img):
+    factor = max(1, max(img.size) // WORK_SIZE)
+    small = img.reduce(factor) if factor > 1 else img
+    rgb = np.asarray(small, dtype=np.int32)
+    luma = (rgb[..., 0] * 299 + rgb[..., 1] * 587 + rgb[..., 2] * 114) // 1000
+    ink = luma < 200
+    # Drop the blue "Draw a clock..." watermark at the top of the desktop canvas
+    blue = (rgb[..., 2] - rgb[..., 0]) > 80
+    blue[WATERMARK_ROWS // factor:, :] = False
+    return ink & ~blue
+
+
+# ---------- Geometry ----------
+def clock_angles(dx, dy):
+    return np.degrees(np.arctan2(dx, -dy)) % 360.0
+
+
+def fit_circle(xs, ys):
+    """Least-squares (Kasa) circle through points; returns cx, cy, r."""
+    a = np.column_stack((xs, ys, np.ones_like(xs)))
+    b = xs * xs + ys * ys
+    (c0, c1, c2), *_ = np.linalg.lstsq(a, b, rcond=None)
+    cx, cy = c0 / 2, c1 / 2
+    return cx, cy, float(np.sqrt(max(c2 + cx * cx + cy * cy, 0.0)))
+
+
+def outer_envelope(xs, ys, cx, cy, bins=72):
+    # Farthest ink pixel in each angular bin approximates the contour
+    dx, dy = xs - cx, ys - cy
+    r = np.hypot(dx, dy)
+    b = (clock_angles(dx, dy) * bins / 360.0).astype(np.int64) % bins
+    order = np.lexsort((r, b))
+    last = np.r_[b[order][1:] != b[order][:-1], True]
+    pick = order[last]
+    return xs[pick], ys[pick]
+
+
+def angular_diff(a, b):
+    return np.abs((np.asarray(a) - b + 180.0) % 360.0 - 180.0)
+
+
+# ---------- Scoring ----------
+def score_image(img):
+    ink = ink_mask(img)
+    ys, xs = np.nonzero(ink)
+    h, w = ink.shape
+    if len(xs) < 30:
+        return _result(0, 0, 0, ["No drawing detected."], {})
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+
+    # 1. Contour: circle through the outer envelope, refined once
+    cx, cy = xs.mean(), ys.mean()
+    for _ in range(2):
+        ex, ey = outer_envelope(xs, ys, cx, cy)
+        cx, cy, radius = fit_circle(ex, ey)
+    dx, dy = xs - cx, ys - cy
+    r = np.hypot(dx, dy)
+    ang = clock_angles(dx, dy)
+
+    on_circle = np.abs(r - radius) < 0.08 * radius
+    coverage = np.unique((ang[on_circle] // 5).astype(np.int64)).size / 72.0
+    env_r = np.hypot(ex - cx, ey - cy)
+    roundness = float(np.std(env_r) / radius) if radius else 1.0
+    size_ok = 0.15 * min(w, h) < radius < 0.75 * min(w, h)
+    contour = int(coverage >= 0.85) + int(roundness < 0.08) + int(size_ok)
+
+    notes = []
+    if contour == 3:
+        notes.append("Contour is well-formed.")
+    elif coverage < 0.85:
+        notes.append("Contour is not closed.")
+    else:
+        notes.append("Contour is irregular.")
+
+    # 2. Numbers: ink in the ring just inside the contour, counted per hour sector
+    ring = (r > 0.55 * radius) & (r < 0.9 * radius)
+    sector = (((ang[ring] + 15.0) % 360.0) // 30.0).astype(np.int64)
+    counts = np.bincount(sector, minlength=12)
+    threshold = max(3, 0.15 * np.median(counts[counts > 0])) if counts.any() else 3
+    occupied = int(np.count_nonzero(counts >= threshold))
+    numbers = int(round(MAX_SCORES["numbers"] * occupied / 12))
+    if occupied < 12:
+        notes.append(f"Numbers found in {occupied} of 12 hour positions.")
+
+    # 3. Hands: radial ink inside the numbers, as a length-weighted angle histogram
+    inner = (r > 0.08 * radius) & (r < 0.55 * radius)
+    hist = np.bincount((ang[inner] // 5).astype(np.int64) % 72,
+                       weights=r[inner] / radius, minlength=72)
+    hist = hist + np.roll(hist, 1) + np.roll(hist, -1)  # smooth across bin edges
+    hands = 0
+    found = []
+    for _ in range(2):
+        peak = int(np.argmax(hist))
+        if hist[peak] < 1.0:
+            break
+        angle = peak * 5 + 2.5
+        in_bin = inner & (angular_diff(ang, angle) < 7.5)
+        found.append((angle, float(np.percentile(r[in_bin], 95) / radius) if in_bin.any() else 0.0))
+        hist[angular_diff(np.arange(72) * 5 + 2.5, angle) < 25] = 0
+    hands += min(len(found), 2)
+    hour = [f for f in found if angular_diff(f[0], HOUR_TARGET) < HAND_TOLERANCE]
+    minute = [f for f in found if angular_diff(f[0], MINUTE_TARGET) < HAND_TOLERANCE]
+    hands += int(bool(hour)) + int(bool(minute))
+    hub = np.count_nonzero(r < 0.1 * radius) > 0
+    hands += int(hub and len(found) == 2)
+    if hour and minute and minute[0][1] > hour[0][1]:
+        hands += 1
+    if hands < MAX_SCORES["hands"]:
+        notes.append("Hand placement is off-target for 11:10.")
+
+    features = {
+        "center": [round(float(cx) / w, 3), round(float(cy) / h, 3)],
+        "radius": round(radius / min(w, h), 3),
+        "coverage": round(coverage, 3),
+        "roundness": round(roundness, 3),
+        "sectors": counts.tolist(),
+        "hand_angles": [round(a, 1) for a, _ in found],
+    }
+    return _result(contour, numbers, hands, notes, features)
+
+
+def _result(contour, numbers, hands, notes, features):
+    return {
+        "scores": {"contour": contour, "numbers": numbers, "hands": hands,
+                   "total": contour + numbers + hands},
+        "analysis": " ".join(notes),
+        "features": features,
+        "scorer_version": SCORER_VERSION,
+    }
+
+
+def score(source):
+    """Score a path, PNG bytes or data URL."""
+    return score_image(load_image(source))
+
+
+# ---------- Batch CLI ----------
+class ResultCache:
+    """Scores keyed by path, size and mtime, so reruns skip unchanged drawings."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+
+    @staticmethod
+    def key(path):
+        st = os.stat(path)
+        return f"{SCORER_VERSION}:{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+    def get_many(self, keys):
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.db.execute(
+                f"SELECT key, result FROM scores WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            found.update((k, json.loads(v)) for k, v in rows)
+        return found
+
+    def put_many(self, items):
+        self.db.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?)",
+                            [(k, json.dumps(v)) for k, v in items])
+        self.db.commit()
+
+
+def _score_path(path):
+    try:
+        return score(path)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def find_drawings(root):
+    for dirpath, _dirs, files in os.walk(root):
+        for name in sorted(files):
+            if name.lower().endswith(".png"):
+                yield os.path.join(dirpath, name)
+
+
+def score_directory(root, out, workers=None, cache_path=None, chunksize=16):
+    paths = list(find_drawings(root))
+    cache = ResultCache(cache_path or os.path.join(root, ".cdt_score_cache.sqlite3"))
+    keys = [ResultCache.key(p) for p in paths]
+    cached = cache.get_many(keys)
+    todo = [(p, k) for p, k in zip(paths, keys) if k not in cached]
+
+    start = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(workers) as pool:
+            fresh = list(pool.map(_score_path, [p for p, _ in todo], chunksize=chunksize))
+        cache.put_many((k, res) for (_, k), res in zip(todo, fresh) if "error" not in res)
+        cached.update((k, res) for (_, k), res in zip(todo, fresh))
+    elapsed = time.perf_counter() - start
+
+    with open(out, "w", encoding="utf-8") as f:
+        for path, key in zip(paths, keys):
+            f.write(json.dumps({"path": path, **cached[key]}) + "\n")
+    return len(paths), len(todo), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a directory of clock drawings.")
+    parser.add_argument("root", help="directory searched recursively for *.png drawings")
+    parser.add_argument("--out", default="cdt_scores.jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="result cache (default: <root>/.cdt_score_cache.sqlite3)")
+    args = parser.parse_args(argv)
+
+    total, scored, elapsed = score_directory(args.root, args.out, args.workers, args.cache)
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"{total} drawings, {scored} scored ({total - scored} cached) in {elapsed:.2f}s"
+          f" = {rate:.1f} images/s -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+# Per-session FAQ progress, as an append-only journal.
+#
+# Each session (patient / session id) has its own files under the root:
+#   <id>.log   one JSON line per change: {"i": question, "a": answer} or {"idx": step}
+#   <id>.snap  the full state as of the last compaction
+# A change is one small O_APPEND write. fsync is batched: a background thread
+# syncs every journal written to in the last interval, and sync() forces it
+# for one session. The same thread compacts: once a journal has compact_every
+# lines it is renamed aside, the state is written to the snapshot and the old
+# journal deleted, so resuming reads one snapshot plus a short journal. The
+# write path never waits on an fsync, and sessions never share a file or lock.
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class _Session:
+    __slots__ = ("lock", "fd", "state", "changes", "dirty")
+
+    def __init__(self, fd, state, changes):
+        self.lock = threading.Lock()
+        self.fd = fd
+        self.state = state
+        self.changes = changes  # journal lines since the last snapshot
+        self.dirty = False
+
+
+class ProgressJournal:
+    def __init__(self, root, questions, flush_interval=0.05, compact_every=64, max_open=512):
+        self.root = root
+        self.questions = questions
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.max_open = max_open
+        os.makedirs(root, exist_ok=True)
+        self._sessions = OrderedDict()   # open sessions, least recently used first
+        self._lock = threading.Lock()    # guards _sessions only
+        self._stop = threading.Event()
+        self._flusher = None
+
+    # ---------- Paths ----------
+    def _path(self, session_id, ext):
+        raw = str(session_id)
+        name = _UNSAFE.sub("_", raw)[:128]
+        if not name.strip("._"):
+            raise ValueError("invalid session id")
+        if name != raw:
+            # Keep ids that only differ in replaced characters apart
+            name += "-" + hashlib.sha1(raw.encode()).hexdigest()[:10]
+        return os.path.join(self.root, f"{name}.{ext}")
+
+    def _empty(self):
+        return {"idx": 0, "answers": [None] * self.questions}
+
+    # ---------- Reading ----------
+    def _read(self, session_id):
+        """(state, journal lines) from disk: snapshot, then the journal replayed over it."""
+        state, changes = self._empty(), 0
+        try:
+            with open(self._path(session_id, "snap"), encoding="utf-8") as f:
+                state.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        # A .log.old is a journal whose compaction was interrupted
+        for ext in ("log.old", "log"):
+            try:
+                with open(self._path(session_id, ext), encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            _apply(state, json.loads(line))
+                        except (ValueError, KeyError, IndexError, TypeError):
+                            break  # torn final line from a crash mid-write
+                        changes += 1
+            except FileNotFoundError:
+                pass
+        return state, changes
+
+    def load(self, session_id):
+        """Saved {"idx", "answers"} for a session, or None if it has never saved."""
+        with self._lock:
+            s = self._sessions.get(session_id)
+        if s is not None:
+            with s.lock:
+                return _copy(s.state)
+        if not (os.path.exists(self._path(session_id, "log"))
+                or os.path.exists(self._path(session_id, "snap"))):
+            return None
+        return self._read(session_id)[0]
+
+    # ---------- Writing ----------
+    def _open(self, session_id):
+        with self._lock:
+            s = self._sessions.get(session_id)
+            if s is not None:
+                self._sessions.move_to_end(session_id)
+                return s
+        state, changes = self._read(session_id)
+        fd = os.open(self._path(session_id, "log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        s = _Session(fd, state, changes)
+        with self._lock:
+            if session_id in self._sessions:  # another thread opened it meanwhile
+                os.close(fd)
+                return self._sessions[session_id]
+            self._sessions[session_id] = s
+            # Detached before the lock is released, so a reopen of the same id
+            # always reads a journal that no stale handle can still append to
+            detached = []
+            while len(self._sessions) > self.max_open:
+                old = self._sessions.popitem(last=False)[1]
+                with old.lock:
+                    detached.append((old.fd, old.dirty))
+                    old.fd = None
+        for fd, dirty in detached:
+            if dirty:
+                os.fsync(fd)
+            os.close(fd)
+        return s
+
+    def set_answer(self, session_id, question, answer):
+        self._append(session_id, {"i": question, "a": answer})
+
+    def set_index(self, session_id, idx):
+        self._append(session_id, {"idx": idx})
+
+    def _append(self, session_id, change):
+        line = (json.dumps(change, separators=(",", ":")) + "\n").encode()
+        while True:
+            s = self._open(session_id)
+            with s.lock:
+                if s.fd is None:
+                    continue  # evicted between _open and here; reopen
+                _apply(s.state, change)
+                os.write(s.fd, line)
+                s.dirty = True
+                s.changes += 1
+                return
+
+    def _compact(self, session_id, s):
+        # Every change is a "set", so replaying a journal over a snapshot that
+        # already contains it gives the same state; a crash at any point below
+        # loses nothing.
+        log, old = self._path(session_id, "log"), self._path(session_id, "log.old")
+        with s.lock:
+            if s.fd is None or s.changes < self.compact_every:
+                return
+            state = _copy(s.state)
+            if os.path.exists(old):
+                self._write_snapshot(session_id, state)  # leftover from a crash; fold it in first
+            os.fsync(s.fd)
+            os.replace(log, old)
+            os.close(s.fd)
+            s.fd = os.open(log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            s.changes = 0
+            s.dirty = False
+        self._write_snapshot(session_id, state)
+        os.remove(old)
+
+    def _write_snapshot(self, session_id, state):
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(session_id, "snap"))
+
+    # ---------- Durability ----------
+    def sync(self, session_id=None):
+        """fsync one session's journal now (or every open journal)."""
+        with self._lock:
+            targets = [self._sessions.get(session_id)] if session_id is not None \
+                else list(self._sessions.values())
+        for s in targets:
+            if s is None:
+                continue
+            with s.lock:
+                if s.fd is not None and s.dirty:
+                    s.dirty = False
+                    os.fsync(s.fd)
+
+    def start(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._run, name="faq-progress-fsync", daemon=True)
+            self._flusher.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.sync()
+            with self._lock:
+                due = [(sid, s) for sid, s in self._sessions.items() if s.changes >= self.compact_every]
+            for sid, s in due:
+                self._compact(sid, s)
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), OrderedDict()
+        for s in sessions:
+            with s.lock:
+                _close(s)
+
+
+def _apply(state, change):
+    if "idx" in change:
+        state["idx"] = int(change["idx"])
+    else:
+        state["answers"][int(change["i"])] = change["a"]
+
+
+def _copy(state):
+    return {"idx": state["idx"], "answers": list(state["answers"])}
+
+
+def _close(s):
+    if s.fd is not None:
+        if s.dirty:
+            os.fsync(s.fd)
+        os.close(s.fd)
+        s.fd = None
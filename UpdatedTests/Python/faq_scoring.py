@@ -0,0 +1,233 @@
+# Functional Activities Questionnaire scoring, for one patient or a cohort.
+#
+# OPTIONS / QUESTIONS / DOMAINS are compiled once into small integer lookup
+# arrays. Answers become an N x 10 matrix of option codes (0 = unanswered),
+# and every score - totals, the domain sub-scores report.html reads from
+# faqData.analysis.domainScores, and the pattern flags - comes out of a few
+# NumPy operations over that matrix. score() gives the same dict faq.html
+# stores as faq_data.
+#
+# Cohort use:  python faq_scoring.py answers.csv --out scores.csv [--chunk 100000]
+#   Input is CSV (id, then one answer key per question) or JSONL with
+#   "answers"/"rawAnswers" per line, including /api/results/export rows.
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+
+QUESTIONS = [
+    "Writing checks, paying bills, balancing checkbook",
+    "Assembling tax records, business affairs, or papers",
+    "Shopping alone for clothes, household necessities, or groceries",
+    "Playing a game of skill, working on a hobby",
+    "Heating water, making a cup of coffee, turning off stove after use",
+    "Preparing a balanced meal",
+    "Keeping track of current events",
+    "Paying attention to, understanding, discussing TV, book, magazine",
+    "Remembering appointments, family occasions, holidays, medications",
+    "Traveling out of neighborhood, driving, arranging to take buses",
+]
+
+OPTIONS = [
+    {"key": "dependent",        "label": "Dependent",                                          "score": 3},
+    {"key": "assist",           "label": "Requires assistance",                                "score": 2},
+    {"key": "diff-self",        "label": "Has difficulty but does by self",                    "score": 1},
+    {"key": "normal",           "label": "Normal (Has no difficulty to do it by self)",        "score": 0},
+    {"key": "never-could-now",  "label": "Never did [the activity] but could do now",          "score": 0},
+    {"key": "never-diff",       "label": "Never did and would have difficulty now",            "score": 1},
+]
+
+# Same grouping as generateFAQAnalysis() in faq.html (question indices)
+DOMAINS = {
+    "financial": [0, 1],       # Bills, Tax
+    "logistical": [2, 9],      # Shopping, Travel
+    "executive": [3, 6],       # Games, Events
+    "domestic": [4, 5, 8],     # Coffee, Meal, Meds
+    "attention": [7],          # Media
+}
+
+MAX_SCORE = len(QUESTIONS) * 3
+# Resolved once per process; FAQ-TEST.py's radio group reads these on every rerun
+OPTION_LABELS = [o["label"] for o in OPTIONS]
+LABEL_TO_KEY = {o["label"]: o["key"] for o in OPTIONS}
+KEY_TO_LABEL = {o["key"]: o["label"] for o in OPTIONS}
+PATTERNS = {
+    "inconsistent": "Inconsistent response pattern detected.",
+    "financial": "Significant difficulty in complex financial tasks.",
+    "mobility": "Domestic skills preserved but community mobility impaired.",
+}
+
+
+class Scoring:
+    """OPTIONS / QUESTIONS / DOMAINS compiled to lookup arrays."""
+
+    def __init__(self, options=OPTIONS, questions=QUESTIONS, domains=DOMAINS):
+        self.options = options
+        self.questions = questions
+        self.domains = list(domains)
+        # Code 0 is "no answer": scores 0 and labels "—", like the UI
+        self.points = np.array([0] + [o["score"] for o in options], dtype=np.int16)
+        self.labels = ["—"] + [o["label"] for o in options]
+        keys = np.array([o["key"] for o in options])
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self._codes = (order + 1).astype(np.int8)
+        self._code_of = {o["key"]: i + 1 for i, o in enumerate(options)}
+        self.membership = np.zeros((len(questions), len(self.domains)), dtype=np.int16)
+        for d, name in enumerate(self.domains):
+            self.membership[domains[name], d] = 1
+        self.domain_max = self.membership.sum(axis=0) * int(self.points.max())
+        self.max_score = len(questions) * int(self.points.max())
+
+    def encode(self, rows):
+        """N x len(questions) int8 option codes from answer keys (None/"" -> 0)."""
+        if len(rows) == 0:
+            return np.zeros((0, len(self.questions)), dtype=np.int8)
+        # None becomes "None", which matches no key, so it scores as unanswered
+        keys = np.asarray(rows, dtype=str)
+        if keys.ndim != 2 or keys.shape[1] != len(self.questions):
+            raise ValueError(f"expected {len(self.questions)} answers per row")
+        pos = np.searchsorted(self._keys, keys).clip(0, len(self._keys) - 1)
+        return np.where(self._keys[pos] == keys, self._codes[pos], 0).astype(np.int8)
+
+    def encode_one(self, answers):
+        return np.array([[self._code_of.get(k, 0) for k in answers]], dtype=np.int8)
+
+    def score_codes(self, codes):
+        """Everything faq.html computes, as arrays over an N x 10 code matrix."""
+        per_question = self.points[codes]
+        total = per_question.sum(axis=1)
+        domain = per_question @ self.membership
+        # Math.round((score / max) * 100), i.e. halves round up
+        pct = np.floor(domain / self.domain_max * 100 + 0.5).astype(np.int16)
+        alternating = (np.abs(np.diff(per_question, axis=1)) >= 2).sum(axis=1)
+        col = {name: i for i, name in enumerate(self.domains)}
+        flags = {
+            "inconsistent": alternating > 3,
+            "financial": pct[:, col["financial"]] > 60,
+            "mobility": (pct[:, col["domestic"]] < 30) & (pct[:, col["logistical"]] > 60),
+        }
+        return {"per_question": per_question, "total": total, "domain": domain,
+                "pct": pct, "flags": flags}
+
+    def score(self, answers, timestamp=None):
+        """faq_data for one answer list, as finishTest() in faq.html builds it."""
+        codes = self.encode_one(answers)
+        s = self.score_codes(codes)
+        details = [{"q": q, "label": self.labels[c], "score": int(p)}
+                   for q, c, p in zip(self.questions, codes[0], s["per_question"][0])]
+        domain_scores = {name: {"score": int(s["domain"][0, d]), "max": int(self.domain_max[d]),
+                                "pct": int(s["pct"][0, d])}
+                         for d, name in enumerate(self.domains)}
+        result = {
+            "totalScore": int(s["total"][0]),
+            "maxScore": self.max_score,
+            "details": details,
+            "analysis": {
+                "domainScores": domain_scores,
+                "patterns": [PATTERNS[k] for k, v in s["flags"].items() if v[0]],
+            },
+            "rawAnswers": list(answers),
+        }
+        if timestamp:
+            result["timestamp"] = timestamp
+        return result
+
+
+DEFAULT = Scoring()
+score = DEFAULT.score
+
+
+# ---------- Cohort CLI ----------
+def _answers_from_json(obj, n):
+    """The answer list of one JSONL row; None for other instruments' export rows.
+
+    ValueError if the row is a questionnaire without n answers."""
+    if obj.get("instrument", "faq") != "faq":
+        return None
+    data = obj.get("data", obj)
+    if isinstance(data, str):
+        data = json.loads(data)
+    answers = data.get("answers") or data.get("rawAnswers") if isinstance(data, dict) else None
+    if not isinstance(answers, list) or len(answers) != n \
+            or not all(a is None or isinstance(a, str) for a in answers):
+        raise ValueError(f"expected a list of {n} answer keys")
+    return answers
+
+
+def read_chunks(path, chunk, n=len(QUESTIONS)):
+    """(ids, answer rows) per chunk from CSV or JSONL, without loading the whole file.
+
+    Rows that aren't a questionnaire of n answers are reported on stderr and
+    skipped; rows of other instruments (in an export) are skipped silently."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            lines = enumerate(f, 1)
+            while batch := list(itertools.islice(lines, chunk)):
+                ids, rows = [], []
+                for line_no, line in batch:
+                    if not line.strip():
+                        continue
+                    try:
+                        obj = json.loads(line)
+                        answers = _answers_from_json(obj, n)
+                    except (ValueError, AttributeError) as e:
+                        print(f"{path}:{line_no}: skipped, {e}", file=sys.stderr)
+                        continue
+                    if answers is not None:
+                        ids.append(obj.get("id", obj.get("session_id", line_no)))
+                        rows.append(answers)
+                yield ids, rows
+        else:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            records = enumerate(reader, 2)
+            while batch := list(itertools.islice(records, chunk)):
+                ids, rows = [], []
+                for row_no, r in batch:
+                    if len(r) != n + 1:
+                        print(f"{path}:{row_no}: skipped, expected an id and {n} answers",
+                              file=sys.stderr)
+                        continue
+                    ids.append(r[0])
+                    rows.append(r[1:])
+                yield ids, rows
+
+
+def score_file(path, out, chunk=100000, scoring=DEFAULT):
+    columns = ["id", "total"] + [f"{d}_score" for d in scoring.domains] \
+        + [f"{d}_pct" for d in scoring.domains] + list(PATTERNS)
+    count = 0
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for ids, rows in read_chunks(path, chunk):
+            s = scoring.score_codes(scoring.encode(rows))
+            flags = np.column_stack([s["flags"][k] for k in PATTERNS]).astype(np.int8)
+            table = np.column_stack((s["total"], s["domain"], s["pct"], flags))
+            writer.writerows([i, *r] for i, r in zip(ids, table.tolist()))
+            count += len(ids)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a cohort of FAQ questionnaires.")
+    parser.add_argument("input", help="CSV (id, q1..q10 answer keys) or JSONL with answers/rawAnswers")
+    parser.add_argument("--out", default="faq_scores.csv")
+    parser.add_argument("--chunk", type=int, default=100000, help="rows scored per pass")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = score_file(args.input, args.out, args.chunk)
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"{count} questionnaires in {elapsed:.2f}s = {rate:,.0f}/min -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
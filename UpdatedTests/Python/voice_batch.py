@@ -0,0 +1,203 @@
+# Batch speech metrics for the recordings/ archive written by VoiceCog_TEST.py.
+#
+# Each WAV's PCM payload is mapped with np.memmap and fed to FeatureEngine in
+# blocks, so only a few seconds of audio are resident per worker. Results are
+# cached by path/size/mtime, and by content hash for files that were copied or
+# touched, so nightly reruns only analyse new recordings. Output is one row
+# per recording and one column per metric (.parquet with pyarrow, else .csv).
+#
+# Batch use:  python voice_batch.py recordings --out voice_metrics.parquet [--workers N]
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from voice_features import FeatureEngine
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+BLOCK_SECONDS = 10
+COLUMNS = ("path", "sha256", "seconds", "clarity", "fluency", "prosody", "total",
+           "speech_seconds", "speech_ratio", "segments", "pause_count", "pauses_per_minute",
+           "mean_pause", "max_pause", "syllable_rate", "pitch_median_hz",
+           "pitch_sd_semitones", "pitch_range_semitones", "snr_db", "error")
+
+
+# ---------- WAV access ----------
+def wav_memmap(path):
+    """(samplerate, int16 memmap of channel 0) without reading the payload."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b"RIFF" or head[8:] != b"WAVE":
+            raise ValueError("not a WAV file")
+        fmt = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError("no data chunk")
+            cid, clen = struct.unpack("<4sI", head)
+            if cid == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(clen - 16 + (clen & 1), 1)
+            elif cid == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(clen + (clen & 1), 1)
+    if fmt is None:
+        raise ValueError("no fmt chunk")
+    tag, channels, samplerate, _, _, bits = fmt
+    if tag != 1 or bits != 16:
+        raise ValueError("only 16-bit PCM is supported")
+    # A recording that was cut off before StreamingWavWriter.close() patched the
+    # header still has its audio; trust the file size over a zero/oversized length.
+    if clen == 0 or offset + clen > size:
+        clen = size - offset
+    frames = clen // (2 * channels)
+    if frames == 0:
+        return samplerate, np.zeros(0, dtype="<i2")
+    data = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(frames, channels))
+    return samplerate, data[:, 0]
+
+
+def file_hash(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def analyse(path):
+    samplerate, samples = wav_memmap(path)
+    engine = FeatureEngine(samplerate)
+    step = BLOCK_SECONDS * samplerate
+    for i in range(0, len(samples), step):
+        engine.feed(samples[i:i + step])
+    result = engine.finalize()
+    return {"seconds": round(engine.samples / samplerate, 2), **result["metrics"], **result["features"]}
+
+
+def _analyse_path(path):
+    try:
+        return analyse(path)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# ---------- Cache ----------
+class ResultCache:
+    """Rows keyed by path/size/mtime, with a content-hash index for moved or touched files."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER,"
+                        " mtime_ns INTEGER, sha256 TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (sha256 TEXT PRIMARY KEY, row TEXT NOT NULL)")
+
+    def unchanged(self):
+        return {p: (size, mtime, sha) for p, size, mtime, sha in
+                self.db.execute("SELECT path, size, mtime_ns, sha256 FROM files")}
+
+    def rows(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            found.update((h, json.loads(r)) for h, r in self.db.execute(
+                f"SELECT sha256, row FROM results WHERE sha256 IN ({','.join('?' * len(chunk))})", chunk))
+        return found
+
+    def put(self, files, results):
+        self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", files)
+        self.db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?)",
+                            [(h, json.dumps(r)) for h, r in results])
+        self.db.commit()
+
+
+# ---------- Batch CLI ----------
+def find_recordings(root):
+    for dirpath, _dirs, files in os.walk(root):
+        for name in sorted(files):
+            if name.lower().endswith(".wav"):
+                yield os.path.join(dirpath, name)
+
+
+def write_table(rows, out):
+    columns = {c: [r.get(c) for r in rows] for c in COLUMNS}
+    if out.endswith(".parquet"):
+        if pq is None:
+            raise SystemExit("pyarrow is required for .parquet output (or use --out *.csv)")
+        pq.write_table(pa.table(columns), out)
+        return
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(COLUMNS)
+        w.writerows(zip(*columns.values()))
+
+
+def analyse_directory(root, out, workers=None, cache_path=None):
+    paths = list(find_recordings(root))
+    cache = ResultCache(cache_path or os.path.join(root, ".voice_batch_cache.sqlite3"))
+    known = cache.unchanged()
+
+    start = time.perf_counter()
+    hashes, files = {}, []
+    for p in paths:
+        st = os.stat(p)
+        entry = known.get(p)
+        if entry and entry[:2] == (st.st_size, st.st_mtime_ns):
+            hashes[p] = entry[2]
+        else:
+            hashes[p] = file_hash(p)
+            files.append((p, st.st_size, st.st_mtime_ns, hashes[p]))
+    results = cache.rows(set(hashes.values()))
+    todo = list({h: p for p, h in hashes.items() if h not in results}.items())
+
+    if todo:
+        # Longest files first so one big recording doesn't end up last on a single worker
+        todo.sort(key=lambda hp: os.path.getsize(hp[1]), reverse=True)
+        with ProcessPoolExecutor(workers) as pool:
+            fresh = list(pool.map(_analyse_path, [p for _, p in todo]))
+        results.update((h, r) for (h, _), r in zip(todo, fresh))
+        cache.put(files, [(h, r) for (h, _), r in zip(todo, fresh) if "error" not in r])
+    elif files:
+        cache.put(files, [])
+    elapsed = time.perf_counter() - start
+
+    rows = [{"path": p, "sha256": hashes[p], **results[hashes[p]]} for p in paths]
+    write_table(rows, out)
+    audio = sum(results[h].get("seconds", 0) for h, _ in todo)
+    return len(paths), len(todo), audio, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Speech metrics for a directory of WAV recordings.")
+    parser.add_argument("root", help="directory searched recursively for *.wav recordings")
+    parser.add_argument("--out", default="voice_metrics.parquet" if pq else "voice_metrics.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="result cache (default: <root>/.voice_batch_cache.sqlite3)")
+    args = parser.parse_args(argv)
+
+    total, analysed, audio, elapsed = analyse_directory(args.root, args.out, args.workers, args.cache)
+    rate = (audio / 3600) / (elapsed / 60) if elapsed > 0 else 0.0
+    print(f"{total} recordings, {analysed} analysed ({total - analysed} cached), "
+          f"{audio / 3600:.2f} audio-hours in {elapsed:.1f}s = {rate:.2f} audio-hours/min -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
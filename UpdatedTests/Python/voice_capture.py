@@ -0,0 +1,234 @@
+# One capture manager per process for every recording session on a station.
+#
+# The manager owns the input stream: it is opened when the first session
+# starts and closed after the last one ends, so browser sessions never fight
+# over the device. The audio callback fans each block out to every active
+# session's Recorder ring buffer (single producer / single consumer, no locks);
+# the set of sessions is an immutable tuple swapped on attach/detach, so the
+# callback never waits. One drain thread moves audio from every ring to its
+# WAV file and sinks, finishes sessions that were stopped or reached
+# max_seconds, and publishes each result on the session object. Nothing here
+# touches Streamlit: the script picks results up with CaptureSession.poll()
+# during its own run.
+#
+# Backends open the stream: SoundDeviceBackend for a real microphone,
+# FakeDevice for tests and benchmarks (see benchmarks/bench_voice_capture.py).
+import os
+import threading
+import time
+
+import numpy as np
+
+from voice_recorder import Recorder
+
+
+class CaptureSession:
+    """One recording; its fields are written by the drain thread, read via poll()."""
+
+    def __init__(self, manager, recorder, finish):
+        self.manager = manager
+        self.recorder = recorder
+        self.finish = finish          # called on the drain thread once the WAV is closed
+        self.path = recorder.wav.path
+        self.started = time.time()
+        self._stop = threading.Event()
+        self.done = threading.Event()
+        self.stopped_by_timer = False
+        self.result = None
+        self.error = None
+
+    def stop(self):
+        self._stop.set()
+        self.manager._wake.set()
+
+    def poll(self):
+        """None while recording; afterwards a dict to copy into UI state."""
+        if not self.done.is_set():
+            return None
+        rec = self.recorder
+        return {"path": self.path if rec.wav.frames else None, "result": self.result,
+                "error": self.error, "stopped_by_timer": self.stopped_by_timer,
+                "seconds": rec.wav.seconds, "dropped": rec.ring.dropped}
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class CaptureManager:
+    def __init__(self, backend, samplerate, blocksize=0, poll=0.02):
+        self.backend = backend
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.poll = poll
+        self._active = ()             # sessions the callback feeds (swapped, never mutated)
+        self._sessions = []           # every unfinished session (drain thread's list)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stream = None
+        self._drainer = None
+        self.callbacks = 0
+        self.device_overflows = 0     # blocks the device/backend flagged (input overflow etc.)
+
+    # ---------- Sessions ----------
+    def open(self, path, max_seconds, sinks=(), finish=None, ring_seconds=4.0):
+        """Start recording into path; returns a CaptureSession."""
+        recorder = Recorder(path, self.samplerate, max_seconds, ring_seconds=ring_seconds, sinks=sinks)
+        session = CaptureSession(self, recorder, finish)
+        with self._lock:
+            if self._stream is None:
+                try:
+                    self._stream = self.backend.open(self.samplerate, self.blocksize, self._callback)
+                    self._stream.start()
+                except Exception as e:
+                    self._stream = None
+                    recorder.wav.close()
+                    os.remove(session.path)
+                    session.error = str(e)
+                    session.done.set()
+                    return session
+            self._sessions.append(session)
+            self._active = self._active + (session,)
+            if self._drainer is None or not self._drainer.is_alive():
+                self._drainer = threading.Thread(target=self._drain_loop, name="voice-capture", daemon=True)
+                self._drainer.start()
+        return session
+
+    def _callback(self, indata, frames, time_info, status):
+        # Audio thread: copy the block into each session's ring and return
+        self.callbacks += 1
+        if status:
+            self.device_overflows += 1
+        for session in self._active:
+            session.recorder.ring.write(indata)
+
+    # ---------- Drain thread ----------
+    def _drain_loop(self):
+        while True:
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._close_stream()
+                    self._drainer = None
+                    return
+            for session in sessions:
+                try:
+                    full = session.recorder.drain()
+                except Exception as e:  # disk full, a failing sink: end this session only
+                    session.error = str(e)
+                    full = True
+                if full or session._stop.is_set():
+                    session.stopped_by_timer = full and session.error is None
+                    self._finish(session)
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    def _finish(self, session):
+        with self._lock:
+            self._active = tuple(s for s in self._active if s is not session)
+            self._sessions.remove(session)
+        rec = session.recorder
+        try:
+            if session.error is None:
+                rec.drain()  # blocks that landed before the detach
+            rec.wav.close()
+            if not rec.wav.frames:
+                os.remove(session.path)  # stopped before any audio arrived
+            if session.finish is not None and session.error is None and rec.wav.frames:
+                session.result = session.finish()
+        except Exception as e:
+            session.error = str(e)
+        session.done.set()
+
+    def _close_stream(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "stream_open": self._stream is not None,
+                    "callbacks": self.callbacks, "device_overflows": self.device_overflows}
+
+
+# ---------- Backends ----------
+class SoundDeviceBackend:
+    """The default input device through PortAudio (mono int16)."""
+
+    def __init__(self, device=None):
+        self.device = device
+
+    def open(self, samplerate, blocksize, callback):
+        import sounddevice as sd  # PortAudio loads only when someone records
+        return sd.RawInputStream(samplerate=samplerate, blocksize=blocksize, device=self.device,
+                                 channels=1, dtype="int16", callback=callback)
+
+
+class FakeDevice:
+    """A stand-in input device: a thread calls back with int16 blocks on a real-time clock.
+
+    signal(n_samples, rng) -> int16 array (default: a quiet tone plus noise);
+    speed > 1 runs faster than real time. Like PortAudio, a block delivered
+    more than a block late is flagged as an input overflow, and blocks the
+    callback was too slow to take are skipped.
+    """
+
+    def __init__(self, signal=None, speed=1.0, block_ms=20, seed=0):
+        self.signal = signal or _tone
+        self.speed = speed
+        self.block_ms = block_ms
+        self.seed = seed
+        self.skipped = 0
+
+    def open(self, samplerate, blocksize, callback):
+        return _FakeStream(self, samplerate, blocksize or int(samplerate * self.block_ms / 1000), callback)
+
+
+class _FakeStream:
+    def __init__(self, device, samplerate, blocksize, callback):
+        self.device = device
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fake-audio", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        rng = np.random.default_rng(self.device.seed)
+        period = self.blocksize / self.samplerate / self.device.speed
+        # A few seconds of audio, cycled, so generating it never slows the clock
+        audio = self.device.signal(self.samplerate * 4, rng).astype(np.int16)
+        pos, due = 0, time.perf_counter()
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if now < due:
+                time.sleep(due - now)
+                continue
+            late = int((now - due) / period)
+            if late:  # the callback held the thread: those blocks are gone
+                self.device.skipped += late
+                due += late * period
+            block = np.take(audio, range(pos, pos + self.blocksize), mode="wrap")
+            pos = (pos + self.blocksize) % len(audio)
+            self.callback(block.tobytes(), self.blocksize, None, 1 if late else 0)
+            due += period
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+
+def _tone(n, rng):
+    t = np.arange(n) / 16000
+    return 3000 * np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 2 * t)) + rng.normal(0, 200, n)
@@ -0,0 +1,176 @@
+# Incremental acoustic features for the speech recorder.
+#
+# FeatureEngine.feed() takes int16 chunks as they come off the ring buffer and
+# turns them into per-frame measurements (energy, voicing, pitch) with NumPy,
+# a chunk at a time. finalize() only has to summarise those small per-frame
+# arrays, so the metrics object is ready as soon as recording stops. The
+# metrics have the same shape voice_cog.html stores in voice_data.
+from datetime import datetime
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FRAME_MS = 40
+HOP_MS = 20
+PITCH_MIN, PITCH_MAX = 70.0, 400.0   # Hz, covers adult speaking voices
+VOICING = 0.35                        # normalised autocorrelation peak to count as voiced
+MIN_PAUSE = 0.25                      # s of silence between speech that counts as a pause
+LONG_PAUSE = 2.0
+MAX_SCORE = 15                        # clarity / fluency / prosody scale used by the web task
+
+
+class FeatureEngine:
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self.frame = int(samplerate * FRAME_MS / 1000)
+        self.hop = int(samplerate * HOP_MS / 1000)
+        self.window = np.hanning(self.frame).astype(np.float32)
+        self.nfft = 1 << (2 * self.frame - 1).bit_length()
+        self.min_lag = int(samplerate / PITCH_MAX)
+        self.max_lag = int(samplerate / PITCH_MIN)
+        self.samples = 0
+        self._carry = np.zeros(0, dtype=np.float32)
+        # Per-frame results, appended chunk by chunk
+        self._db = []
+        self._pitch = []
+
+    # ---------- Streaming ----------
+    def feed(self, chunk):
+        """Consume an int16 array (or view) of new samples."""
+        self.samples += len(chunk)
+        buf = np.concatenate((self._carry, np.asarray(chunk, dtype=np.float32) / 32768.0))
+        if len(buf) < self.frame:
+            self._carry = buf
+            return
+        n = 1 + (len(buf) - self.frame) // self.hop
+        frames = sliding_window_view(buf, self.frame)[::self.hop][:n]
+        self._carry = buf[n * self.hop:].copy()
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        self._db.append(20 * np.log10(rms).astype(np.float32))
+
+        # Autocorrelation pitch: power spectrum -> autocorrelation, best lag in range
+        spec = np.fft.rfft(frames * self.window, n=self.nfft, axis=1)
+        ac = np.fft.irfft(spec.real ** 2 + spec.imag ** 2, n=self.nfft, axis=1)
+        lags = ac[:, self.min_lag:self.max_lag]
+        best = np.argmax(lags, axis=1)
+        strength = lags[np.arange(n), best] / np.maximum(ac[:, 0], 1e-12)
+        pitch = np.where(strength > VOICING, self.samplerate / (best + self.min_lag), 0.0)
+        self._pitch.append(pitch.astype(np.float32))
+
+    __call__ = feed
+
+    # ---------- Summary ----------
+    def finalize(self, timestamp=None):
+        db = np.concatenate(self._db) if self._db else np.zeros(0, np.float32)
+        pitch = np.concatenate(self._pitch) if self._pitch else np.zeros(0, np.float32)
+        duration = self.samples / self.samplerate
+        hop_s = self.hop / self.samplerate
+
+        if len(db) == 0:
+            return _metrics(duration, 0, 0, 0, "No speech detected.", {}, timestamp)
+
+        # Voice activity: energy well above the noise floor, with short gaps bridged
+        noise = float(np.percentile(db, 10))
+        speech_db = float(np.percentile(db, 90))
+        threshold = max(noise + 0.35 * (speech_db - noise), -55.0)
+        if speech_db - noise < 6.0:
+            threshold = -45.0  # flat level: either all speech or all silence
+        active = _close_gaps(db > threshold, int(0.15 / hop_s))
+        segments = _runs(active)
+        segments = segments[(segments[:, 1] - segments[:, 0]) * hop_s >= 0.1] if len(segments) else segments
+
+        if len(segments) == 0:
+            return _metrics(duration, 0, 0, 0, "No speech detected.", {}, timestamp)
+        speech_s = float((segments[:, 1] - segments[:, 0]).sum() * hop_s)
+        if len(segments) > 1:
+            gaps = (segments[1:, 0] - segments[:-1, 1]) * hop_s
+            pauses = gaps[gaps >= MIN_PAUSE]
+        else:
+            pauses = np.zeros(0)
+        minutes = max(duration / 60.0, 1e-6)
+
+        # Speech-rate proxy: energy peaks (syllable nuclei) inside speech
+        smooth = np.convolve(db, np.ones(5) / 5, mode="same")
+        peaks = (smooth[1:-1] > smooth[:-2]) & (smooth[1:-1] >= smooth[2:]) & active[1:-1]
+        peaks &= smooth[1:-1] > threshold + 3
+        syllables = int(np.count_nonzero(peaks))
+        rate = syllables / speech_s if speech_s else 0.0
+
+        voiced = pitch[(pitch > 0) & active]
+        if len(voiced) > 5:
+            semitones = 12 * np.log2(voiced / np.median(voiced))
+            pitch_median = float(np.median(voiced))
+            pitch_sd = float(np.std(semitones))
+            pitch_range = float(np.percentile(semitones, 95) - np.percentile(semitones, 5))
+        else:
+            pitch_median = pitch_sd = pitch_range = 0.0
+
+        snr = speech_db - noise
+        clarity = _scale(snr, 10.0, 35.0)
+        fluency = MAX_SCORE - 0.3 * max(0.0, len(pauses) / minutes - 12) \
+            - 1.0 * int(np.count_nonzero(pauses >= LONG_PAUSE)) \
+            - 8.0 * max(0.0, 0.5 - speech_s / max(duration, 1e-6))
+        fluency = float(np.clip(fluency, 0, MAX_SCORE))
+        prosody = _scale(pitch_sd, 0.5, 3.0) if pitch_median else 0.0
+
+        notes = []
+        if fluency < 10:
+            notes.append("Minor hesitation detected in sentence structure.")
+        if prosody < 10:
+            notes.append("Reduced pitch variation observed (monotone).")
+        narrative = " ".join(notes) or "Speech patterns are within normal limits."
+
+        features = {
+            "speech_seconds": round(speech_s, 2),
+            "speech_ratio": round(speech_s / duration, 3) if duration else 0.0,
+            "segments": int(len(segments)),
+            "pause_count": int(len(pauses)),
+            "pauses_per_minute": round(len(pauses) / minutes, 2),
+            "mean_pause": round(float(pauses.mean()), 2) if len(pauses) else 0.0,
+            "max_pause": round(float(pauses.max()), 2) if len(pauses) else 0.0,
+            "syllable_rate": round(rate, 2),
+            "pitch_median_hz": round(pitch_median, 1),
+            "pitch_sd_semitones": round(pitch_sd, 2),
+            "pitch_range_semitones": round(pitch_range, 2),
+            "snr_db": round(snr, 1),
+        }
+        return _metrics(duration, clarity, fluency, prosody, narrative, features, timestamp)
+
+
+def _scale(value, lo, hi):
+    # lo -> a third of the scale, hi -> full marks
+    return float(np.clip(MAX_SCORE * (1 + 2 * (value - lo) / (hi - lo)) / 3, 0, MAX_SCORE))
+
+
+def _runs(mask):
+    """(start, end) index pairs of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.column_stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def _close_gaps(mask, max_gap):
+    runs = _runs(~mask)
+    if len(runs) == 0:
+        return mask
+    out = mask.copy()
+    interior = (runs[:, 0] > 0) & (runs[:, 1] < len(mask)) & (runs[:, 1] - runs[:, 0] <= max_gap)
+    for start, end in runs[interior]:
+        out[start:end] = True
+    return out
+
+
+def _metrics(duration, clarity, fluency, prosody, narrative, features, timestamp):
+    clarity, fluency, prosody = (round(float(v), 1) for v in (clarity, fluency, prosody))
+    return {
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "durationSeconds": round(duration),
+        "metrics": {
+            "clarity": clarity,
+            "fluency": fluency,
+            "prosody": prosody,
+            "total": round((clarity + fluency + prosody) / 3, 1),
+        },
+        "narrative": narrative,
+        "features": features,
+    }
@@ -0,0 +1,119 @@
+# Allocation-free capture path for the speech recorder.
+#
+# The sounddevice callback copies each block straight into a preallocated
+# int16 ring buffer through a memoryview. The capture manager's drain thread
+# (voice_capture.py) calls drain() to move whatever has arrived from the ring
+# to a WAV file that is appended to during capture; the header sizes are
+# patched when recording stops. Memory use is the ring size no matter how long
+# the session runs. Optional sinks see the same drained views, so analysis
+# runs on the drain thread as audio lands.
+import struct
+
+import numpy as np
+
+SAMPLE_WIDTH = 2  # int16
+
+
+class RingBuffer:
+    """Single-producer / single-consumer int16 ring over one preallocated array."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = np.zeros(capacity, dtype=np.int16)
+        self._bytes = memoryview(self.samples).cast("B")
+        self.written = 0   # total samples ever written (producer owns)
+        self.read = 0      # total samples ever read (consumer owns)
+        self.dropped = 0   # samples discarded because the consumer fell behind
+
+    def write(self, data):
+        """Copy raw int16 bytes in; called from the audio callback."""
+        src = memoryview(data).cast("B")
+        n = len(src) // SAMPLE_WIDTH
+        if n > self.capacity - (self.written - self.read):
+            self.dropped += n
+            return
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._bytes[start * SAMPLE_WIDTH:(start + first) * SAMPLE_WIDTH] = src[:first * SAMPLE_WIDTH]
+        if first < n:
+            self._bytes[:(n - first) * SAMPLE_WIDTH] = src[first * SAMPLE_WIDTH:]
+        self.written += n
+
+    def pending(self):
+        """Samples available to read, as at most two array views (no copies)."""
+        n = self.written - self.read
+        start = self.read % self.capacity
+        first = min(n, self.capacity - start)
+        views = [self.samples[start:start + first]]
+        if first < n:
+            views.append(self.samples[:n - first])
+        return views
+
+    def consume(self, n):
+        self.read += n
+
+
+class StreamingWavWriter:
+    """Mono int16 WAV appended to as audio arrives; sizes are fixed up in close()."""
+
+    def __init__(self, path, samplerate, channels=1):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.frames = 0
+        self._f = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        data = self.frames * self.channels * SAMPLE_WIDTH
+        block = self.channels * SAMPLE_WIDTH
+        self._f.write(struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF", 36 + data, b"WAVE",
+            b"fmt ", 16, 1, self.channels, self.samplerate, self.samplerate * block, block, 16,
+            b"data", data,
+        ))
+
+    def write(self, samples):
+        self._f.write(memoryview(samples).cast("B"))
+        self.frames += len(samples) // self.channels
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._f.seek(0)
+        self._write_header()
+        self._f.close()
+
+    @property
+    def seconds(self):
+        return self.frames / self.samplerate
+
+
+class Recorder:
+    """Glue between a RawInputStream callback, the ring buffer and the WAV file."""
+
+    def __init__(self, path, samplerate, max_seconds, ring_seconds=4.0, sinks=()):
+        self.samplerate = samplerate
+        self.max_frames = int(max_seconds * samplerate)
+        self.ring = RingBuffer(int(ring_seconds * samplerate))
+        self.wav = StreamingWavWriter(path, samplerate)
+        self.status_flags = 0
+        self.sinks = list(sinks)  # called with each drained int16 view, e.g. FeatureEngine.feed
+
+    def callback(self, indata, frames, time_info, status):
+        if status:
+            self.status_flags += 1
+        self.ring.write(indata)
+
+    def drain(self):
+        """Move pending audio to disk; True once max_seconds is reached."""
+        for view in self.ring.pending():
+            room = self.max_frames - self.wav.frames
+            view = view[:room]
+            if len(view):
+                self.wav.write(view)
+                for sink in self.sinks:
+                    sink(view)
+            self.ring.consume(len(view))
+        return self.wav.frames >= self.max_frames